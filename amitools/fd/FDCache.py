@@ -0,0 +1,119 @@
+import os
+import marshal
+
+import FDFormat
+from FuncTable import FuncTable
+from FuncDef import FuncDef
+from amitools.util.CacheDir import atomic_write
+
+
+class FDCache(object):
+  """a binary cache of parsed fd files.
+
+     The function tables are stored as plain tuples with marshal and an
+     entry is only used as long as the path, mtime and size of its fd
+     file are unchanged. Otherwise the fd file is parsed again.
+  """
+
+  VERSION = 1
+
+  def __init__(self, cache_file=None):
+    self.cache_file = cache_file
+    # fd path -> (mtime, size, base_name, funcs)
+    # func: (name, bias, private, args)
+    self.entries = {}
+    self.dirty = False
+    self.num_hits = 0
+    self.num_misses = 0
+    if cache_file is not None:
+      self.load(cache_file)
+
+  def load(self, path):
+    """load entries from cache file. returns True if the cache is valid"""
+    try:
+      with open(path, "rb") as fh:
+        data = marshal.load(fh)
+    except (IOError, EOFError, ValueError, TypeError):
+      return False
+    if type(data) is not tuple or len(data) != 2:
+      return False
+    version, entries = data
+    if version != self.VERSION or type(entries) is not dict:
+      return False
+    self.entries = entries
+    self.dirty = False
+    return True
+
+  def save(self, path=None):
+    """write entries to cache file if they were changed"""
+    if path is None:
+      path = self.cache_file
+    if path is None or not self.dirty:
+      return
+    data = (self.VERSION, self.entries)
+    try:
+      atomic_write(path, marshal.dumps(data))
+    except (IOError, OSError):
+      return
+    self.dirty = False
+
+  def read_fd(self, fname):
+    """return the FuncTable of an fd file from the cache or parse it"""
+    path = os.path.abspath(fname)
+    st = os.stat(path)
+    entry = self.entries.get(path)
+    if entry is not None and entry[0] == st.st_mtime and entry[1] == st.st_size:
+      self.num_hits += 1
+      return self._to_func_table(entry[2], entry[3])
+    self.num_misses += 1
+    fd = FDFormat.read_fd(path)
+    if fd is not None:
+      self.entries[path] = (st.st_mtime, st.st_size,
+                            fd.get_base_name(), self._from_func_table(fd))
+      self.dirty = True
+    return fd
+
+  def _from_func_table(self, fd):
+    funcs = []
+    for f in fd.get_funcs():
+      funcs.append((f.get_name(), f.get_bias(), f.is_private(),
+                    tuple(f.get_args())))
+    return tuple(funcs)
+
+  def _to_func_table(self, base_name, funcs):
+    fd = FuncTable(base_name)
+    for name, bias, private, args in funcs:
+      f = FuncDef(name, bias, private)
+      f.args = list(args)
+      fd.add_func(f)
+    return fd
+
+
+# ----- mini test -----
+if __name__ == '__main__':
+  import time
+  import tempfile
+  import amitools.util.DataDir as DataDir
+  fd_dir = DataDir.ensure_data_sub_dir("fd")
+  fd_files = [os.path.join(fd_dir, f) for f in sorted(os.listdir(fd_dir))]
+  num = 100
+  t = time.time()
+  for i in xrange(num):
+    for f in fd_files:
+      FDFormat.read_fd(f)
+  t_parse = time.time() - t
+  cache_file = os.path.join(tempfile.mkdtemp(), "fd.cache")
+  c = FDCache()
+  for f in fd_files:
+    c.read_fd(f)
+  c.save(cache_file)
+  t = time.time()
+  for i in xrange(num):
+    c = FDCache(cache_file)
+    for f in fd_files:
+      c.read_fd(f)
+  t_cache = time.time() - t
+  print "%d x %d fd files: parsed %.3fs, cached %.3fs -> %.1fx" % \
+    (num, len(fd_files), t_parse, t_cache, t_parse / t_cache)
+  os.remove(cache_file)
+  os.rmdir(os.path.dirname(cache_file))
@@ -78,18 +78,15 @@ class KickRomAccess(RomAccess):
 
   def calc_check_sum(self, skip_off=None):
     """Check internal kickstart checksum and return True if is correct"""
-    chk_sum = 0
-    num_longs = self.size / 4
-    off = 0
+    longs = self.read_longs()
+    chk_sum = sum(longs)
+    if skip_off is not None and skip_off % 4 == 0 and \
+       skip_off // 4 < len(longs):
+      chk_sum -= longs[skip_off // 4]
+    # fold carries back in (end-around carry)
     max_u32 = 0xffffffff
-    for i in xrange(num_longs):
-      val = struct.unpack_from(">I", self.rom_data, off)[0]
-      if off != skip_off:
-        chk_sum += val
-      off += 4
-      if chk_sum > max_u32:
-        chk_sum = chk_sum & max_u32
-        chk_sum += 1
+    while chk_sum > max_u32:
+      chk_sum = (chk_sum & max_u32) + (chk_sum >> 32)
     return max_u32 - chk_sum
 
   def verify_check_sum(self):
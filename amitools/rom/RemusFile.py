@@ -2,6 +2,10 @@ from __future__ import print_function
 
 import os
 import struct
+import marshal
+import hashlib
+
+from amitools.util.CacheDir import atomic_write
 
 
 class RemusRom(object):
@@ -64,13 +68,10 @@ class RemusFile(object):
     return struct.unpack_from(">H", self.data, offset)[0]
 
   def _read_string(self, pos):
-    res = ""
-    while True:
-      if ord(self.data[pos]) == 0:
-        break
-      res += self.data[pos]
-      pos+=1
-    return res
+    end = self.data.find("\0", pos)
+    if end == -1:
+      end = len(self.data)
+    return self.data[pos:end]
 
 
 class RemusSplitFile(RemusFile):
@@ -180,42 +181,229 @@ class RemusIdFile(RemusFile):
       print("%04x  %08x  %08x  %s" % (e.count, e.bogus, e.chk_sum, e.name))
 
 
+def calc_rom_hash(rom_data):
+  """content hash of a ROM image.
+
+     The KickSum field is excluded so a ROM with a broken or missing
+     check sum still maps to the same hash.
+     """
+  sum_off = len(rom_data) - 0x18
+  h = hashlib.sha1()
+  if sum_off >= 0:
+    h.update(rom_data[:sum_off])
+    h.update(rom_data[sum_off+4:])
+  else:
+    h.update(rom_data)
+  return h.hexdigest()
+
+
+class RemusSplitIndex(object):
+  """a precompiled index of all split files of a RemusFileSet.
+
+     The index can be stored in a compact binary cache file that is
+     only valid as long as the stamp of the split files is unchanged.
+     ROMs are stored as plain tuples and only converted to RemusRom
+     objects on demand.
+  """
+
+  VERSION = 1
+
+  def __init__(self, stamp=None):
+    self.stamp = stamp
+    # rom tuples: (sum_off, chk_sum, size, base_addr, name, short_name,
+    #              entries), entry: (name, offset, size, reloc_off, relocs)
+    # with relocs being an index into the shared reloc table
+    self.rom_tuples = []
+    # relocs packed as big endian longs. many ROMs share them
+    self.reloc_tab = []
+    # (size, chk_sum) -> rom index
+    self.sum_map = {}
+    # content hash -> (size, chk_sum)
+    self.hash_map = {}
+    # rom index -> RemusRom
+    self.rom_objs = {}
+    self.dirty = False
+
+  def build(self, split_files):
+    self.rom_tuples = []
+    self.reloc_tab = []
+    self.sum_map = {}
+    self.rom_objs = {}
+    reloc_map = {}
+    for sf in split_files:
+      for rom in sf.roms:
+        entries = []
+        for e in rom.entries:
+          relocs = struct.pack(">%dI" % len(e.relocs), *e.relocs)
+          reloc_idx = reloc_map.get(relocs)
+          if reloc_idx is None:
+            reloc_idx = len(self.reloc_tab)
+            reloc_map[relocs] = reloc_idx
+            self.reloc_tab.append(relocs)
+          entries.append((e.name, e.offset, e.size, e.reloc_off, reloc_idx))
+        t = (rom.sum_off, rom.chk_sum, rom.size, rom.base_addr, rom.name,
+             rom.short_name, tuple(entries))
+        key = (rom.size, rom.chk_sum)
+        # first split file wins
+        if key not in self.sum_map:
+          self.sum_map[key] = len(self.rom_tuples)
+        self.rom_objs[len(self.rom_tuples)] = rom
+        self.rom_tuples.append(t)
+    # drop learned hashes of vanished ROMs
+    self.hash_map = dict((h, k) for h, k in self.hash_map.items()
+                         if k in self.sum_map)
+    self.dirty = True
+
+  def load(self, path):
+    """load index from cache file. returns True if the cache is valid"""
+    try:
+      with open(path, "rb") as fh:
+        data = marshal.load(fh)
+    except (IOError, EOFError, ValueError, TypeError):
+      return False
+    if type(data) is not tuple or len(data) != 6:
+      return False
+    version, stamp, rom_tuples, reloc_tab, sum_map, hash_map = data
+    # keep learned hashes even if the rest is outdated
+    self.hash_map = hash_map
+    if version != self.VERSION or stamp != self.stamp:
+      return False
+    self.rom_tuples = rom_tuples
+    self.reloc_tab = reloc_tab
+    self.sum_map = sum_map
+    self.rom_objs = {}
+    self.dirty = False
+    return True
+
+  def save(self, path):
+    data = (self.VERSION, self.stamp, self.rom_tuples, self.reloc_tab,
+            self.sum_map, self.hash_map)
+    atomic_write(path, marshal.dumps(data))
+    self.dirty = False
+
+  def _get_rom(self, idx):
+    rom = self.rom_objs.get(idx)
+    if rom is None:
+      sum_off, chk_sum, size, base_addr, name, short_name, entries = \
+        self.rom_tuples[idx]
+      rom = RemusRom(sum_off, chk_sum, size, base_addr, name, short_name)
+      for name, offset, size, reloc_off, reloc_idx in entries:
+        entry = RemusRomEntry(name, offset, size, reloc_off)
+        relocs = self.reloc_tab[reloc_idx]
+        entry.relocs = list(struct.unpack(">%dI" % (len(relocs) // 4), relocs))
+        rom.entries.append(entry)
+      self.rom_objs[idx] = rom
+    return rom
+
+  def find_rom(self, rom_data, chk_sum):
+    idx = self.sum_map.get((len(rom_data), chk_sum))
+    if idx is not None:
+      return self._get_rom(idx)
+
+  def find_rom_by_hash(self, rom_hash):
+    key = self.hash_map.get(rom_hash)
+    if key is not None:
+      return self._get_rom(self.sum_map[key])
+
+  def add_rom_hash(self, rom_hash, rom):
+    key = (rom.size, rom.chk_sum)
+    if self.hash_map.get(rom_hash) != key:
+      self.hash_map[rom_hash] = key
+      self.dirty = True
+
+  def get_roms(self):
+    return [self._get_rom(i) for i in xrange(len(self.rom_tuples))]
+
+
 class RemusFileSet(object):
   def __init__(self):
     self.split_files = []
     self.id_file = None
+    self.id_file_path = None
+    self.index = None
+    self.cache_file = None
+
+  def load(self, data_dir, cache_file=None):
+    """load split data from data_dir.
 
-  def load(self, data_dir):
+       If a cache_file is given then a precompiled index is used as long
+       as the split files are unchanged. Otherwise it is rebuilt.
+    """
+    self.cache_file = cache_file
+    self.id_file = None
+    self.id_file_path = os.path.join(data_dir, "romid.idat")
+    self.index = RemusSplitIndex(self._get_stamp(data_dir))
+    if cache_file is not None and self.index.load(cache_file):
+      return
     # load *.dat files
-    for f in os.listdir(data_dir):
+    for f in sorted(os.listdir(data_dir)):
       file = os.path.join(data_dir, f)
       if file.endswith(".dat"):
         sf = RemusSplitFile()
         sf.load(file)
         self.split_files.append(sf)
-    # id file?
-    id_file = os.path.join(data_dir, "romid.idat")
-    if os.path.exists(id_file):
-      si = RemusIdFile()
-      si.load(id_file)
-      self.id_file = si
+    # build index
+    self.index.build(self.split_files)
+    self.save_cache()
+
+  def save_cache(self):
+    """write index to cache file if it was changed"""
+    if self.cache_file is not None and self.index.dirty:
+      try:
+        self.index.save(self.cache_file)
+      except (IOError, OSError):
+        pass
+
+  def get_id_file(self):
+    """return the RemusIdFile of the data dir or None if there is none.
+
+       It is not part of the cached index and only loaded on first use.
+    """
+    if self.id_file is None and self.id_file_path is not None:
+      if os.path.exists(self.id_file_path):
+        si = RemusIdFile()
+        si.load(self.id_file_path)
+        self.id_file = si
+    return self.id_file
+
+  def _get_stamp(self, data_dir):
+    stamp = []
+    for f in sorted(os.listdir(data_dir)):
+      if f.endswith(".dat"):
+        st = os.stat(os.path.join(data_dir, f))
+        stamp.append((f, st.st_size, int(st.st_mtime)))
+    return tuple(stamp)
 
   def dump(self):
-    for sf in self.split_files:
-      sf.dump()
-    if self.id_file is not None:
-      self.id_file.dump()
-
-  def find_rom(self, rom_data, chk_sum):
-    for f in self.split_files:
-      rom = f.find_rom(rom_data, chk_sum)
+    if len(self.split_files) > 0:
+      for sf in self.split_files:
+        sf.dump()
+    else:
+      for rom in self.index.get_roms():
+        print("#%04x  @%08x  +%08x  %08x: %08x  %-24s  %s" %
+              (len(rom.entries), rom.base_addr, rom.size,
+               rom.sum_off, rom.chk_sum,
+               rom.short_name, rom.name))
+    id_file = self.get_id_file()
+    if id_file is not None:
+      id_file.dump()
+
+  def find_rom(self, rom_data, chk_sum, rom_hash=None):
+    """find ROM by size and check sum or by its content hash.
+
+       If the ROM is matched by check sum then its content hash is
+       remembered in the index.
+    """
+    rom = self.index.find_rom(rom_data, chk_sum)
+    if rom_hash is not None:
       if rom is not None:
-        return rom
+        self.index.add_rom_hash(rom_hash, rom)
+      else:
+        rom = self.index.find_rom_by_hash(rom_hash)
+    return rom
 
   def get_roms(self):
-    roms = []
-    for f in self.split_files:
-      f.get_roms(roms)
+    roms = self.index.get_roms()
     roms = sorted(roms, key=lambda x:x.name)
     return roms
 
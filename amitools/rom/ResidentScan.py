@@ -1,7 +1,10 @@
+import re
+
 from RomAccess import RomAccess
 
 
 RTC_MATCHWORD  = 0x4AFC
+RTC_MATCHWORD_RE = re.compile(b"\x4a\xfc")
 
 RTF_AUTOINIT   = (1<<7)
 RTF_AFTERDOS   = (1<<2)
@@ -95,15 +98,11 @@ class Resident:
   def _parse_cstr(cls, access, off, base_addr):
     str_ptr = access.read_long(off)
     str_off = str_ptr - base_addr
-    res = ""
     rom = access.rom_data
-    while True:
-      c = rom[str_off]
-      if ord(c) == 0:
-        break
-      res += c
-      str_off += 1
-    return res
+    end_off = rom.find(b"\0", str_off)
+    if end_off == -1:
+      end_off = len(rom)
+    return bytes(rom[str_off:end_off])
 
 
 class ResidentScan:
@@ -114,18 +113,8 @@ class ResidentScan:
 
   def get_all_matchwords(self):
     """scan memory for all occurrences of matchwords"""
-    mw = "\x4a\xfc"
-    res = []
-    off = 0
-    num = self.access.size
     rom = self.access.rom_data
-    while off < num:
-      pos = rom.find(mw, off)
-      if pos == -1:
-        break
-      res.append(pos)
-      off = pos + 2
-    return res
+    return [m.start() for m in RTC_MATCHWORD_RE.finditer(rom)]
 
   def guess_base_addr(self):
     offs = self.get_all_matchwords()
@@ -1,4 +1,14 @@
 import struct
+import array
+import sys
+
+
+# pick an array type code with 32 bit items
+if array.array('I').itemsize == 4:
+  _U32_TYPE = 'I'
+else:
+  _U32_TYPE = 'L'
+_SWAP_U32 = sys.byteorder == 'little'
 
 
 class RomAccess:
@@ -39,6 +49,17 @@ class RomAccess:
       raise ValueError("can't write to ROM")
     return struct.pack_into(">I", self.rom_data, off, val)
 
+  def read_longs(self, off=0, num=None):
+    """return an array of big endian longs starting at offset"""
+    if num is None:
+      num = (self.size - off) // 4
+    data = bytes(self.rom_data[off:off+num*4])
+    res = array.array(_U32_TYPE)
+    res.fromstring(data)
+    if _SWAP_U32:
+      res.byteswap()
+    return res
+
   def read_word(self, off):
     return struct.unpack_from(">H", self.rom_data, off)[0]
 
@@ -1,5 +1,7 @@
 import logging
+import struct
 from RomAccess import RomAccess
+from amitools.util.DataDiff import diff_ranges
 
 
 class RomPatch:
@@ -22,31 +24,30 @@ class OneMegRomPatch(RomPatch):
   def __init__(self):
     RomPatch.__init__(self, "1mb_rom", "Patch Kickstart to support ext ROM with 512 KiB")
 
+  # exec table: f80000, 1000000, f00000, f80000, ffffffff
+  EXEC_TABLE = struct.pack(">5I", 0xf80000, 0x1000000, 0xf00000,
+                           0xf80000, 0xffffffff)
+
   def apply_patch(self, access, args=None):
-    off = 8
-    while off < 0x400:
-      v = access.read_long(off)
-      if v == 0xf80000:
-        v4 = access.read_long(off+4)
-        v8 = access.read_long(off+8)
-        vc = access.read_long(off+0xc)
-        v10 = access.read_long(off+0x10)
-        if v4 == 0x1000000 and v8 == 0xf00000 and \
-           vc == 0xf80000 and v10 == 0xffffffff:
-          vp8 = access.read_long(off-8)
-          if vp8 == 0xf80000:
-            access.write_long(off-4, 0x1000000)
-            access.write_long(off, 0xe00000)
-            access.write_long(off+4, 0xe80000)
-            logging.info("@%08x Variant A", off)
-            return True
-          else:
-            access.write_long(off, 0xf00000)
-            access.write_long(off+8, 0xe00000)
-            access.write_long(off+0xc, 0xe80000)
-            logging.info("@%08x Variant B", off)
-            return True
-      off += 2
+    data = access.get_data()
+    off = data.find(self.EXEC_TABLE, 8)
+    while off != -1 and off < 0x400:
+      # only word aligned
+      if off & 1 == 0:
+        vp8 = access.read_long(off-8)
+        if vp8 == 0xf80000:
+          access.write_long(off-4, 0x1000000)
+          access.write_long(off, 0xe00000)
+          access.write_long(off+4, 0xe80000)
+          logging.info("@%08x Variant A", off)
+          return True
+        else:
+          access.write_long(off, 0xf00000)
+          access.write_long(off+8, 0xe00000)
+          access.write_long(off+0xc, 0xe80000)
+          logging.info("@%08x Variant B", off)
+          return True
+      off = data.find(self.EXEC_TABLE, off+1)
     logging.error("Exec Table not found!")
     return False
 
@@ -96,6 +97,8 @@ patches = [
 
 class RomPatcher:
   def __init__(self, rom):
+    # keep a pristine copy for diffing
+    self.orig_rom = bytes(rom)
     self.access = RomAccess(rom)
     self.access.make_writable()
 
@@ -115,3 +118,7 @@ class RomPatcher:
 
   def get_patched_rom(self):
     return self.access.get_data()
+
+  def get_patch_diff(self):
+    """return (offset, size) ranges modified by the applied patches"""
+    return diff_ranges(self.orig_rom, self.access.get_data())
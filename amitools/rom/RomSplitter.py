@@ -4,17 +4,22 @@ import struct
 import KickRom
 import RemusFile
 import amitools.util.DataDir as DataDir
+import amitools.util.CacheDir as CacheDir
 from amitools.binfmt.BinImage import *
 
 
 class RomSplitter:
-  def __init__(self, split_data_path=None):
+  def __init__(self, split_data_path=None, use_cache=True):
     # get data file path
     if split_data_path is None:
       split_data_path = DataDir.ensure_data_sub_dir("splitdata")
+    # get index cache
+    cache_file = None
+    if use_cache:
+      cache_file = CacheDir.get_cache_file("splitdata.idx")
     # setup remus file set
     self.rfs = RemusFile.RemusFileSet()
-    self.rfs.load(split_data_path)
+    self.rfs.load(split_data_path, cache_file)
     # state
     self.chk_sum = None
     self.rom_data = None
@@ -38,7 +43,9 @@ class RomSplitter:
     else:
       self.chk_sum = kh.calc_check_sum()
     # search rom in Remus data base
-    self.remus_rom = self.rfs.find_rom(self.rom_data, self.chk_sum)
+    rom_hash = RemusFile.calc_rom_hash(self.rom_data)
+    self.remus_rom = self.rfs.find_rom(self.rom_data, self.chk_sum, rom_hash)
+    self.rfs.save_cache()
     return self.remus_rom
 
   def print_rom(self, out, show_entries=False):
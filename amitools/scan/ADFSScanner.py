@@ -1,7 +1,5 @@
 """Scan an ADF image an visit all files"""
 
-import StringIO
-
 from amitools.fs.blkdev.BlkDevFactory import BlkDevFactory
 from amitools.fs.ADFSVolume import ADFSVolume
 
@@ -50,8 +48,9 @@ class ADFSScanner:
       node.flush()
       size = len(data)
       path = node.get_node_path_name().get_unicode()
-      fobj = StringIO.StringIO(data)
-      sf = scan_file.create_sub_path(path, fobj, size, True, False)
+      fobj, file_based = scanner.create_data_fobj(data)
+      data = None
+      sf = scan_file.create_sub_path(path, fobj, size, True, file_based)
       ok = scanner.scan_obj(sf)
       sf.close()
       return True
@@ -1,7 +1,6 @@
 from __future__ import print_function
 
 import zipfile
-import StringIO
 
 # optional lhafile
 try:
@@ -18,7 +17,7 @@ class ArchiveScanner:
   def _create_archive_obj(self, fobj, scanner):
     pass
 
-  def _create_entry_scan_file(self, arc, info, sf):
+  def _create_entry_scan_file(self, arc, info, sf, scanner):
     pass
 
   def can_handle(self, scan_file):
@@ -43,7 +42,7 @@ class ArchiveScanner:
     infos = arc.infolist()
     for info in infos:
       if info.file_size > 0:
-        sf = self._create_entry_scan_file(arc, info, scan_file)
+        sf = self._create_entry_scan_file(arc, info, scan_file, scanner)
         ok = scanner.scan_obj(sf)
         sf.close()
         if not ok:
@@ -63,7 +62,7 @@ class ZipScanner(ArchiveScanner):
     except Exception as e:
       scanner.warn(sf, "error reading archive: %s" % e)
 
-  def _create_entry_scan_file(self, arc, info, scan_file):
+  def _create_entry_scan_file(self, arc, info, scan_file, scanner):
     name = info.filename
     fobj = arc.open(info)
     size = info.file_size
@@ -86,12 +85,12 @@ class LhaScanner(ArchiveScanner):
     else:
       scanner.warn(sf, "can't handle archive. missing 'lhafile' module.")
 
-  def _create_entry_scan_file(self, arc, info, scan_file):
+  def _create_entry_scan_file(self, arc, info, scan_file, scanner):
     data = arc.read(info.filename)
-    fobj = StringIO.StringIO(data)
+    fobj, file_based = scanner.create_data_fobj(data)
     size = info.file_size
     name = info.filename
-    return scan_file.create_sub_path(name, fobj, size, True, False)
+    return scan_file.create_sub_path(name, fobj, size, True, file_based)
 
 
 # mini test
@@ -3,19 +3,52 @@
 from __future__ import print_function
 
 import os
+import sys
 import fnmatch
 import tempfile
+import collections
+import multiprocessing
+import StringIO
 
 from ScanFile import ScanFile
+from ScanIndex import calc_hash
+
+# the scanner of a parallel scan. workers inherit it via fork()
+_worker_scanner = None
+
+def _init_worker():
+  _worker_scanner._setup_worker()
+
+def _scan_worker(path):
+  return _worker_scanner._scan_file_recorded(path)
+
 
 class FileScanner:
 
   def __init__(self, handler=None, ignore_filters=None, scanners=None,
                error_handler=None, ram_bytes=10 * 1024 * 1024,
-               skip_handler=None, warning_handler=None):
+               skip_handler=None, warning_handler=None,
+               index=None, dup_handler=None,
+               workers=1, result_handler=None):
     """the handler will be called with all the scanned files.
        the optional ignore_filters contains a list of glob pattern to
-       ignore file names"""
+       ignore file names.
+
+       if a ScanIndex is given then files and images with a content
+       already found in the index are not processed again but reported
+       to the dup_handler(scan_file, orig_path). for images and archives
+       all contained files are reported, too.
+
+       with workers > 1 the top-level files are scanned in a process pool.
+       the handler then runs in the worker and its return value is passed
+       to result_handler(scan_file, result) in the main process in scan
+       order. if no result_handler is given then the return value is the
+       ok flag as usual. all other handlers are called in the main process
+       with a scan_file that has no file object anymore. the ram_bytes
+       budget is split among the workers. the workers only know their own
+       copy of the index. so the main process checks the content hashes
+       again in scan order and the reported duplicates are the same as in
+       a serial scan."""
     self.handler = handler
     self.error_handler = error_handler
     self.warning_handler = warning_handler
@@ -23,9 +56,20 @@ class FileScanner:
     self.ignore_filters = ignore_filters
     self.scanners = scanners
     self.ram_bytes = ram_bytes
+    self.index = index
+    self.dup_handler = dup_handler
+    self.workers = workers
+    self.result_handler = result_handler
+    # stack of children lists of the images currently scanned
+    self.child_stack = []
+    # events recorded in a parallel scan worker
+    self.events = None
 
   def scan(self, path):
     """start scanning a path. either a file or directory"""
+    # parallel scan relies on fork() to pass handlers to the workers
+    if self.workers > 1 and sys.platform != 'win32':
+      return self._scan_parallel(path)
     if os.path.isdir(path):
       return self._scan_dir(path)
     elif os.path.isfile(path):
@@ -37,30 +81,71 @@ class FileScanner:
     """pass a ScanFile to check"""
     if check_ignore and self._is_ignored(scan_file.get_local_path()):
       return False
-    # does a scanner match?
     sf = scan_file
+    # already known content?
+    hash_val = None
+    if self.index is not None:
+      if not sf.is_seekable():
+        sf = self.promote_scan_file(sf, seekable=True)
+      hash_val = calc_hash(sf.get_fobj())
+      if len(self.child_stack) > 0:
+        self.child_stack[-1].append((sf.get_local_path(), hash_val))
+      entry = self.index.get_entry(hash_val)
+      if entry is not None:
+        sf.close()
+        if self.events is not None:
+          # the main process replays it from its own index
+          self._add_event('dup', sf, hash_val)
+          return True
+        return self._replay_dup(sf, entry)
+      self.index.add_entry(hash_val, sf.get_path(), sf.size)
+    # does a scanner match?
     sc = self.scanners
     if sc is not None:
       for s in sc:
         if s.can_handle(sf):
-          ok = s.handle(sf, self)
+          if hash_val is not None:
+            self.child_stack.append([])
+            self._add_event('image', sf, hash_val)
+          try:
+            ok = s.handle(sf, self)
+          finally:
+            if hash_val is not None:
+              self.index.set_children(hash_val, self.child_stack.pop())
+              self._add_event('image_end', sf, hash_val)
           sf.close()
           return ok
     # no match call user's handler
+    if hash_val is not None:
+      self._add_event('file', sf, hash_val)
     ok = self._call_handler(sf)
     sf.close()
     return ok
 
+  def _replay_dup(self, scan_file, entry):
+    """report a duplicate and all the files it contains"""
+    ok = self._call_dup_handler(scan_file, entry.path)
+    if not ok or entry.children is None:
+      return ok
+    for sub_path, hash_val in entry.children:
+      sub_entry = self.index.get_entry(hash_val)
+      if sub_entry is None:
+        continue
+      sf = scan_file.create_sub_path(sub_path, None, sub_entry.size,
+                                     False, False)
+      if not self._replay_dup(sf, sub_entry):
+        return False
+    return True
+
   def _scan_dir(self, path):
     if self._is_ignored(path):
       return True
     for root, dirs, files in os.walk(path):
-      for name in files:
+      for name in sorted(files):
         if not self._scan_file(os.path.join(root,name)):
           return False
-      for name in dirs:
-        if not self._scan_dir(os.path.join(root,name)):
-          return False
+      # os.walk() recurses itself. only prune ignored dirs
+      dirs[:] = sorted(d for d in dirs if not self._is_ignored(d))
     return True
 
   def _scan_file(self, path):
@@ -81,6 +166,124 @@ class FileScanner:
         # ignore error
         return True
 
+  def _get_file_list(self, path):
+    """return all host files to be scanned in a stable order"""
+    if os.path.isfile(path):
+      return [] if self._is_ignored(path) else [path]
+    elif not os.path.isdir(path) or self._is_ignored(path):
+      return []
+    res = []
+    for root, dirs, files in os.walk(path):
+      for name in sorted(files):
+        file_path = os.path.join(root, name)
+        if not self._is_ignored(file_path):
+          res.append(file_path)
+      dirs[:] = sorted(d for d in dirs if not self._is_ignored(d))
+    return res
+
+  def _scan_parallel(self, path):
+    global _worker_scanner
+    paths = self._get_file_list(path)
+    _worker_scanner = self
+    pool = multiprocessing.Pool(self.workers, _init_worker)
+    try:
+      # keep only a few results in flight to bound memory
+      max_pending = self.workers * 2
+      pending = collections.deque()
+      ok = True
+      for p in paths:
+        pending.append(pool.apply_async(_scan_worker, (p,)))
+        if len(pending) >= max_pending:
+          ok = self._replay_events(pending.popleft().get())
+          if not ok:
+            break
+      while ok and len(pending) > 0:
+        ok = self._replay_events(pending.popleft().get())
+    finally:
+      pool.terminate()
+      pool.join()
+      _worker_scanner = None
+      # an abort may leave images open
+      del self.child_stack[:]
+    return ok
+
+  def _setup_worker(self):
+    """runs in a worker: record all handler calls as events"""
+    self.events = []
+    self.ram_bytes = self.ram_bytes // self.workers
+    handler = self.handler
+    def rec_handler(sf):
+      res = handler(sf) if handler is not None else True
+      self.events.append(('result', sf.paths, sf.size, res))
+      return True
+    def rec_warning(sf, msg):
+      self.events.append(('warning', sf.paths, sf.size, msg))
+    def rec_error(sf, e):
+      self.events.append(('error', sf.paths, sf.size, e))
+      return True
+    self.handler = rec_handler
+    self.warning_handler = rec_warning
+    self.error_handler = rec_error
+
+  def _scan_file_recorded(self, path):
+    """runs in a worker: scan a host file and return its events"""
+    self.events = []
+    self._scan_file(path)
+    return self.events
+
+  def _add_event(self, kind, scan_file, arg):
+    if self.events is not None:
+      self.events.append((kind, scan_file.paths, scan_file.size, arg))
+
+  def _replay_events(self, events):
+    """runs in main process: pass the worker's events to the handlers.
+
+       the 'file' and 'image' events carry the content hash. if it was
+       already seen in an earlier event then a duplicate is reported and
+       the following events of this file or image are dropped.
+    """
+    skip = 0
+    for kind, paths, size, arg in events:
+      sf = ScanFile(paths, None, size, False, False)
+      # inside a duplicate: only track the nesting
+      if skip > 0:
+        if kind in ('file', 'image'):
+          skip += 1
+        elif kind in ('result', 'image_end'):
+          skip -= 1
+        continue
+      if kind in ('file', 'image', 'dup'):
+        if len(self.child_stack) > 0:
+          self.child_stack[-1].append((sf.get_local_path(), arg))
+        entry = self.index.get_entry(arg)
+        if entry is not None:
+          if kind != 'dup':
+            skip = 1
+          if not self._replay_dup(sf, entry):
+            return False
+          continue
+        self.index.add_entry(arg, sf.get_path(), size)
+        if kind == 'image':
+          self.child_stack.append([])
+        ok = True
+      elif kind == 'image_end':
+        self.index.set_children(arg, self.child_stack.pop())
+        ok = True
+      elif kind == 'result':
+        if self.result_handler is not None:
+          ok = self.result_handler(sf, arg)
+        else:
+          ok = arg
+      elif kind == 'warning':
+        self.warn(sf, arg)
+        ok = True
+      elif kind == 'error':
+        eh = self.error_handler
+        ok = eh(sf, arg) if eh is not None else True
+      if not ok:
+        return False
+    return True
+
   def _is_ignored(self, path):
     if self.ignore_filters is not None:
       base = os.path.basename(path)
@@ -95,14 +298,31 @@ class FileScanner:
     else:
       return True
 
+  def _call_dup_handler(self, scan_file, orig_path):
+    if self.dup_handler is not None:
+      return self.dup_handler(scan_file, orig_path)
+    else:
+      return True
+
   def _call_skip_handler(self, scan_file):
     if self.skip_handler is not None:
       return self.skip_handler(scan_file)
     else:
       return True
 
+  def create_data_fobj(self, data):
+    """return (fobj, file_based) for data read from an image or archive.
+       data larger than the ram budget is moved to a temp file"""
+    if len(data) > self.ram_bytes:
+      fobj = tempfile.TemporaryFile()
+      fobj.write(data)
+      fobj.seek(0)
+      return fobj, True
+    else:
+      return StringIO.StringIO(data), False
+
   def promote_scan_file(self, scan_file, seekable=False, file_based=False):
-    if not seekable and not file_base:
+    if not seekable and not file_based:
       return scan_file
     fb = file_based
     if not fb and seekable and scan_file.size > self.ram_bytes:
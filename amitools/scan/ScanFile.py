@@ -2,6 +2,7 @@ from __future__ import print_function
 
 import os
 import StringIO
+import tempfile
 
 class ScanFile:
   """a file that is currently scanned"""
@@ -47,7 +48,8 @@ class ScanFile:
     return len(self.paths) == 1
 
   def close(self):
-    self.fobj.close()
+    if self.fobj is not None:
+      self.fobj.close()
 
   def create_sub_path(self, sub_path, fobj, size, seekable, file_based):
     paths = self.paths[:]
@@ -66,6 +68,7 @@ class ScanFile:
         if len(buf) == 0:
           break
         fobj.write(buf)
+      fobj.seek(0)
     # create a string buffer
     else:
       data = src_fobj.read()
@@ -0,0 +1,89 @@
+"""A content addressed index of already scanned files"""
+
+from __future__ import print_function
+
+import hashlib
+import marshal
+
+from amitools.util.CacheDir import atomic_write
+
+
+def calc_hash(fobj, blk_size=1024*1024):
+  """hash the contents of a seekable file object and rewind it"""
+  h = hashlib.sha1()
+  while True:
+    buf = fobj.read(blk_size)
+    if len(buf) == 0:
+      break
+    h.update(buf)
+  fobj.seek(0)
+  return h.hexdigest()
+
+
+class ScanIndexEntry:
+  def __init__(self, path, size, children=None):
+    self.path = path
+    self.size = size
+    # list of (sub_path, hash) for images and archives
+    self.children = children
+
+  def __repr__(self):
+    return "ScanIndexEntry(path=%s,size=%d,children=%s)" % \
+      (self.path, self.size, self.children)
+
+
+class ScanIndex:
+  """map the content hash of a scanned file to its first occurrence.
+
+     For disk images and archives the hashes of all contained files are
+     kept, too. So their results can be replayed if a duplicate is found.
+  """
+
+  VERSION = 1
+
+  def __init__(self):
+    self.entries = {}
+    self.dirty = False
+
+  def get_entry(self, hash_val):
+    return self.entries.get(hash_val)
+
+  def add_entry(self, hash_val, path, size):
+    e = ScanIndexEntry(path, size)
+    self.entries[hash_val] = e
+    self.dirty = True
+    return e
+
+  def set_children(self, hash_val, children):
+    self.entries[hash_val].children = children
+    self.dirty = True
+
+  def get_num_entries(self):
+    return len(self.entries)
+
+  def load(self, path):
+    """load index from file. returns False if missing or invalid"""
+    try:
+      with open(path, "rb") as fh:
+        data = marshal.load(fh)
+    except (IOError, EOFError, ValueError, TypeError):
+      return False
+    if type(data) is not tuple or len(data) != 2 or data[0] != self.VERSION:
+      return False
+    self.entries = {}
+    for hash_val, (path, size, children) in data[1].items():
+      if children is not None:
+        children = list(children)
+      self.entries[hash_val] = ScanIndexEntry(path, size, children)
+    self.dirty = False
+    return True
+
+  def save(self, path):
+    entries = {}
+    for hash_val, e in self.entries.items():
+      children = e.children
+      if children is not None:
+        children = tuple(children)
+      entries[hash_val] = (e.path, e.size, children)
+    atomic_write(path, marshal.dumps((self.VERSION, entries)))
+    self.dirty = False
@@ -3,10 +3,14 @@
 # fdtool <file.fd> ...
 #
 
+import os
 import sys
 import argparse
 
 import amitools.fd.FDFormat as FDFormat
+from amitools.fd.FDCache import FDCache
+import amitools.util.CacheDir as CacheDir
+import amitools.util.DataDir as DataDir
 
 # ----- dump -----
 
@@ -53,18 +57,44 @@ def generate_sasc_code(fname, fd, add_private, prefix=""):
       fo.write("{\n  return 0;\n}\n\n")
   fo.close()
 
+# ----- cache -----
+
+def build_cache(files):
+  """parse the fd files and store them in the fd cache used by vamos"""
+  cache_file = CacheDir.get_cache_file("fd.cache")
+  if cache_file is None:
+    print("no cache dir available: %s" % CacheDir.get_cache_dir())
+    return 1
+  if len(files) == 0:
+    fd_dir = DataDir.ensure_data_sub_dir("fd")
+    files = [os.path.join(fd_dir, f) for f in sorted(os.listdir(fd_dir))
+             if f.endswith(".fd")]
+  fd_cache = FDCache(cache_file)
+  for fname in files:
+    fd_cache.read_fd(fname)
+  fd_cache.save()
+  print("%s: %d fd files, %d parsed" % (cache_file, len(files), fd_cache.num_misses))
+  return 0
+
 # ----- main -----
 def main():
   # parse args
   parser = argparse.ArgumentParser()
-  parser.add_argument('files', nargs='+')
+  parser.add_argument('files', nargs='*')
   parser.add_argument('-P', '--add-private', action='store_true', default=False, help="add private functions")
   parser.add_argument('-p', '--gen-python', action='store_true', default=False, help="generate python code for vamos")
   parser.add_argument('-f', '--gen-fd', action='store', default=None, help="generate a new fd file")
   parser.add_argument('-c', '--gen-sasc', action='store', default=None, help="generate SAS C code file")
   parser.add_argument('-E', '--prefix', action='store', default='', help="add prefix to functions in C")
+  parser.add_argument('-C', '--build-cache', action='store_true', default=False, help="prebuild the fd cache of vamos (default: all fd files of amitools)")
   args = parser.parse_args()
 
+  # build cache
+  if args.build_cache:
+    return build_cache(args.files)
+  if len(args.files) == 0:
+    parser.error("no fd files given")
+
   # main loop
   files = args.files
   for fname in files:
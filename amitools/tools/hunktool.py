@@ -10,10 +10,12 @@ import sys
 import argparse
 import pprint
 import time
+import StringIO
 
 from amitools.scan.FileScanner import FileScanner
 from amitools.scan.ADFSScanner import ADFSScanner
 from amitools.scan.ArchiveScanner import ZipScanner, LhaScanner
+from amitools.scan.ScanIndex import ScanIndex
 from amitools.binfmt.hunk import Hunk
 from amitools.binfmt.hunk import HunkReader
 from amitools.binfmt.hunk import HunkShow
@@ -102,6 +104,27 @@ class HunkCommand:
       return True
     return self.handle_file(path, hunk_file, result, delta)
 
+  def process_file_worker(self, scan_file):
+    """process_file() in a scan worker. returns the ok flag, the output,
+       the counts and the failed files of this file for merge_result()"""
+    self.counts = {}
+    self.failed_files = []
+    old_stdout = sys.stdout
+    sys.stdout = out = StringIO.StringIO()
+    try:
+      ok = self.process_file(scan_file)
+    finally:
+      sys.stdout = old_stdout
+    return ok, out.getvalue(), self.counts, self.failed_files
+
+  def merge_result(self, scan_file, result):
+    ok, output, counts, failed_files = result
+    sys.stdout.write(output)
+    for code, num in counts.items():
+      self.counts[code] = self.counts.get(code, 0) + num
+    self.failed_files += failed_files
+    return ok
+
   def run(self):
     # setup error handler
     def error_handler(sf, e):
@@ -109,18 +132,40 @@ class HunkCommand:
       return not self.args.stop
     def warning_handler(sf, msg):
       print "WARNING", sf.get_path(), msg
+    def dup_handler(sf, orig_path):
+      print "DUPLICATE", sf.get_path(), "==", orig_path
+      return True
+    # setup index
+    index = None
+    index_file = self.args.scan_index
+    if self.args.dedup or index_file is not None:
+      index = ScanIndex()
+      if index_file is not None:
+        index.load(index_file)
     # setup scanners
     scanners = [ADFSScanner(), ZipScanner(), LhaScanner()]
-    scanner = FileScanner(self.process_file,
+    workers = self.args.workers
+    if workers > 1:
+      handler = self.process_file_worker
+    else:
+      handler = self.process_file
+    scanner = FileScanner(handler,
                           error_handler=error_handler,
                           warning_handler=warning_handler,
-                          scanners=scanners)
+                          scanners=scanners,
+                          index=index,
+                          dup_handler=dup_handler,
+                          workers=workers,
+                          result_handler=self.merge_result)
+    ok = True
     for path in self.args.files:
       ok = scanner.scan(path)
       if not ok:
         print "ABORTED"
-        return False
-    return True
+        break
+    if index_file is not None and index.dirty:
+      index.save(index_file)
+    return ok
 
 # ----- Validator -----
 
@@ -221,6 +266,9 @@ def main():
   parser.add_argument('-B', '--base-address', action='store', type=int, default=0, help="base address for relocation")
   parser.add_argument('-o', '--use-objdump', action='store_true', default=False, help="disassemble with m68k-elf-objdump instead of vda68k")
   parser.add_argument('-c', '--cpu', action='store', default='68000', help="disassemble for given cpu (objdump only)")
+  parser.add_argument('-u', '--dedup', action='store_true', default=False, help="report files and images with identical contents only once")
+  parser.add_argument('-I', '--scan-index', action='store', default=None, help="keep content index of scanned files in this file (implies -u)")
+  parser.add_argument('-j', '--workers', action='store', type=int, default=1, help="scan files in parallel with this number of processes")
   args = parser.parse_args()
 
   cmd = args.command
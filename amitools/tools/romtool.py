@@ -8,16 +8,22 @@ from __future__ import print_function
 import sys
 import argparse
 import os
+import json
 import logging
+import random
+import struct
+import time
 
 from amitools.util.Logging import *
 from amitools.util.HexDump import *
+from amitools.util.DataDiff import *
 import amitools.util.KeyValue as KeyValue
 from amitools.rom.RomSplitter import *
 from amitools.rom.RomBuilder import *
 from amitools.rom.RomPatcher import *
 from amitools.rom.KickRom import *
 from amitools.rom.ResidentScan import *
+from amitools.rom.RomAccess import RomAccess
 from amitools.binfmt.hunk.BinFmtHunk import BinFmtHunk
 from amitools.binfmt.BinFmt import BinFmt
 
@@ -194,14 +200,30 @@ def do_diff_cmd(args):
   if args.rom_addr:
     base_addr = int(args.rom_addr, 16)
   elif args.show_address:
-    kh = KickRom.Helper(rom_a)
+    kh = KickRom.KickRomAccess(rom_a)
     if kh.is_kick_rom():
       base_addr = kh.get_base_addr()
     else:
       logging.error("Not a KickROM! Can't detect base address.")
       return 3
-  print_hex_diff(rom_a, rom_b, num=args.columns, show_same=args.same,
-                 base_addr=base_addr)
+  ranges = diff_ranges(rom_a, rom_b)
+  logging.info("%d differing ranges with %d bytes", len(ranges),
+               get_diff_size(ranges))
+  fmt = args.format
+  if fmt == 'ranges':
+    print_diff_ranges(ranges, base_addr=base_addr)
+  elif fmt == 'json':
+    res = {
+      'base_addr' : base_addr,
+      'size_a' : size_a,
+      'size_b' : size_b,
+      'ranges' : [{'offset' : off, 'size' : size} for off, size in ranges]
+    }
+    print(json.dumps(res, indent=2, sort_keys=True))
+  else:
+    print_hex_diff(rom_a, rom_b, num=args.columns, show_same=args.same,
+                   base_addr=base_addr, ranges=ranges)
+  return 0
 
 
 def do_dump_cmd(args):
@@ -272,6 +294,9 @@ def do_patch_cmd(args):
     else:
       logging.error("error applying patch '%s'", name)
       return 2
+  # report changes
+  for off, size in rp.get_patch_diff():
+    logging.info("patched @%08x +%08x", off, size)
   # update kick sum
   rom_data = rp.get_patched_rom()
   if is_kick:
@@ -380,6 +405,47 @@ def do_scan_cmd(args):
       print("@%08x  +%08x  %-12s  %+4d  %s  %s" % (off, r.skip_off, nt, r.pri, name, id_string))
 
 
+def _gen_bench_rom(kib, base_addr=0xf80000):
+  """generate a pseudo random ROM image with some residents in it"""
+  size = kib * 1024
+  rnd = random.Random(kib)
+  rom = bytearray(rnd.getrandbits(8) for _ in xrange(size))
+  name_off = size - 0x100
+  rom[name_off:name_off+9] = b"bench.rom"
+  rom[name_off+9] = 0
+  struct.pack_into(">5I", rom, 0x200, 0xf80000, 0x1000000, 0xf00000,
+                   0xf80000, 0xffffffff)
+  for off in xrange(0x100, size - 0x1000, 0x4000):
+    struct.pack_into(">HII", rom, off, RTC_MATCHWORD,
+                     base_addr + off, base_addr + off + 0x1a)
+    struct.pack_into(">II", rom, off+14, base_addr + name_off,
+                     base_addr + name_off)
+  return rom
+
+
+def do_bench_cmd(args):
+  rounds = args.rounds
+  for kib in args.sizes:
+    rom = _gen_bench_rom(kib)
+    kh = KickRom.KickRomAccess(rom)
+    rs = ResidentScan(rom, 0xf80000)
+    rp = OneMegRomPatch()
+    ops = [
+      ('chk_sum', kh.calc_check_sum),
+      ('matchwords', rs.get_all_matchwords),
+      ('residents',
+       lambda: map(rs.get_resident, rs.get_all_resident_pos())),
+      ('1mb_rom', lambda: rp.apply_patch(RomAccess(bytearray(rom))))
+    ]
+    for name, func in ops:
+      start = time.time()
+      for i in xrange(rounds):
+        func()
+      delta = (time.time() - start) / rounds
+      print("%5d KiB  %-12s  %10.3f ms" % (kib, name, delta * 1000.0))
+  return 0
+
+
 def setup_list_parser(parser):
   parser.add_argument('-r', '--rom', default=None,
                       help='query rom name by wildcard')
@@ -447,6 +513,9 @@ def setup_diff_parser(parser):
                       help="diff ROMs even if size differs")
   parser.add_argument('-c', '--columns', default=8, type=int,
                       help="number of bytes shown per line")
+  parser.add_argument('-F', '--format', default='hex',
+                      choices=('hex', 'ranges', 'json'),
+                      help="output hex dump, list of ranges or json")
   parser.set_defaults(cmd=do_diff_cmd)
 
 
@@ -497,6 +566,14 @@ def setup_scan_parser(parser):
   parser.set_defaults(cmd=do_scan_cmd)
 
 
+def setup_bench_parser(parser):
+  parser.add_argument('-s', '--sizes', default=[256, 512, 1024], type=int,
+                      nargs='+', help="sizes of generated ROMs in KiB")
+  parser.add_argument('-r', '--rounds', default=10, type=int,
+                      help="number of rounds per operation")
+  parser.set_defaults(cmd=do_bench_cmd)
+
+
 def parse_args():
   """parse args and return (args, opts)"""
   parser = argparse.ArgumentParser(description=desc)
@@ -510,6 +587,9 @@ def parse_args():
   # sub parsers
   sub_parsers = parser.add_subparsers(help="sub commands")
 
+  # bench
+  bench_parser = sub_parsers.add_parser('bench', help='benchmark ROM access on generated images')
+  setup_bench_parser(bench_parser)
   # build
   build_parser = sub_parsers.add_parser('build', help='build a ROM from modules')
   setup_build_parser(build_parser)
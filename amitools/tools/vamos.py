@@ -10,18 +10,28 @@ import sys
 import argparse
 import os
 
+from amitools.vamos.Clock import get_time
+from amitools.vamos.StartupProfile import StartupProfile
+begin_time = get_time()
+
 from musashi import m68k
 from musashi import emu
 
 import amitools
 from amitools.vamos.Log import *
-from amitools.vamos.Vamos import Vamos
 from amitools.vamos.VamosConfig import VamosConfig
-from amitools.vamos.VamosRun import VamosRun
-from amitools.vamos.Process import Process
 
 # ----- main -----------------------------------------------------------------
-def main():
+def main(argv=None, machine=None):
+  """run vamos with the given args (default: sys.argv).
+     a machine, e.g. a VamosWorker, provides the cpu, memory and traps to
+     reuse the emulator of a former run.
+  """
+  start_time = begin_time
+  if machine is not None:
+    start_time = get_time()
+  prof = StartupProfile(start_time)
+  prof.phase("base")
   # retrieve vamos home and data dir
   home_dir = os.path.dirname(amitools.__file__)
   data_dir = os.path.join(home_dir, "data")
@@ -38,23 +48,36 @@ def main():
   parser.add_argument('-v', '--verbose', action='store_true', default=None, help="be more verbos")
   parser.add_argument('-q', '--quiet', action='store_true', default=None, help="do not output any logging")
   parser.add_argument('-b', '--benchmark', action='store_true', default=None, help="enable benchmarking")
+  parser.add_argument('--startup-profile', action='store_true', default=None, help="print the host time of each startup phase")
   parser.add_argument('-L', '--log-file', action='store', default=None, help="write all log messages to a file")
   # low-level tracing
   parser.add_argument('-I', '--instr-trace', action='store_true', default=None, help="enable instruction trace")
+  parser.add_argument('--instr-trace-depth', action='store', type=int, default=None, help="number of last instructions kept in trace")
+  parser.add_argument('--instr-trace-start', action='store', default=None, help="start instruction trace at this hex address")
+  parser.add_argument('--instr-trace-stop', action='store', default=None, help="stop instruction trace at this hex address")
   parser.add_argument('-t', '--memory-trace', action='store_true', default=None, help="enable memory tracing (slower)")
+  parser.add_argument('--memory-trace-range', action='store', default=None, help="only trace memory in ranges: <begin>[-<end>|+<size>][:rw124c],... (hex)")
   parser.add_argument('-T', '--internal-memory-trace', action='store_true', default=None, help="enable internal memory tracing (slow)")
   parser.add_argument('-r', '--reg-dump', action='store_true', default=None, help="add register dump to instruction trace")
+  # profiling
+  parser.add_argument('--profile-m68k', action='store_true', default=None, help="enable sampling profiler of m68k code")
+  parser.add_argument('--profile-m68k-period', action='store', type=int, default=None, help="cycles between two profiler samples")
+  parser.add_argument('--profile-m68k-file', action='store', default=None, help="write m68k profile to a callgrind file")
   # cpu emu
   parser.add_argument('-C', '--cpu', action='store', default=None, help="Set type of CPU to emulate (68000 or 68020)")
   parser.add_argument('-y', '--max-cycles', action='store', type=int, default=None, help="maximum number of cycles to execute")
   parser.add_argument('-B', '--cycles-per-block', action='store', type=int, default=None, help="cycles per block")
+  parser.add_argument('--max-cycles-per-block', action='store', type=int, default=None, help="max cycles per block if no traps are called")
   # system
   parser.add_argument('-m', '--ram-size', action='store', default=None, type=int, help="set RAM size in KiB")
   parser.add_argument('-s', '--stack-size', action='store', default=None, help="set stack size in KiB")
   parser.add_argument('-H', '--hw-access', action='store', default=None, help="What to do on direct HW access? (emu,ignore,abort,disable)")
   parser.add_argument('-x', '--shell',action='store_true', default=None, help="run an AmigaOs shell instead of a binary")
+  parser.add_argument('--resident', action='store_true', default=None, help="keep pure binaries resident after they exit")
+  parser.add_argument('--pure-bins', action='store', default=None, help="pure binaries that may stay resident: name,... or * for all (default: none)")
   # dirs
   parser.add_argument('-D', '--data-dir', action='store', default=None, help="set vamos data directory (default: %s)" % data_dir)
+  parser.add_argument('--no-fd-cache', action='store_false', dest='fd_cache', default=None, help="always parse the fd files and do not use the fd cache")
   # lib config
   parser.add_argument('-O', '--lib-options', action='append', default=None, help="set lib options: <lib>:<key>=<value>,...")
   # path config
@@ -64,7 +87,8 @@ def main():
   parser.add_argument('-p', '--path', action='append', default=None, help="define command search ami path, e.g. c:")
   parser.add_argument('-d', '--cwd', action='store', default=None, help="set current working directory")
   parser.add_argument('-P', '--pure-ami-paths', action='store_true', default=None, help="do not allow sys paths for binary")
-  args = parser.parse_args()
+  args = parser.parse_args(argv)
+  prof.phase("args")
 
   # --- init config ---
   cfg = VamosConfig(extra_file=args.config_file, skip_defaults=args.skip_default_configs, args=args, def_data_dir=data_dir)
@@ -74,6 +98,13 @@ def main():
     log_help()
     sys.exit(1)
   cfg.log()
+  prof.phase("config")
+
+  # the emulator is imported after the args are parsed
+  from amitools.vamos.Vamos import Vamos
+  from amitools.vamos.VamosRun import VamosRun
+  from amitools.vamos.Process import Process
+  prof.phase("imports")
 
   # ----- vamos! ---------------------------------------------------------------
   # setup CPU
@@ -85,7 +116,6 @@ def main():
     log_main.error("Invalid CPU type: %s" % cfg.cpu)
     sys.exit(1)
   log_main.info("setting up CPU: %s = %d" % (cfg.cpu, cpu_type))
-  cpu = emu.CPU(cpu_type)
 
   # setup memory
   if cfg.hw_access != "disable":
@@ -93,15 +123,26 @@ def main():
     if cfg.ram_size >= max_mem:
       log_main.error("too much RAM requested. max allowed KiB: %d", max_mem)
       sys.exit(1)
-  mem = emu.Memory(cfg.ram_size)
+  try:
+    if machine is not None:
+      # reset and reuse the emulator
+      cpu, mem, traps = machine.get_emu(cpu_type, cfg.ram_size)
+    else:
+      cpu = emu.CPU(cpu_type)
+      mem = emu.Memory(cfg.ram_size)
+      # setup traps
+      traps = emu.Traps()
+  except MemoryError as e:
+    log_main.error("%s", e)
+    sys.exit(1)
   log_main.info("setting up main memory with %s KiB RAM: top=%06x" % (cfg.ram_size, cfg.ram_size * 1024))
-
-  # setup traps
-  traps = emu.Traps()
+  prof.phase("cpu+mem")
 
   # combine to vamos instance
   vamos = Vamos(mem, cpu, traps, cfg)
+  prof.phase("vamos")
   vamos.init()
+  prof.phase("libs")
 
   # --- create main process ---
   # setup current working dir
@@ -125,15 +166,19 @@ def main():
   if not proc.ok:
     sys.exit(1)
   vamos.set_main_process(proc)
+  prof.phase("process")
 
   # ------ main loop ------
 
   # init cpu and initial registers
-  run = VamosRun(vamos, args.benchmark, args.shell)
+  run = VamosRun(vamos, args.benchmark, args.shell, start_time)
   run.init()
+  prof.phase("run init")
+  if cfg.startup_profile:
+    prof.dump()
 
   # main loop
-  exit_code = run.run(cfg.cycles_per_block, cfg.max_cycles)
+  exit_code = run.run(cfg.cycles_per_block, cfg.max_cycles, cfg.max_cycles_per_block)
 
   # free process
   proc.free()
@@ -0,0 +1,55 @@
+# CacheDir.py - return location of the user's amitools cache directory
+
+from __future__ import print_function
+
+import os
+import os.path
+
+def get_cache_dir():
+  """return the cache dir of amitools.
+
+     $AMITOOLS_CACHE_DIR overrides the default location which is
+     $XDG_CACHE_HOME/amitools or ~/.cache/amitools
+  """
+  cache_dir = os.environ.get("AMITOOLS_CACHE_DIR")
+  if cache_dir is None:
+    base_dir = os.environ.get("XDG_CACHE_HOME")
+    if base_dir is None:
+      base_dir = os.path.join(os.path.expanduser("~"), ".cache")
+    cache_dir = os.path.join(base_dir, "amitools")
+  return os.path.abspath(cache_dir)
+
+def get_cache_file(file_name):
+  """return path of a file in the cache dir and create the dir if missing.
+     returns None if the cache dir is not available"""
+  cache_dir = get_cache_dir()
+  if not os.path.isdir(cache_dir):
+    try:
+      os.makedirs(cache_dir)
+    except OSError:
+      # maybe someone else created it in the meantime
+      if not os.path.isdir(cache_dir):
+        return None
+  return os.path.join(cache_dir, file_name)
+
+def atomic_write(path, data):
+  """write the data string to a file in one step.
+
+     the data goes to a temp file first that is then renamed. so
+     concurrent readers see either the old or the new file.
+  """
+  tmp_path = "%s.%d" % (path, os.getpid())
+  with open(tmp_path, "wb") as fh:
+    fh.write(data)
+  try:
+    os.rename(tmp_path, path)
+  except OSError:
+    # windows can't rename onto an existing file
+    os.remove(path)
+    os.rename(tmp_path, path)
+
+
+# ----- mini test -----
+if __name__ == '__main__':
+  print("cache_dir:", get_cache_dir())
+  print("cache_file:", get_cache_file("test.cache"))
@@ -0,0 +1,87 @@
+# DataDiff.py
+#
+# find differing byte ranges in two large binary blobs
+
+from __future__ import print_function
+
+
+def _diff_leaf(ma, mb, off, size, res):
+  """compare a small range byte by byte and add exact ranges"""
+  a = bytearray(ma[off:off+size])
+  b = bytearray(mb[off:off+size])
+  start = None
+  for i in xrange(size):
+    if a[i] != b[i]:
+      if start is None:
+        start = i
+    elif start is not None:
+      _add_range(res, off + start, i - start)
+      start = None
+  if start is not None:
+    _add_range(res, off + start, size - start)
+
+
+def _add_range(res, off, size):
+  """add range and merge with last one if adjacent"""
+  if len(res) > 0:
+    last_off, last_size = res[-1]
+    if last_off + last_size == off:
+      res[-1] = (last_off, last_size + size)
+      return
+  res.append((off, size))
+
+
+def _diff_chunk(ma, mb, off, size, min_size, res):
+  # equal chunks are skipped with a single compare
+  if ma[off:off+size] == mb[off:off+size]:
+    return
+  if size <= min_size:
+    _diff_leaf(ma, mb, off, size, res)
+    return
+  # narrow down
+  half = size // 2
+  _diff_chunk(ma, mb, off, half, min_size, res)
+  _diff_chunk(ma, mb, off + half, size - half, min_size, res)
+
+
+def diff_ranges(a_data, b_data, chunk_size=4096, min_size=16):
+  """return a sorted list of (offset, size) ranges where a and b differ.
+
+     Data is compared in chunks of chunk_size. Only differing chunks are
+     narrowed down by bisection until min_size is reached. If the sizes
+     differ then the excess bytes of the larger blob are a difference, too.
+  """
+  ma = memoryview(a_data)
+  mb = memoryview(b_data)
+  na = len(a_data)
+  nb = len(b_data)
+  n = min(na, nb)
+  res = []
+  off = 0
+  while off < n:
+    size = min(chunk_size, n - off)
+    _diff_chunk(ma, mb, off, size, min_size, res)
+    off += size
+  if na != nb:
+    _add_range(res, n, max(na, nb) - n)
+  return res
+
+
+def get_diff_size(ranges):
+  """return the total number of differing bytes"""
+  return sum(r[1] for r in ranges)
+
+
+def print_diff_ranges(ranges, out=print, base_addr=0):
+  for off, size in ranges:
+    out("@%08x  +%08x" % (base_addr + off, size))
+
+
+# mini test
+if __name__ == '__main__':
+  a = "hello, world!" * 1000
+  b = bytearray(a)
+  b[7] = ord('W')
+  b[5000:5003] = b"xyz"
+  print(diff_ranges(a, b))
+  print(diff_ranges(a, a[:-3]))
@@ -2,6 +2,8 @@
 
 from __future__ import print_function
 
+from amitools.util.DataDiff import diff_ranges
+
 
 def _get_vis_char(d):
   v = ord(d)
@@ -68,19 +70,33 @@ def get_hex_diff_line(addr, a_line, b_line, indent=0, num=16):
   return out
 
 def print_hex_diff(a_data, b_data, indent=0, num=16, out=print,
-                   show_same=False, base_addr=0):
+                   show_same=False, base_addr=0, ranges=None):
+  """print a hex dump of the differing lines of a and b.
+
+     If no diff ranges are given then they are calculated with
+     diff_ranges() and only lines touching a range are visited.
+  """
   na = len(a_data)
   nb = len(b_data)
   n = max(na, nb)
-  o = 0
-  addr = base_addr
-  while o < n:
+  if show_same:
+    lines = xrange(0, n, num)
+  else:
+    if ranges is None:
+      ranges = diff_ranges(a_data, b_data)
+    lines = []
+    for off, size in ranges:
+      o = off - off % num
+      if len(lines) > 0 and lines[-1] >= o:
+        o = lines[-1] + num
+      end = off + size
+      while o < end:
+        lines.append(o)
+        o += num
+  for o in lines:
     a_line = a_data[o:o+num]
     b_line = b_data[o:o+num]
-    if show_same or a_line != b_line:
-      out(get_hex_diff_line(addr, a_line, b_line, indent, num))
-    o += num
-    addr += num
+    out(get_hex_diff_line(base_addr + o, a_line, b_line, indent, num))
 
 
 # mini test
@@ -9,7 +9,7 @@ class AccessStruct(AccessMemory):
     self.struct_type_name = self.struct_def.get_type_name()
 
   def w_s(self, name, val):
-    off,width,conv = self.struct_def.get_offset_for_name(name)
+    off,width,conv = self.struct_def.get_field(name)
     if conv != None:
       val = conv[0](val)
     addr = self.struct_addr + off
@@ -18,7 +18,7 @@ class AccessStruct(AccessMemory):
       self.label_mgr.trace_int_mem('W', width, addr, val, text="Struct", addon="%s+%d = %s" % (self.struct_type_name, off, name), level=logging.INFO)
 
   def r_s(self, name):
-    off,width,conv = self.struct_def.get_offset_for_name(name)
+    off,width,conv = self.struct_def.get_field(name)
     addr = self.struct_addr + off
     val = self.raw_mem.read(width, addr)
     if conv != None:
@@ -28,5 +28,95 @@ class AccessStruct(AccessMemory):
     return val
 
   def s_get_addr(self, name):
-    off,width,conv = self.struct_def.get_offset_for_name(name)
+    off,width,conv = self.struct_def.get_field(name)
     return self.struct_addr + off
+
+  # bulk access
+
+  def read_all(self):
+    """read all leaf fields with a single transfer and return a dict"""
+    return self.read_fields(None)
+
+  def read_fields(self, names):
+    """read the given leaf fields with a single transfer and return a dict"""
+    layout = self.struct_def.get_layout(names)
+    data = self.r_data(self.struct_addr + layout.offset, layout.size)
+    return layout.decode(data)
+
+  def write_fields(self, values):
+    """write a name -> value dict of leaf fields with a single transfer.
+       if the fields are not contiguous then the gaps are read first"""
+    layout = self.struct_def.get_layout(values.keys())
+    addr = self.struct_addr + layout.offset
+    if len(layout.runs) == 1:
+      data = layout.encode(values)
+    else:
+      data = layout.encode(values, self.r_data(addr, layout.size))
+    self.w_data(addr, data)
+
+
+# mini benchmark: struct heavy library calls
+if __name__ == '__main__':
+  import time
+  from musashi import emu
+  import amitools.vamos.lib.lexec.ExecStruct
+  from amitools.vamos.lib.dos.DosStruct import DateTimeDef, InfoDataDef, FileInfoBlockDef
+
+  class Mem:
+    def __init__(self, raw_mem):
+      self.raw_mem = raw_mem
+
+  def old_r_s(a, name):
+    off,width,conv = a.struct_def.get_offset_for_name(name)
+    val = a.raw_mem.read(width, a.struct_addr + off)
+    if conv != None:
+      val = conv[1](val)
+    return val
+
+  def old_w_s(a, name, val):
+    off,width,conv = a.struct_def.get_offset_for_name(name)
+    if conv != None:
+      val = conv[0](val)
+    a.raw_mem.write(width, a.struct_addr + off, val)
+
+  mem = Mem(emu.Memory(64))
+  dt = AccessStruct(mem, DateTimeDef, 0x1000)
+  info = AccessStruct(mem, InfoDataDef, 0x2000)
+  fib = AccessStruct(mem, FileInfoBlockDef, 0x3000)
+  dt_names = sorted(DateTimeDef.get_leaves().keys())
+  info_vals = dict([(n, 0x100) for n in InfoDataDef.get_leaves().keys()])
+  fib_names = ('fib_DirEntryType', 'fib_Protection', 'fib_Size', 'fib_NumBlocks',
+               'fib_Date.ds_Days', 'fib_Date.ds_Minute', 'fib_Date.ds_Tick')
+
+  def run_old():
+    for n in dt_names:
+      old_r_s(dt, n)
+    for n, v in info_vals.items():
+      old_w_s(info, n, v)
+    for n in fib_names:
+      old_r_s(fib, n)
+
+  def run_fields():
+    for n in dt_names:
+      dt.r_s(n)
+    for n, v in info_vals.items():
+      info.w_s(n, v)
+    for n in fib_names:
+      fib.r_s(n)
+
+  def run_bulk():
+    dt.read_all()
+    info.write_fields(info_vals)
+    fib.read_fields(fib_names)
+
+  num = 20000
+  res = []
+  for name, func in (("uncached r_s/w_s", run_old),
+                     ("cached r_s/w_s", run_fields),
+                     ("bulk", run_bulk)):
+    t = time.time()
+    for i in xrange(num):
+      func()
+    res.append(time.time() - t)
+    print "%-20s %d calls: %.3fs" % (name, num, res[-1])
+  print "speedup: cached %.1fx, bulk %.1fx" % (res[0] / res[1], res[0] / res[2])
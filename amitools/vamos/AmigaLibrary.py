@@ -1,9 +1,10 @@
 from CPU import *
 from Log import *
+from Exceptions import VamosInternalError
 
 import logging
-import time
-import inspect
+from Clock import get_time
+import types
 import sys, traceback
 
 from label.LabelLib import LabelLib
@@ -33,6 +34,8 @@ class AmigaLibrary:
     self.log_dummy_call = False
     self.benchmark = False
     self.catch_ex = True
+    # use C implementations of functions if available
+    self.use_native = False
 
     # proposal of size
     self.pos_size = self.struct.get_size()
@@ -78,12 +81,12 @@ class AmigaLibrary:
 
   def _get_class_methods(self):
     """return a map with method name to bound method mapping of this class"""
-    members = inspect.getmembers(self, predicate=inspect.ismethod)
+    # avoid inspect module: it is expensive to import
     result = {}
-    for member in members:
-      name = member[0]
-      method = member[1]
-      result[name] = method
+    for name in dir(self):
+      method = getattr(self, name)
+      if isinstance(method, types.MethodType):
+        result[name] = method
     return result
 
   def get_callee_pc(self,ctx):
@@ -121,19 +124,43 @@ class AmigaLibrary:
         ctx.cpu.w_reg(REG_D0, 0)
     return call_stub
 
-  def _generate_fast_call_stub(self, ctx, method):
-    """generate a fast call stub without any processing"""
-    def call_stub(op, pc):
-      """the generic call stub: call python bound method and
-         if return value exists then set it in CPU's D0 register"""
-      d0 = method(ctx)
-      if d0 != None:
-        if type(d0) is list:
-          ctx.cpu.w_reg(REG_D0, d0[0] & 0xffffffff)
-          ctx.cpu.w_reg(REG_D1, d0[1] & 0xffffffff)
-        else:
-          ctx.cpu.w_reg(REG_D0, d0 & 0xffffffff)
-    return call_stub
+  def _get_arg_regs(self, name, method, args):
+    """return the FD argument registers if the method takes them as
+       positional arguments: def Func(self, ctx, arg1, arg2, ...)
+
+       returns None for methods that only take ctx and read the registers
+       themselves. Arguments with default values are not marshalled.
+    """
+    func = method.im_func
+    num_pos = func.func_code.co_argcount - 2
+    if func.func_defaults is not None:
+      num_pos -= len(func.func_defaults)
+    if num_pos <= 0:
+      return None
+    if args is None:
+      args = []
+    if num_pos != len(args):
+      raise VamosInternalError("%s: method takes %d args but FD declares %d" % (name, num_pos, len(args)))
+    regs = []
+    for a in args:
+      reg = a[1]
+      reg_num = int(reg[1])
+      if reg[0] == 'a':
+        reg_num += 8
+      regs.append(reg_num)
+    return tuple(regs)
+
+  def _generate_fast_call_stub(self, ctx, method, regs=None):
+    """generate a fast call stub without any processing.
+       the registers are fetched and D0/D1 are set in the emu extension
+    """
+    if regs is None:
+      regs = ()
+    if self.catch_ex:
+      exc_handler = self._handle_exc
+    else:
+      exc_handler = None
+    return ctx.traps.create_reg_stub(method, ctx, regs, exc_handler)
 
   def _generate_call_stub(self, ctx, bias, name, method=None, args=None):
     """generate a call stub for this given bound method
@@ -145,9 +172,11 @@ class AmigaLibrary:
     if method == None:
       return self._generate_dummy_call_stub(ctx, bias, name, args)
 
+    regs = self._get_arg_regs(name, method, args)
+
     # if extra processing is disabled then create a compact call stub
-    if not self.log_call and not self.benchmark and not self.profile and not self.catch_ex:
-      return self._generate_fast_call_stub(ctx, method)
+    if not self.log_call and not self.benchmark and not self.profile:
+      return self._generate_fast_call_stub(ctx, method, regs)
 
     # ... otherwise processing is enabled and we need to synthesise a
     # suitable call stub
@@ -162,15 +191,17 @@ class AmigaLibrary:
 
     # timing code
     if need_timing:
-      code.append('  start = time.clock()')
+      code.append('  start = get_time()')
 
     # main call: call method and evaluate result
-    code.append('  d0 = method(ctx)')
+    if regs is None:
+      code.append('  d0 = method(ctx)')
+    else:
+      code.append('  d0 = method(ctx, *ctx.cpu.r_regs(regs))')
     code.append('  if d0 != None:')
-    code.append('    if type(d0) is list:')
-    code.append('      ctx.cpu.w_reg(REG_D0, d0[0] & 0xffffffff)')
-    code.append('      ctx.cpu.w_reg(REG_D1, d0[1] & 0xffffffff)')
-    code.append('      res = "d0=%08x  d1=%08x" % d0')
+    code.append('    if type(d0) in (list, tuple):')
+    code.append('      ctx.cpu.w_d0_d1(d0[0] & 0xffffffff, d0[1] & 0xffffffff)')
+    code.append('      res = "d0=%08x  d1=%08x" % tuple(d0)')
     code.append('    else:')
     code.append('      ctx.cpu.w_reg(REG_D0, d0 & 0xffffffff)')
     code.append('      res = "d0=%08x" % d0')
@@ -179,7 +210,7 @@ class AmigaLibrary:
 
     # timing code
     if need_timing:
-      code.append('  end = time.clock()')
+      code.append('  end = get_time()')
       code.append('  delta = end - start')
     if self.profile:
       code.append('  self._account_profile_data(name, delta)')
@@ -213,23 +244,57 @@ class AmigaLibrary:
     """
     # get call stub
     call_stub = self._generate_call_stub(ctx, bias, name, method, args)
-    # allocate a trap
+    return self._setup_trap(ctx, bias, name, call_stub) >= 0
+
+  def _setup_trap(self, ctx, bias, name, call_stub):
+    """allocate a trap for the stub and patch it into the jump table.
+       returns the trap id or -1 if no trap is available
+    """
     tid = ctx.traps.setup(call_stub, auto_rts=True)
     if tid < 0:
       self.log("patch $%04x: '%s' -> NO TRAP AVAILABLE" % (bias, name), level=logging.ERROR)
-      return False
+      return tid
     # generate opcode
     op = 0xa000 | tid
     # patch the lib in memory
     addr = self.addr_base - bias
     self.traps.append(tid)
     ctx.mem.access.w16(addr,op)
-    self.log("patch $%04x: op=$%04x '%s' [%s]" % (bias, op, name, method), level=logging.DEBUG)
-    return True
+    self.log("patch $%04x: op=$%04x '%s' [%s]" % (bias, op, name, call_stub), level=logging.DEBUG)
+    return tid
+
+  def _generate_lazy_stub(self, ctx, lazy_map):
+    """generate the stub of the shared trap of all jump table entries.
+
+       the called bias is derived from the pc of the trap opcode. On the
+       first call of an implemented method its real stub is created and
+       gets its own trap. Dummy functions always stay on the shared trap.
+    """
+    stubs = {}
+    def lazy_stub(op, pc):
+      bias = self.addr_base - pc
+      stub = stubs.get(bias)
+      if stub is None:
+        if bias not in lazy_map:
+          raise VamosInternalError("%s: invalid lib call at PC=%06x" % (self.name, pc))
+        name, method, args = lazy_map[bias]
+        stub = self._generate_call_stub(ctx, bias, name, method, args)
+        # keep dispatching dummies (and stubs without trap) via this trap
+        if method is None or self._setup_trap(ctx, bias, name, stub) < 0:
+          stubs[bias] = stub
+        elif self.lib_mgr is not None:
+          self.lib_mgr.num_lazy_stubs += 1
+      if self.lib_mgr is not None:
+        self.lib_mgr.num_shared_calls += 1
+      stub(op, pc)
+    return lazy_stub
 
   def trap_class_entries(self, ctx, add_private=False):
     """look up all names (from fd) and if members of this class match then trap the function.
 
+       all entries share a single trap first. The stub of a method is created
+       on its first call.
+
        return (number of methods patched, number of dummies patched)
     """
     # this works only with fd file!
@@ -248,9 +313,10 @@ class AmigaLibrary:
 
     # loop over all biases
     bias = 6
-    addr = self.addr_base - bias
     num_dummy = 0
     num_method = 0
+    lazy_map = {}
+    use_native = self._can_use_native()
     while bias < self.neg_size:
       # bias is found in FD
       if bias in bias_map:
@@ -265,15 +331,45 @@ class AmigaLibrary:
         else:
           method = None
           num_dummy += 1
-
-        # now trap entry
-        self.trap_lib_entry(ctx, bias, name, method, args)
-
-      addr -= 6
+        # C implementations get their trap right away
+        if use_native and ctx.traps.has_native(self.name, name):
+          if self._setup_native_trap(ctx, bias, name) >= 0:
+            bias += 6
+            continue
+        lazy_map[bias] = (name, method, args)
       bias += 6
 
+    # now patch all entries with the shared trap
+    if len(lazy_map) > 0:
+      lazy_stub = self._generate_lazy_stub(ctx, lazy_map)
+      tid = ctx.traps.setup(lazy_stub, auto_rts=True)
+      if tid < 0:
+        self.log("patch: NO TRAP AVAILABLE for shared trap", level=logging.ERROR)
+        return None
+      self.traps.append(tid)
+      op = 0xa000 | tid
+      for bias in lazy_map:
+        ctx.mem.access.w16(self.addr_base - bias, op)
+      self.log("patch: shared op=$%04x for %d entries" % (op, len(lazy_map)), level=logging.DEBUG)
+
     return (num_method, num_dummy)
 
+  def _can_use_native(self):
+    """C implementations bypass call logging, profiling and memory tracing"""
+    return self.use_native and not self.profile
+
+  def _setup_native_trap(self, ctx, bias, name):
+    """patch a trap calling the C implementation of the function"""
+    tid = ctx.traps.setup_native(self.name, name, auto_rts=True)
+    if tid < 0:
+      self.log("patch $%04x: '%s' -> NO TRAP AVAILABLE" % (bias, name), level=logging.ERROR)
+      return tid
+    op = 0xa000 | tid
+    self.traps.append(tid)
+    ctx.mem.access.w16(self.addr_base - bias, op)
+    self.log("patch $%04x: op=$%04x '%s' [native]" % (bias, op, name), level=logging.DEBUG)
+    return tid
+
   def create_empty_jump_table(self, ctx):
     """create a table full of RESET opcodes for all function entries"""
     bias = 6
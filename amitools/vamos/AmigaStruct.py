@@ -1,3 +1,5 @@
+import struct
+
 struct_pool = {}
 
 class InvalidAmigaTypeException(Exception):
@@ -11,7 +13,116 @@ def w_bptr(addr):
   
 def r_bptr(addr):
   return addr << 2
-  
+
+# struct format chars and masks of the widths
+_width_fmts = ('B', 'H', 'I')
+_width_masks = (0xff, 0xffff, 0xffffffff)
+
+class StructLayout:
+  """a compiled layout of a set of leaf fields of a struct.
+
+     all fields are read with a single memory transfer spanning from the
+     first to the last field and decoded by a precompiled struct.Struct.
+     arrays are moved as a whole: byte arrays as strings, others as tuples.
+  """
+  def __init__(self, fields):
+    # fields: (off, width, count, conv, name) sorted by offset
+    self.fields = fields
+    self.names = [f[4] for f in fields]
+    self.offset = fields[0][0]
+    last = fields[-1]
+    self.size = last[0] + last[2] * (1 << last[1]) - self.offset
+    # decode: one struct for the whole span, gaps are skipped
+    fmt = ">"
+    # encode: one struct per contiguous run of fields
+    self.runs = []
+    run_off = None
+    run_fmt = None
+    run_num = 0
+    pos = self.offset
+    for off, width, count, conv, name in fields:
+      if off < pos:
+        raise ValueError("Overlapping field: %s" % name)
+      if off > pos:
+        fmt += "%dx" % (off - pos)
+        if run_fmt is not None:
+          self.runs.append((run_off - self.offset, struct.Struct(run_fmt), run_num))
+          run_fmt = None
+      if run_fmt is None:
+        run_off = off
+        run_fmt = ">"
+        run_num = 0
+      f = self._field_fmt(width, count)
+      fmt += f
+      run_fmt += f
+      if count > 1 and width > 0:
+        run_num += count
+      else:
+        run_num += 1
+      pos = off + count * (1 << width)
+    self.runs.append((run_off - self.offset, struct.Struct(run_fmt), run_num))
+    self.struct = struct.Struct(fmt)
+    # per field: (name, number of values or 0 for a single value, conv, mask)
+    self.values = []
+    for off, width, count, conv, name in fields:
+      if count > 1 and width > 0:
+        num = count
+      else:
+        num = 0
+      self.values.append((name, num, conv, _width_masks[width]))
+
+  def _field_fmt(self, width, count):
+    if count == 1:
+      return _width_fmts[width]
+    elif width == 0:
+      return "%ds" % count
+    else:
+      return "%d%s" % (count, _width_fmts[width])
+
+  def decode(self, data):
+    """convert the data of the span to a name -> value dict"""
+    raw = self.struct.unpack(data)
+    res = {}
+    pos = 0
+    for name, num, conv, mask in self.values:
+      if num == 0:
+        val = raw[pos]
+        pos += 1
+        if conv is not None:
+          val = conv[1](val)
+      else:
+        val = raw[pos:pos+num]
+        pos += num
+      res[name] = val
+    return res
+
+  def encode(self, values, data=None):
+    """convert a name -> value dict to the data of the span.
+       if data is given then the gaps are taken from it"""
+    raw = []
+    for name, num, conv, mask in self.values:
+      val = values[name]
+      if num == 0:
+        if conv is not None:
+          val = conv[0](val)
+        if type(val) is not str:
+          val &= mask
+        raw.append(val)
+      else:
+        raw.extend(val)
+    if len(self.runs) == 1:
+      return self.runs[0][1].pack(*raw)
+    if data is None:
+      buf = bytearray(self.size)
+    else:
+      buf = bytearray(data)
+    pos = 0
+    for off, st, num in self.runs:
+      st.pack_into(buf, off, *raw[pos:pos+num])
+      pos += num
+    return str(buf)
+
+
 class AmigaStruct:
   
   # overwrite these in derived class!
@@ -75,6 +186,10 @@ class AmigaStruct:
     self._lookup = lookup
     self._sub_types = sub_types
     self._pointers = pointers
+    # name -> (off, width, conv) and names -> StructLayout caches
+    self._field_cache = {}
+    self._layout_cache = {}
+    self._leaves = None
   
   def __str__(self):
     return "[Struct: %s size=%d]" % (self._name,self._total_size)
@@ -132,6 +247,62 @@ class AmigaStruct:
     parts = name.split('.')
     return self._get_offset_loop(parts)
   
+  # cached version of get_offset_for_name()
+  def get_field(self, name):
+    field = self._field_cache.get(name)
+    if field is None:
+      field = self.get_offset_for_name(name)
+      self._field_cache[name] = field
+    return field
+
+  # return the StructLayout of the given leaf fields or of all
+  def get_layout(self, names=None):
+    if names is None:
+      key = None
+    else:
+      key = tuple(sorted(names))
+    layout = self._layout_cache.get(key)
+    if layout is None:
+      leaves = self.get_leaves()
+      if key is None:
+        fields = leaves.values()
+      else:
+        fields = []
+        for name in key:
+          if not leaves.has_key(name):
+            raise ValueError("Invalid leaf field %s: %s" % (self, name))
+          fields.append(leaves[name])
+      fields.sort()
+      layout = StructLayout(fields)
+      self._layout_cache[key] = layout
+    return layout
+
+  # return name -> (off, width, count, conv, name) of all leaf fields.
+  # embedded structs are flattened and arrays of structs are skipped.
+  def get_leaves(self):
+    if self._leaves is None:
+      leaves = {}
+      self._add_leaves(leaves, "", 0)
+      self._leaves = leaves
+    return self._leaves
+
+  def _add_leaves(self, leaves, prefix, base):
+    for num in xrange(len(self._format)):
+      type_name, name = self._format[num]
+      off = base + self._offsets[num]
+      name = prefix + name
+      sub_type = self._sub_types[num]
+      if self._pointers[num]:
+        count = self._sizes[num] / 4
+        leaves[name] = (off, 2, count, None, name)
+      elif sub_type is not None:
+        if self._sizes[num] == sub_type.get_size():
+          sub_type._add_leaves(leaves, name + ".", off)
+      else:
+        width, conv = self._types[self._gen_pure_name(type_name)]
+        count = self._sizes[num] >> width
+        leaves[name] = (off, width, count, conv, name)
+
   def _get_offset_loop(self, parts, base=0):
     name = parts[0]
     if not self._lookup.has_key(name):
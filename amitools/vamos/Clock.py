@@ -0,0 +1,6 @@
+"""a monotonic high resolution clock for timing and benchmarks"""
+
+try:
+  from time import perf_counter as get_time
+except ImportError:
+  from musashi.emu import get_monotonic_time as get_time
@@ -1,6 +1,7 @@
 from Log import log_main
 from Exceptions import *
 import sys
+import logging
 import traceback
 import CPU
 
@@ -15,6 +16,8 @@ class ErrorTracker:
     self.other_tb = None
     self.other_type = None
     self.other_value = None
+    # set if an instruction trace is recorded
+    self.instr_trace = None
 
   # direct callback from MEM module -> on error
   def report_invalid_memory(self, mode, width, addr):
@@ -28,6 +31,8 @@ class ErrorTracker:
     self.has_errors = True
     self.cpu_state = CPU.CPUState()
     self.cpu_state.get(self.cpu)
+    # end the current time slice of the CPU
+    self.cpu.end()
     if isinstance(e, VamosError):
       self.vamos_error = e
     else:
@@ -72,6 +77,14 @@ class ErrorTracker:
       for t in self.other_tb:
         log_main.error("%s:%d in %s: %s",*t)
 
+  # show the last instructions before the error
+  def dump_instr_trace(self):
+    if self.instr_trace is None:
+      return
+    self.instr_trace.stop()
+    self.instr_trace.dump(level=logging.ERROR)
+
   def dump(self):
+    self.dump_instr_trace()
     self.dump_vamos_error()
     self.dump_other_error()
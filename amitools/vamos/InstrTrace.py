@@ -0,0 +1,62 @@
+import logging
+
+from CPU import CPUState
+from Log import log_instr
+
+class InstrTrace:
+  """the instruction trace is recorded by the CPU emu in a ring buffer.
+     the entries are only decoded and symbolized when they are dumped.
+  """
+
+  def __init__(self, cpu, label_mgr, depth=4096, with_regs=False,
+               start_pc=None, stop_pc=None):
+    self.cpu = cpu
+    self.label_mgr = label_mgr
+    self.depth = depth
+    self.with_regs = with_regs
+    self.start_pc = start_pc
+    self.stop_pc = stop_pc
+
+  def start(self):
+    self.cpu.itrace_start(self.depth, self.with_regs, self.start_pc, self.stop_pc)
+
+  def stop(self):
+    self.cpu.itrace_stop()
+
+  def get_total(self):
+    return self.cpu.itrace_get_total()
+
+  def decode(self, num=None):
+    """return the text lines of the last num (or all) instructions"""
+    res = []
+    for pc, words, regs in self.cpu.itrace_get_entries(num):
+      # add register dump
+      if regs is not None:
+        state = CPUState()
+        state.pc = pc
+        state.dx = regs[0:8]
+        state.ax = regs[8:16]
+        state.sr = regs[16]
+        res += state.dump()
+      # disassemble line
+      label, sym, src = self.label_mgr.get_disasm_info(pc)
+      if len(words) > 0:
+        _, txt = self.cpu.disassemble_words(pc, words)
+      else:
+        txt = "<unreadable>"
+      if sym is not None:
+        res.append("%s%s:" % (" "*40, sym))
+      if src is not None:
+        res.append("%s%s" % (" "*50, src))
+      res.append("%-40s  %06x    %-20s" % (label, pc, txt))
+    return res
+
+  def dump(self, num=None, level=logging.INFO):
+    total = self.get_total()
+    if num is None or num > total:
+      num = total
+    if num > self.depth:
+      num = self.depth
+    log_instr.log(level, "--- last %d of %d traced instructions ---", num, total)
+    for line in self.decode(num):
+      log_instr.log(level, line)
@@ -7,8 +7,10 @@ from lib.lexec.ExecStruct import LibraryDef
 from Exceptions import *
 from Log import log_libmgr, log_lib
 import amitools.fd.FDFormat as FDFormat
+from amitools.fd.FDCache import FDCache
+import amitools.util.CacheDir as CacheDir
 import logging
-import time
+from Clock import get_time
 import os
 
 class LibManager():
@@ -20,8 +22,16 @@ class LibManager():
     self.cfg = cfg
     self.data_dir = cfg.data_dir
 
+    # parsed fd files are kept in the user's cache dir
+    self.fd_cache = None
+    if cfg.fd_cache:
+      self.fd_cache = FDCache(CacheDir.get_cache_file("fd.cache"))
+
     # map of registered libs: name -> AmigaLibrary
     self.vamos_libs = {}
+    # map of libs created on first open: name -> factory(lib_cfg)
+    self.lazy_libs = {}
+    self.num_lazy_libs = 0
     # map of opened libs: base_addr -> AmigaLibrary
     self.open_libs_addr = {}
     self.open_libs_name = {}
@@ -30,9 +40,15 @@ class LibManager():
     self.log_call = log_lib.isEnabledFor(logging.INFO)
     self.log_dummy_call = log_lib.isEnabledFor(logging.WARN)
     self.benchmark = cfg.benchmark
+    # C implementations of lib functions can't be traced
+    self.use_native = not self.log_call and not cfg.memory_trace and \
+                      not cfg.internal_memory_trace
 
     # libs will accumulate this if benchmarking is enabled
     self.bench_total = 0.0
+    # trap usage of the libs' jump tables
+    self.num_lazy_stubs = 0
+    self.num_shared_calls = 0
 
     # --- config for auto lib ---
     # black and white list for auto creation of libs
@@ -48,8 +64,23 @@ class LibManager():
     lib.log_call = self.log_call
     lib.log_dummy_call = self.log_dummy_call
     lib.benchmark = self.benchmark
+    lib.use_native = self.use_native
     lib.lib_mgr = self
 
+  def register_lazy_vamos_lib(self, name, factory):
+    """register a vamos library that is created by factory(lib_cfg)
+       when it is opened the first time. this keeps the startup fast"""
+    self.lazy_libs[name] = factory
+
+  def _create_lazy_vamos_lib(self, sane_name):
+    factory = self.lazy_libs.pop(sane_name)
+    begin = get_time()
+    lib = factory(self.cfg.get_lib_config(sane_name))
+    self.register_vamos_lib(lib)
+    self.num_lazy_libs += 1
+    self.lib_log("open_lib","created vamos lib '%s' lazily in %fs" % (sane_name, get_time() - begin))
+    return lib
+
   def unregister_vamos_lib(self, lib):
     """unregister your vamos library class"""
     del self.vamos_libs[lib.get_name()]
@@ -99,6 +130,10 @@ class LibManager():
     # lib has to be openend
     else:
 
+      # create a lazy vamos library now
+      if sane_name in self.lazy_libs:
+        self._create_lazy_vamos_lib(sane_name)
+
       # first check if its an internal vamos library
       if sane_name in self.vamos_libs:
         self.lib_log("open_lib","opening vamos lib: %s" % sane_name)
@@ -296,9 +331,9 @@ class LibManager():
     # check seg list for resident library struct
     seg0 = lib.seg_list.segments[0]
     ar = AmigaResident(seg0.addr, seg0.size, ctx.mem)
-    start = time.clock()
+    start = get_time()
     res_list = ar.find_residents()
-    end = time.clock()
+    end = get_time()
     delta = end - start;
     if res_list == None or len(res_list) != 1:
       self.lib_log("load_lib","No single resident in %s found!" % load_name, level=logging.ERROR)
@@ -500,6 +535,11 @@ class LibManager():
 
     self.lib_log("free_lib","vamos mem library %s is free()ed" % lib.name)
 
+  def save_fd_cache(self):
+    """store newly parsed fd files in the fd cache"""
+    if self.fd_cache is not None:
+      self.fd_cache.save()
+
   # ----- Helpers -----
 
   def _load_fd(self, lib_name):
@@ -517,12 +557,15 @@ class LibManager():
     # try to load fd file if it exists
     if os.path.exists(fd_file):
       try:
-        begin = time.clock()
-        fd = FDFormat.read_fd(fd_file)
+        begin = get_time()
+        if self.fd_cache is not None:
+          fd = self.fd_cache.read_fd(fd_file)
+        else:
+          fd = FDFormat.read_fd(fd_file)
         if is_dev:
           fd.add_call("BeginIO",30,["IORequest"],["a1"])
           fd.add_call("AbortIO",36,["IORequest"],["a1"])
-        end = time.clock()
+        end = get_time()
         delta = end - begin
         self.lib_log("load_fd","loaded fd file '%s' in %fs: base='%s' #funcs=%d" % (fd_file, delta, fd.get_base_name(), len(fd.get_funcs())))
         return fd
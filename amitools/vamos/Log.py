@@ -1,5 +1,4 @@
 import logging
-import logging.config
 
 # --- vamos loggers ---
 
@@ -65,7 +64,13 @@ def log_help():
   for l in levels:
     print "  %s" % l
 
+# the handler installed by log_setup()
+log_handler = None
+
 def log_setup(arg=None, verbose=False, quiet=False, log_file=None):
+  global log_handler
+  # a new setup replaces the old handler, e.g. when running multiple vamos
+  log_shutdown()
   # setup handler
   if log_file != None:
     ch = logging.FileHandler(log_file, mode='w')
@@ -77,6 +82,7 @@ def log_setup(arg=None, verbose=False, quiet=False, log_file=None):
   ch.setFormatter(formatter)
   for l in loggers:
     l.addHandler(ch)
+  log_handler = ch
 
   # setup default
   level = logging.WARN
@@ -117,3 +123,12 @@ def log_setup(arg=None, verbose=False, quiet=False, log_file=None):
             return False
 
   return True
+
+def log_shutdown():
+  """remove the handler of log_setup() from all loggers"""
+  global log_handler
+  if log_handler != None:
+    for l in loggers:
+      l.removeHandler(log_handler)
+    log_handler.close()
+    log_handler = None
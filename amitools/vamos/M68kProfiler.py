@@ -0,0 +1,215 @@
+import bisect
+
+from amitools.binfmt.BinImage import SEGMENT_TYPE_CODE
+from Log import log_prof
+
+# opcodes of calls: (offset before return address, mask, value)
+call_ops = (
+  (2, 0xfff8, 0x4e90), # jsr (an)
+  (2, 0xff00, 0x6100), # bsr.s
+  (4, 0xfff8, 0x4ea8), # jsr d16(an)
+  (4, 0xfff8, 0x4eb0), # jsr d8(an,xn)
+  (4, 0xffff, 0x4eb8), # jsr abs.w
+  (4, 0xffff, 0x4eba), # jsr d16(pc)
+  (4, 0xffff, 0x4ebb), # jsr d8(pc,xn)
+  (4, 0xffff, 0x6100), # bsr.w
+  (6, 0xffff, 0x4eb9), # jsr abs.l
+  (6, 0xffff, 0x61ff)  # bsr.l
+)
+
+class ProfSegment:
+  """a code segment with sorted symbols and source lines for lookups"""
+  def __init__(self, name, start, end, bin_file, bin_img_seg):
+    self.name = name
+    self.start = start
+    self.end = end
+    self.bin_file = bin_file
+    # symbols: sorted offsets and names
+    self.sym_offs = []
+    self.sym_names = []
+    symtab = bin_img_seg.get_symtab()
+    if symtab is not None:
+      syms = sorted([(s.get_offset(), s.get_name()) for s in symtab.get_symbols()])
+      self.sym_offs = [s[0] for s in syms]
+      self.sym_names = [s[1] for s in syms]
+    # debug lines: sorted offsets and (file, line)
+    self.line_offs = []
+    self.line_infos = []
+    debug_line = bin_img_seg.get_debug_line()
+    if debug_line is not None:
+      lines = []
+      for f in debug_line.get_files():
+        src_file = f.get_src_file()
+        for e in f.get_entries():
+          lines.append((e.get_offset(), src_file, e.get_src_line()))
+      lines.sort()
+      self.line_offs = [l[0] for l in lines]
+      self.line_infos = [(l[1], l[2]) for l in lines]
+
+  def get_func(self, addr):
+    off = addr - self.start
+    i = bisect.bisect_right(self.sym_offs, off) - 1
+    if i < 0:
+      return self.name
+    return self.sym_names[i]
+
+  def get_line(self, addr):
+    """return (src_file, src_line) or None"""
+    off = addr - self.start
+    i = bisect.bisect_right(self.line_offs, off) - 1
+    if i < 0:
+      return None
+    return self.line_infos[i]
+
+
+class M68kProfiler:
+  """map the PC samples of the emu core profiler to segments, symbols and
+     source lines and report them.
+
+     the segments are recorded while they are loaded as they are gone
+     when the report is created.
+  """
+
+  def __init__(self, cpu, mem, label_mgr, period=1000, callgrind_file=None):
+    self.cpu = cpu
+    self.mem = mem
+    self.label_mgr = label_mgr
+    self.period = period
+    self.callgrind_file = callgrind_file
+    self.seg_starts = []
+    self.segs = []
+
+  def add_seg_list(self, seg_list):
+    for seg in seg_list.segments:
+      if seg.bin_img_seg.get_type() != SEGMENT_TYPE_CODE:
+        continue
+      pseg = ProfSegment(seg.name, seg.start, seg.end, seg_list.sys_bin_file, seg.bin_img_seg)
+      i = bisect.bisect_right(self.seg_starts, pseg.start)
+      self.seg_starts.insert(i, pseg.start)
+      self.segs.insert(i, pseg)
+
+  def start(self):
+    log_prof.info("m68k profiler: sample every %d cycles", self.period)
+    self.cpu.prof_start(self.period)
+
+  def stop(self):
+    self.cpu.prof_stop()
+
+  # ----- lookup -----
+
+  def _find_seg(self, addr):
+    i = bisect.bisect_right(self.seg_starts, addr) - 1
+    if i < 0:
+      return None
+    seg = self.segs[i]
+    if addr < seg.end:
+      return seg
+    return None
+
+  def _locate(self, addr):
+    """return (file, func, line) of an address"""
+    seg = self._find_seg(addr)
+    if seg is not None:
+      line = seg.get_line(addr)
+      if line is not None:
+        return line[0], seg.get_func(addr), line[1]
+      return seg.bin_file, seg.get_func(addr), 0
+    label = self.label_mgr.get_label(addr)
+    if label is not None:
+      return label.name, label.name, 0
+    return "?", "?", 0
+
+  def _get_call_site(self, ret):
+    """if ret is a return address inside a known code segment then
+       return the address of the call instruction otherwise None"""
+    if ret & 1:
+      return None
+    seg = self._find_seg(ret)
+    if seg is None:
+      return None
+    for off, mask, val in call_ops:
+      addr = ret - off
+      if addr >= seg.start and (self.mem.r16(addr) & mask) == val:
+        return addr
+    return None
+
+  def _find_caller(self, rets):
+    for ret in rets:
+      if ret != 0:
+        addr = self._get_call_site(ret)
+        if addr is not None:
+          return addr
+    return None
+
+  # ----- report -----
+
+  def report(self):
+    samples = self.cpu.prof_get_samples()
+    total = self.cpu.prof_get_num_samples()
+    # func -> count, (file, func, line, pc) -> count, (call site, callee, pc) -> count
+    funcs = {}
+    lines = {}
+    arcs = {}
+    # addr -> location cache
+    locs = {}
+    for pc, sp_ret, a5_ret, a6_ret, count in samples:
+      if pc not in locs:
+        locs[pc] = self._locate(pc)
+      loc = locs[pc]
+      func_key = (loc[0], loc[1])
+      funcs[func_key] = funcs.get(func_key, 0) + count
+      line_key = (loc[0], loc[1], loc[2], pc)
+      lines[line_key] = lines.get(line_key, 0) + count
+      site = self._find_caller((sp_ret, a5_ret, a6_ret))
+      if site is not None:
+        if site not in locs:
+          locs[site] = self._locate(site)
+        arc_key = (site, func_key, pc)
+        arcs[arc_key] = arcs.get(arc_key, 0) + count
+    self._report_flat(total, funcs)
+    self._report_callgraph(total, arcs, locs)
+    if self.callgrind_file is not None:
+      self._write_callgrind(self.callgrind_file, lines, arcs, locs)
+
+  def _report_flat(self, total, funcs):
+    log_prof.info("m68k profile: %d samples, %d cycles per sample", total, self.period)
+    if total == 0:
+      return
+    for key, count in sorted(funcs.items(), key=lambda x: -x[1]):
+      log_prof.info("  %6.2f%%  %8d  %-30s  %s", count * 100.0 / total, count, key[1], key[0])
+
+  def _report_callgraph(self, total, arcs, locs):
+    if len(arcs) == 0:
+      return
+    # merge call sites of the same caller function
+    calls = {}
+    for (site, callee, pc), count in arcs.items():
+      key = (locs[site][1], callee[1])
+      calls[key] = calls.get(key, 0) + count
+    log_prof.info("m68k call graph (approximated from return addresses):")
+    for key, count in sorted(calls.items(), key=lambda x: -x[1]):
+      log_prof.info("  %6.2f%%  %8d  %-30s -> %s", count * 100.0 / total, count, key[0], key[1])
+
+  def _write_callgrind(self, file_name, lines, arcs, locs):
+    cyc = self.period
+    # group cost lines by file and function
+    per_func = {}
+    for (fl, fn, line, pc), count in lines.items():
+      per_func.setdefault((fl, fn), []).append((pc, line, count))
+    # add calls to the caller function
+    per_calls = {}
+    for (site, callee, pc), count in arcs.items():
+      fl, fn, line = locs[site]
+      per_calls.setdefault((fl, fn), []).append((site, line, callee, pc, count))
+    with open(file_name, "w") as fh:
+      fh.write("version: 1\ncreator: vamos\npositions: instr line\nevents: Cycles\n\n")
+      for key in sorted(set(per_func.keys()) | set(per_calls.keys())):
+        fh.write("fl=%s\nfn=%s\n" % key)
+        for pc, line, count in sorted(per_func.get(key, [])):
+          fh.write("0x%x %d %d\n" % (pc, line, count * cyc))
+        for site, line, callee, pc, count in sorted(per_calls.get(key, [])):
+          fh.write("cfl=%s\ncfn=%s\n" % callee)
+          fh.write("calls=1 0x%x %d\n" % (pc, locs[pc][2]))
+          fh.write("0x%x %d %d\n" % (site, line, count * cyc))
+        fh.write("\n")
+    log_prof.info("m68k profile written to callgrind file '%s'", file_name)
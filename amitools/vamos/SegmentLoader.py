@@ -29,6 +29,7 @@ class SegList:
     self.prog_start = 0
     self.size = 0
     self.usage = 1
+    self.mtime = None
 
   def add(self, segment):
     if len(self.segments) == 0:
@@ -51,6 +52,32 @@ class SegmentLoader:
     self.error = None
     self.loaded_seg_lists = {}
     self.binfmt = BinFmt()
+    self.profiler = None
+    # resident seg lists of pure binaries that are not in use
+    self.resident = False
+    self.pure_bins = None
+    self.resident_seg_lists = {}
+    self.num_resident_hits = 0
+    self.num_resident_misses = 0
+
+  def set_resident(self, pure_bins):
+    """keep the seg lists of pure binaries resident after unloading.
+       pure_bins is a list of lower case binary names or None for all"""
+    self.resident = True
+    self.pure_bins = pure_bins
+
+  def is_pure(self, sys_bin_file):
+    if not self.resident:
+      return False
+    if self.pure_bins is None:
+      return True
+    return os.path.basename(sys_bin_file).lower() in self.pure_bins
+
+  def free_resident(self):
+    """unload all resident seg lists"""
+    for seg_list in self.resident_seg_lists.values():
+      self._unload_seg(seg_list)
+    self.resident_seg_lists = {}
 
   def can_load_seg(self, lock, ami_bin_file):
     return self.path_mgr.ami_command_to_sys_path(lock, ami_bin_file) != None
@@ -73,10 +100,13 @@ class SegmentLoader:
       seg_list.usage += 1
       return seg_list
 
-    # really load new seg list
-    seg_list = self._load_seg(ami_bin_file,sys_bin_file)
-    if seg_list == None:
-      return None
+    # is a resident seg list available?
+    seg_list = self._get_resident(sys_bin_file)
+    if seg_list is None:
+      # really load new seg list
+      seg_list = self._load_seg(ami_bin_file,sys_bin_file)
+      if seg_list == None:
+        return None
 
     # store in cache if allowed by caller
     if allow_reuse:
@@ -93,12 +123,38 @@ class SegmentLoader:
       if seg_list.usage == 0:
         if sys_bin_file in self.loaded_seg_lists:
           del self.loaded_seg_lists[sys_bin_file]
-        self._unload_seg(seg_list)
+        # keep pure binaries resident
+        if self.is_pure(sys_bin_file) and sys_bin_file not in self.resident_seg_lists:
+          log_res.info("keep resident: %s", seg_list)
+          self.resident_seg_lists[sys_bin_file] = seg_list
+        else:
+          self._unload_seg(seg_list)
       return True
     else:
       self.error = "seglist not found in loaded seglists!"
       return False
 
+  def _get_resident(self, sys_bin_file):
+    """return a resident seg list if the binary was not modified"""
+    if not self.is_pure(sys_bin_file):
+      return None
+    seg_list = self.resident_seg_lists.pop(sys_bin_file, None)
+    if seg_list is not None:
+      try:
+        mtime = os.path.getmtime(sys_bin_file)
+      except OSError:
+        mtime = None
+      if mtime == seg_list.mtime:
+        self.num_resident_hits += 1
+        seg_list.usage = 1
+        log_res.info("use resident: %s", seg_list)
+        return seg_list
+      # binary changed
+      log_res.info("drop modified resident: %s", seg_list)
+      self._unload_seg(seg_list)
+    self.num_resident_misses += 1
+    return None
+
   # load sys_bin_file
   def _load_seg(self, ami_bin_file, sys_bin_file):
     base_name = os.path.basename(sys_bin_file)
@@ -126,6 +182,7 @@ class SegmentLoader:
     names = bin_img.get_segment_names()
     bin_img_segs = bin_img.get_segments()
     seg_list = SegList(ami_bin_file, sys_bin_file, bin_img)
+    seg_list.mtime = os.path.getmtime(sys_bin_file)
     addrs = []
     for i in xrange(len(sizes)):
       size = sizes[i]
@@ -165,6 +222,10 @@ class SegmentLoader:
     # clear final 'next' pointer
     self.mem.access.w32(addr - 4, 0)
 
+    # profiler needs the segments for its report
+    if self.profiler is not None:
+      self.profiler.add_seg_list(seg_list)
+
     return seg_list
 
   def _unload_seg(self, seg_list):
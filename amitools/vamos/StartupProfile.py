@@ -0,0 +1,44 @@
+import sys
+
+from Clock import get_time
+
+class StartupProfile:
+  """record the host time of the phases of the vamos startup.
+     a phase ends when phase() is called with its name.
+  """
+
+  def __init__(self, begin_time=None):
+    if begin_time is None:
+      begin_time = get_time()
+    self.begin_time = begin_time
+    self.last_time = begin_time
+    self.phases = []
+
+  def phase(self, name):
+    now = get_time()
+    self.phases.append((name, now - self.last_time))
+    self.last_time = now
+
+  def get_total(self):
+    return self.last_time - self.begin_time
+
+  def dump(self, fh=sys.stderr):
+    total = self.get_total()
+    fh.write("vamos startup profile (%d python modules loaded):\n" % len(sys.modules))
+    for name, delta in self.phases:
+      if total > 0:
+        percent = delta * 100.0 / total
+      else:
+        percent = 0.0
+      fh.write("  %-10s %8.4fs  %5.1f%%\n" % (name, delta, percent))
+    fh.write("  %-10s %8.4fs\n" % ("total", total))
+
+
+# mini test
+if __name__ == '__main__':
+  import time
+  p = StartupProfile()
+  time.sleep(0.01)
+  p.phase("sleep")
+  p.phase("nothing")
+  p.dump(sys.stdout)
@@ -1,13 +1,147 @@
+import struct
+
 from Exceptions import *
 from CPU import *
 
 from Log import log_tp
 
+
+class TrampolineTemplate:
+  """the compiled layout of a trampoline: the fixed code words and the
+     slots of the per-call values. all words are written with one pack.
+  """
+  def __init__(self, code, data, trap_ids):
+    fmt = [">"]
+    self.base = []
+    self.param_slots = []
+    self.data_slots = []
+    self.trap_offs = []
+    off = 0
+    for w in code:
+      if type(w) == tuple:
+        special = w[0]
+        if special == 'long':
+          fmt.append("I")
+          self.param_slots.append(len(self.base))
+          self.base.append(0)
+          off += 4
+        elif special == 'trap':
+          fmt.append("H")
+          self.trap_offs.append(off)
+          self.base.append(0xa000 | trap_ids[w[2]])
+          off += 2
+        elif special == 'data_offset':
+          fmt.append("I")
+          self.data_slots.append((len(self.base), w[1]))
+          self.base.append(0)
+          off += 4
+        else:
+          raise VamosInternalError("Invalid special: %s" % special)
+      else:
+        fmt.append("H")
+        self.base.append(w)
+        off += 2
+    self.code_size = off
+    # data values are parameters, too
+    data_fmt = ("B", "H", "I")
+    for width, val in data:
+      fmt.append(data_fmt[width])
+      self.param_slots.append(len(self.base))
+      self.base.append(0)
+    self.struct = struct.Struct("".join(fmt))
+    self.size = self.struct.size
+
+  def pack(self, params, data_addr):
+    vals = list(self.base)
+    for i, v in zip(self.param_slots, params):
+      vals[i] = v
+    for i, off in self.data_slots:
+      vals[i] = data_addr + off
+    return self.struct.pack(*vals)
+
+
+class TrampolinePool:
+  """keep the memory, traps and templates of trampolines for reuse.
+
+     the traps of all trampolines are dispatched by pc from two shared
+     traps (with and without auto rts). the memory of finished trampolines
+     goes to free lists per size.
+  """
+
+  block_align = 16
+
+  def __init__(self, alloc, traps):
+    self.alloc = alloc
+    self.traps = traps
+    self.trap_funcs = {}
+    self.trap_ids = []
+    for auto_rts in (False, True):
+      tid = traps.setup(self._trap, auto_rts=auto_rts)
+      if tid == -1:
+        raise VamosInternalError("No more traps for trampoline left!")
+      self.trap_ids.append(tid)
+    self.free_mems = {}
+    self.templates = {}
+    # stats
+    self.num_trampolines = 0
+    self.num_allocs = 0
+    self.num_reuses = 0
+    self.num_template_hits = 0
+
+  def free(self):
+    """free the pooled memory and the traps"""
+    for mems in self.free_mems.values():
+      for mem in mems:
+        self.alloc.free_memory(mem)
+    self.free_mems = {}
+    for tid in self.trap_ids:
+      self.traps.free(tid)
+    self.trap_ids = []
+
+  def get_template(self, key, code, data):
+    tmpl = self.templates.get(key)
+    if tmpl is None:
+      tmpl = TrampolineTemplate(code, data, self.trap_ids)
+      self.templates[key] = tmpl
+    else:
+      self.num_template_hits += 1
+    return tmpl
+
+  def alloc_memory(self, name, size):
+    self.num_trampolines += 1
+    align = self.block_align - 1
+    size = (size + align) & ~align
+    mems = self.free_mems.get(size)
+    if mems:
+      self.num_reuses += 1
+      mem = mems.pop()
+      if mem.label is not None:
+        mem.label.name = name
+      return mem
+    self.num_allocs += 1
+    return self.alloc.alloc_memory(name, size)
+
+  def add_trap(self, addr, func):
+    self.trap_funcs[addr] = func
+
+  def release(self, mem, trap_addrs):
+    for addr in trap_addrs:
+      del self.trap_funcs[addr]
+    self.free_mems.setdefault(mem.size, []).append(mem)
+
+  def _trap(self, op, pc):
+    func = self.trap_funcs.get(pc)
+    if func is None:
+      raise VamosInternalError("No trampoline trap at @%06x" % pc)
+    func()
+
+
 class Trampoline:
 
   def __init__(self, ctx, name):
     self.ctx = ctx
     self.cpu = ctx.cpu
+    self.pool = ctx.tr_pool
     self.name = name
     self.mem = None
     self.code = [] # words for code
@@ -16,7 +150,7 @@ class Trampoline:
     self.data_size = 0
     self.code_addr = None
     self.data_addr = None
-    self.trapcode  = None
+    self.trap_addrs = []
 
   def done(self):
     """add final rts and generate trampoline in memory"""
@@ -64,51 +198,39 @@ class Trampoline:
   def set_dx_l(self, num, val):
     op = 0x203c # move.l #LONG, d0
     op += num * 0x200
-    hi = (val >> 16) & 0xffff
-    lo = val & 0xffff
-    self.code.extend([op, hi, lo])
+    self.code.extend([op, ('long', val & 0xffffffff)])
     self.code_size += 6
 
   def set_ax_l(self, num, val):
     op = 0x41f9 # lea.l LONG, a0
     op += num * 0x200
-    hi = (val >> 16) & 0xffff
-    lo = val & 0xffff
-    self.code.extend([op, hi, lo])
+    self.code.extend([op, ('long', val & 0xffffffff)])
     self.code_size += 6
 
   def jsr(self, addr):
-    hi = (addr >> 16) & 0xffff
-    lo = addr & 0xffff
-    self.code.extend([0x4eb9, hi, lo]) # jsr LONG
+    self.code.extend([0x4eb9, ('long', addr & 0xffffffff)]) # jsr LONG
     self.code_size += 6
 
   def jmp(self, addr):
-    hi = (addr >> 16) & 0xffff
-    lo = addr & 0xffff
-    self.code.extend([0x4ef9, hi, lo]) # jmp LONG
+    self.code.extend([0x4ef9, ('long', addr & 0xffffffff)]) # jmp LONG
     self.code_size += 6
 
   def write_ax_l(self, num, addr, is_data_offset=False):
     op = 0x23c8 # move.l ax, addr.l
     op += num
-    hi = (addr >> 16) & 0xffff
-    lo = addr & 0xffff
     if is_data_offset:
       self.code.extend([op, ('data_offset',addr)])
     else:
-      self.code.extend([op, hi, lo])
+      self.code.extend([op, ('long', addr & 0xffffffff)])
     self.code_size += 6
 
   def read_ax_l(self, num, addr, is_data_offset=False):
     op = 0x2079 # movea.l addr.l, ax
     op += num * 0x200
-    hi = (addr >> 16) & 0xffff
-    lo = addr & 0xffff
     if is_data_offset:
       self.code.extend([op, ('data_offset',addr)])
     else:
-      self.code.extend([op, hi, lo])
+      self.code.extend([op, ('long', addr & 0xffffffff)])
     self.code_size += 6
 
   # ----- data commands (return offset) -----
@@ -144,45 +266,47 @@ class Trampoline:
 
   def _gen_trap_func(self, trap_func):
     """add a user defined trap function and surround it with logging"""
-    def tf(op,pc):
+    def tf():
       log_tp.debug("#%s { trap: %s",self.name, trap_func.__name__)
       trap_func()
       log_tp.debug("#%s } trap: %s",self.name, trap_func.__name__)
     return tf
 
-  def _gen_trap_cleanup(self, mem, trap_func):
-    """clean up function that removes trap memory on final_rts"""
-    def tf(op,pc):
+  def _gen_trap_cleanup(self, trap_func):
+    """clean up function that returns the trampoline to the pool on final_rts"""
+    def tf():
       log_tp.debug("#%s: cleaning up", self.name)
       if trap_func != None:
         trap_func()
-      self.ctx.alloc.free_memory(mem)
+      self.pool.release(self.mem, self.trap_addrs)
     return tf
 
-  def _gen_trap(self, addr, opts):
-    """generate a trap in memory"""
-    func, auto_rts, final = opts
-    # final trap with cleanup func
-    if final:
-      tf = self._gen_trap_cleanup(self.mem, func)
-    # normal trap
-    else:
-      tf = self._gen_trap_func(func)
-    # create a trap
-    code = self.ctx.traps.setup(tf, one_shot=True, auto_rts=auto_rts)
-    if code == -1:
-      raise VamosInternalError("No more traps for trampoline left!")
-    # place trap opcode
-    self.trapcode = code
-    opcode = 0xa000 | code
-    self.mem.access.w16(addr, opcode)
-    if final:
-      log_tp.debug("#%s: final trap: opcode=%04x @%08x", self.name, opcode, addr)
-
   def _generate(self):
-    # calc and allocate memory
+    # the template key contains the code words and the kinds of the values
+    key = []
+    params = []
+    traps = []
+    for w in self.code:
+      if type(w) == tuple:
+        special = w[0]
+        if special == 'long':
+          key.append('L')
+          params.append(w[1])
+        elif special == 'trap':
+          key.append(('T', w[2]))
+          traps.append(w)
+        else:
+          key.append(w)
+      else:
+        key.append(w)
+    for width, val in self.data:
+      key.append(('D', width))
+      params.append(val)
+    tmpl = self.pool.get_template(tuple(key), self.code, self.data)
+
+    # get memory from pool
     size = self.code_size + self.data_size
-    self.mem = self.ctx.alloc.alloc_memory(self.name, size)
+    self.mem = self.pool.alloc_memory(self.name, size)
     addr = self.mem.addr
     log_tp.debug("#%s: @%06x: allocating %d bytes (code=%d, data=%d)",
       self.name, addr, size, self.code_size, self.data_size)
@@ -191,34 +315,20 @@ class Trampoline:
     self.code_addr = addr
     self.data_addr = addr + self.code_size
 
-    # now fill in code
-    for w in self.code:
-      # === special 'opcode' ===
-      if type(w) == tuple:
-        special = w[0]
-        # --- a trap ---
-        if special == 'trap':
-          self._gen_trap(addr, w[1:])
-          addr += 2
-        # --- data offset ---
-        elif special == 'data_offset':
-          offset = w[1]
-          data_addr = self.data_addr + offset
-          self.mem.access.w32(addr, data_addr)
-          addr += 4
-        # --- unknown special ---
-        else:
-          raise VamosInternalError("Invalid special: %s" % special)
-      # === normal code word ===
+    # write code and data at once
+    self.mem.access.w_data(addr, tmpl.pack(params, self.data_addr))
+
+    # register traps
+    for off, w in zip(tmpl.trap_offs, traps):
+      func, auto_rts, final = w[1:]
+      trap_addr = addr + off
+      if final:
+        tf = self._gen_trap_cleanup(func)
+        log_tp.debug("#%s: final trap @%08x", self.name, trap_addr)
       else:
-        self.mem.access.w16(addr, w)
-        addr += 2
-
-    # now write data
-    for b in self.data:
-      width,val = b
-      self.mem.access.write_mem(width, addr, val)
-      addr += 2**width
+        tf = self._gen_trap_func(func)
+      self.pool.add_trap(trap_addr, tf)
+      self.trap_addrs.append(trap_addr)
 
   def _setup_on_stack(self):
     old_stack = self.cpu.r_reg(REG_A7)
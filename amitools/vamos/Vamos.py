@@ -8,18 +8,16 @@ from LibManager import LibManager
 from SegmentLoader import SegmentLoader
 from path.PathManager import PathManager
 from ErrorTracker import ErrorTracker
-from Trampoline import Trampoline
+from Trampoline import Trampoline, TrampolinePool
 from HardwareAccess import HardwareAccess
+from M68kProfiler import M68kProfiler
 from amitools.vamos.AccessStruct import AccessStruct
 from amitools.vamos.lib.dos.DosStruct import CLIDef
+from VamosConfig import parse_mem_ranges
 
-# lib
+# lib (the other libs are imported on their first open)
 from lib.ExecLibrary import ExecLibrary
 from lib.DosLibrary import DosLibrary
-from lib.UtilityLibrary import UtilityLibrary
-from lib.IntuitionLibrary import IntuitionLibrary
-from lib.MathFFPLibrary import MathFFPLibrary
-from lib.MathIEEEDoubBasLibrary import MathIEEEDoubBasLibrary
 
 from Log import *
 from CPU import *
@@ -66,8 +64,21 @@ class Vamos:
     self.mem_begin = 0x1000
     self.alloc = MemoryAlloc(self.mem, 0, self.ram_size, self.mem_begin, self.label_mgr)
 
+    # memory and traps of trampolines
+    self.tr_pool = TrampolinePool(self.alloc, traps)
+
     # create segment loader
     self.seg_loader = SegmentLoader( self.mem, self.alloc, self.label_mgr, self.path_mgr )
+    if cfg.resident:
+      self.seg_loader.set_resident(cfg.get_pure_bins())
+
+    # m68k profiler needs to see all loaded segments
+    if cfg.profile_m68k:
+      self.m68k_prof = M68kProfiler(cpu, raw_mem, self.label_mgr,
+                                    cfg.profile_m68k_period, cfg.profile_m68k_file)
+      self.seg_loader.profiler = self.m68k_prof
+    else:
+      self.m68k_prof = None
 
     # lib manager
     self.lib_mgr = LibManager( self.label_mgr, cfg)
@@ -84,7 +95,12 @@ class Vamos:
 
   def cleanup(self):
     self.close_base_libs()
+    self.tr_pool.free()
+    self.seg_loader.free_resident()
+    self.lib_mgr.save_fd_cache()
     self.alloc.dump_orphans()
+    self.dump_trace_ranges()
+    self.dump_ram_usage()
 
   # ----- system setup -----
 
@@ -104,12 +120,15 @@ class Vamos:
 
   def _setup_memory(self, mem):
     cfg = self.cfg
-    # enable mem trace?
-    if cfg.memory_trace:
+    # enable mem trace? trace ranges imply it
+    if cfg.memory_trace or cfg.memory_trace_range is not None:
       mem.set_trace_mode(1)
       mem.set_trace_func(self.label_mgr.trace_mem)
       if not log_mem.isEnabledFor(logging.DEBUG):
         log_mem.setLevel(logging.DEBUG)
+      if cfg.memory_trace_range is not None:
+        for begin, end, flags in parse_mem_ranges(cfg.memory_trace_range):
+          mem.add_watch_range(begin, end, flags)
     # enable internal memory trace?
     if cfg.internal_memory_trace:
       AccessMemory.label_mgr = self.label_mgr
@@ -118,6 +137,28 @@ class Vamos:
     # set invalid access handler for memory
     mem.set_invalid_func(self.error_tracker.report_invalid_memory)
 
+  def add_trace_range(self, begin, end, flags=0):
+    """trace only [begin, end) from now on. returns range index"""
+    self.raw_mem.set_trace_mode(1)
+    return self.raw_mem.add_watch_range(begin, end, flags)
+
+  def remove_trace_range(self, idx):
+    self.raw_mem.remove_watch_range(idx)
+
+  def dump_ram_usage(self):
+    """report how much RAM was touched to help tuning the RAM size"""
+    num_pages = self.raw_mem.get_num_pages()
+    num_touched = self.raw_mem.get_num_touched_pages()
+    log_main.info("RAM usage: %d KiB of %d KiB touched (%d of %d 64K pages)",
+                  num_touched * 64, self.ram_size / 1024, num_touched, num_pages)
+    self.exec_lib_def.dump_pool_stats(log_main.info)
+
+  def dump_trace_ranges(self):
+    for idx, begin, end, flags, hits in self.raw_mem.get_watch_ranges():
+      label = self.label_mgr.get_mem_str(begin)
+      log_mem.info("trace range #%d: %06x-%06x flags=%02x: %d hits  [%s]",
+                   idx, begin, end, flags, hits, label)
+
   # ----- process handling -----
 
   def _set_this_task(self, proc):
@@ -316,22 +357,27 @@ class Vamos:
     dos_cfg = cfg.get_lib_config('dos.library')
     self.dos_lib_def = DosLibrary(self.mem, self.alloc, self.path_mgr, dos_cfg)
     self.lib_mgr.register_vamos_lib(self.dos_lib_def)
-    # intuition
-    int_cfg = cfg.get_lib_config('intuition.library')
-    self.int_lib_def = IntuitionLibrary(int_cfg)
-    self.lib_mgr.register_vamos_lib(self.int_lib_def)
-    # utility
-    utility_cfg = cfg.get_lib_config('utility.library')
-    self.utility_lib_def = UtilityLibrary(utility_cfg)
-    self.lib_mgr.register_vamos_lib(self.utility_lib_def)
-    # mathffp
-    mathffp_cfg = cfg.get_lib_config('mathffp.library')
-    self.mathffp_lib_def = MathFFPLibrary(mathffp_cfg)
-    self.lib_mgr.register_vamos_lib(self.mathffp_lib_def)
-    # mathdoubbas
-    mathdoubbas_cfg = cfg.get_lib_config('mathieeedoubbas.library')
-    self.mathdoubbas_lib_def = MathIEEEDoubBasLibrary(mathdoubbas_cfg)
-    self.lib_mgr.register_vamos_lib(self.mathdoubbas_lib_def)
+    # the others are created on their first open
+    self.lib_mgr.register_lazy_vamos_lib('intuition.library', self._create_intuition_lib)
+    self.lib_mgr.register_lazy_vamos_lib('utility.library', self._create_utility_lib)
+    self.lib_mgr.register_lazy_vamos_lib('mathffp.library', self._create_mathffp_lib)
+    self.lib_mgr.register_lazy_vamos_lib('mathieeedoubbas.library', self._create_mathdoubbas_lib)
+
+  def _create_intuition_lib(self, lib_cfg):
+    from lib.IntuitionLibrary import IntuitionLibrary
+    return IntuitionLibrary(lib_cfg)
+
+  def _create_utility_lib(self, lib_cfg):
+    from lib.UtilityLibrary import UtilityLibrary
+    return UtilityLibrary(lib_cfg)
+
+  def _create_mathffp_lib(self, lib_cfg):
+    from lib.MathFFPLibrary import MathFFPLibrary
+    return MathFFPLibrary(lib_cfg)
+
+  def _create_mathdoubbas_lib(self, lib_cfg):
+    from lib.MathIEEEDoubBasLibrary import MathIEEEDoubBasLibrary
+    return MathIEEEDoubBasLibrary(lib_cfg)
 
   def open_base_libs(self):
     # open exec lib
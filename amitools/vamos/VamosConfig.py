@@ -2,8 +2,54 @@ import ConfigParser
 import os
 import os.path
 
+from musashi import m68k
 from Log import log_main
 
+# flag chars of the memory watch ranges
+mem_watch_chars = {
+  'r' : m68k.MEM_WATCH_READ,
+  'w' : m68k.MEM_WATCH_WRITE,
+  '1' : m68k.MEM_WATCH_BYTE,
+  '2' : m68k.MEM_WATCH_WORD,
+  '4' : m68k.MEM_WATCH_LONG,
+  'c' : m68k.MEM_WATCH_COUNT_ONLY
+}
+
+def parse_mem_ranges(txt):
+  """parse a list of memory ranges: <begin>[-<end>|+<size>][:<flags>],...
+     all values are hex. flags: r=read, w=write, 1,2,4=access width,
+     c=count hits only. returns a list of (begin, end, flags) or None"""
+  res = []
+  for e in txt.split(','):
+    r = e.split(':')
+    if len(r) > 2:
+      return None
+    try:
+      rng = r[0]
+      if '+' in rng:
+        b, s = rng.split('+')
+        begin = int(b, 16)
+        end = begin + int(s, 16)
+      elif '-' in rng:
+        b, e = rng.split('-')
+        begin = int(b, 16)
+        end = int(e, 16)
+      else:
+        begin = int(rng, 16)
+        end = begin + 1
+    except ValueError:
+      return None
+    if end <= begin:
+      return None
+    flags = 0
+    if len(r) == 2:
+      for c in r[1]:
+        if c not in mem_watch_chars:
+          return None
+        flags |= mem_watch_chars[c]
+    res.append((begin, end, flags))
+  return res
+
 class VamosLibConfig:
   def __init__(self, mode='auto', version=0, profile=False):
     self.mode = mode
@@ -146,23 +192,36 @@ class VamosConfig(ConfigParser.SafeConfigParser):
       'verbose' : (int, 0),
       'quiet' : (bool, False),
       'benchmark' : (bool, False),
+      'startup_profile' : (bool, False),
       'log_file' : (str, None),
       # low-level tracing
       'instr_trace' : (bool, False),
+      'instr_trace_depth' : (int, 4096),
+      'instr_trace_start' : (str, None),
+      'instr_trace_stop' : (str, None),
       'memory_trace' : (bool, False),
       'internal_memory_trace' : (bool, False),
+      'memory_trace_range' : (str, None),
       'reg_dump' : (bool, False),
+      # profiling
+      'profile_m68k' : (bool, False),
+      'profile_m68k_period' : (int, 1000),
+      'profile_m68k_file' : (str, None),
       # cpu emu
       'cpu' : (str, "68000"),
       'max_cycles' : (int, 0),
       'cycles_per_block' : (int, 1000),
+      'max_cycles_per_block' : (int, 1000000),
       # system
       'ram_size' : (int, 1024),
       'stack_size' : (int, 4),
       'hw_access' : (str, "emu"),
       'shell' : (bool, False),
+      'resident' : (bool, False),
+      'pure_bins' : (str, None),
       # dirs
       'data_dir' : (str, self.def_data_dir),
+      'fd_cache' : (bool, True),
       # paths
       'pure_ami_paths' : (bool, False)
     }
@@ -177,6 +236,44 @@ class VamosConfig(ConfigParser.SafeConfigParser):
         def_val = self._keys[key][1]
         setattr(self, key, def_val)
 
+  def get_addr(self, key):
+    """return a hex address config value or None if not set"""
+    val = getattr(self, key)
+    if val is None:
+      return None
+    return int(val, 16)
+
+  def _check_memory_trace_range(self, val):
+    return parse_mem_ranges(val) is not None
+
+  def _check_instr_trace_depth(self, val):
+    return val > 0
+
+  def _check_instr_trace_start(self, val):
+    return self._is_addr(val)
+
+  def _check_instr_trace_stop(self, val):
+    return self._is_addr(val)
+
+  def _is_addr(self, val):
+    try:
+      int(val, 16)
+      return True
+    except ValueError:
+      return False
+
+  def _check_profile_m68k_period(self, val):
+    return val > 0
+
+  def get_pure_bins(self):
+    """return the lower case names of the pure binaries or None for all.
+       no binary is pure unless it is listed"""
+    if self.pure_bins is None:
+      return []
+    if self.pure_bins == '*':
+      return None
+    return [x.strip().lower() for x in self.pure_bins.split(',')]
+
   def _check_cpu(self, val):
     return val in ('68000','68020','000','020','00','20')
 
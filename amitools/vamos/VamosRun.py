@@ -1,7 +1,8 @@
-import time
 import logging
 
+from Clock import get_time
 from CPU import *
+from InstrTrace import InstrTrace
 from Log import log_main, log_instr
 from Exceptions import *
 
@@ -14,7 +15,7 @@ class Trap:
     return "[@%06x:%s:one_shot=%s]" % (self.addr, self.func, self.one_shot)
 
 class VamosRun:
-  def __init__(self, vamos, benchmark=False, shell=False):
+  def __init__(self, vamos, benchmark=False, shell=False, begin_time=None):
     self.cpu   = vamos.cpu
     self.mem   = vamos.mem
     self.ctx   = vamos
@@ -26,17 +27,36 @@ class VamosRun:
     self.et = vamos.error_tracker
 
     self.benchmark = benchmark
-    self.reg_dump = vamos.cfg.reg_dump
+    self.instr_trace = None
+    # host time when vamos was started (to measure the startup)
+    self.begin_time = begin_time
+    self.startup_time = None
+
+    # time slice stats
+    self.num_slices = 0
+    self.num_early_slices = 0
+    self.num_trap_slices = 0
+    self.max_slice = 0
 
   def init(self):
     self._init_cpu()
     # set reset opcode/trap handler
     self.cpu.set_reset_instr_callback(self.reset_func)
     # enable instruction tracing?
-    if self.ctx.cfg.instr_trace:
+    cfg = self.ctx.cfg
+    if cfg.instr_trace:
       if not log_instr.isEnabledFor(logging.INFO):
         log_instr.setLevel(logging.INFO)
-      self.cpu.set_instr_hook_callback(self.instr_hook)
+      self.instr_trace = InstrTrace(self.cpu, self.ctx.label_mgr,
+                                    cfg.instr_trace_depth, cfg.reg_dump,
+                                    cfg.get_addr('instr_trace_start'),
+                                    cfg.get_addr('instr_trace_stop'))
+      self.instr_trace.start()
+      self.et.instr_trace = self.instr_trace
+    # enable m68k profiler?
+    self.m68k_prof = self.ctx.m68k_prof
+    if self.m68k_prof is not None:
+      self.m68k_prof.start()
 
   def _init_cpu(self):
     # prepare m68k
@@ -84,27 +104,13 @@ class VamosRun:
       for x in range(-32,32,2):
         w = self.mem.access.r32(sp+x)
         log_main.error("sp+%d : 0x%02x",x,w)
-    # stop all
+    self.stop()
+
+  def stop(self):
+    """request the end of the run loop. the current time slice ends now"""
     self.cpu.end()
     self.stay = False
 
-  # enable instruction trace?
-  def instr_hook(self):
-    # add register dump
-    if self.reg_dump:
-      res = self.cpu.dump_state()
-      for r in res:
-        log_instr.info(r)
-    # disassemble line
-    pc = self.cpu.r_reg(REG_PC)
-    label, sym, src = self.ctx.label_mgr.get_disasm_info(pc)
-    _,txt = self.cpu.disassemble(pc)
-    if sym is not None:
-      log_instr.info("%s%s:", " "*40, sym)
-    if src is not None:
-      log_instr.info("%s%s", " "*50, src)
-    log_instr.info("%-40s  %06x    %-20s" % (label, pc, txt))
-
   def _calc_benchmark(self, total_cycles, delta_time):
     python_time = self.ctx.lib_mgr.bench_total
     cpu_time = delta_time - python_time
@@ -114,18 +120,70 @@ class VamosRun:
     log_main.info("done %d cycles in host time %.4fs -> %5.2f MHz m68k CPU", total_cycles, cpu_time, mhz)
     log_main.info("code time %.4fs (%.2f %%), python time %.4fs (%.2f %%) -> total time %.4fs", \
       cpu_time, cpu_percent, python_time, python_percent, delta_time)
-
-  def run(self, cycles_per_run=1000, max_cycles=0):
-    """main run loop of vamos"""
+    traps = self.ctx.traps
+    lib_mgr = self.ctx.lib_mgr
+    if self.startup_time is not None:
+      log_main.info("startup time %.4fs", self.startup_time)
+    fd_cache = lib_mgr.fd_cache
+    if fd_cache is not None:
+      log_main.info("fd cache: %d hits, %d misses", fd_cache.num_hits, fd_cache.num_misses)
+    log_main.info("traps: %d used, %d max used of %d, %d lib stubs created lazily, %d calls via shared traps", \
+      traps.get_num_used(), traps.get_max_used(), traps.get_num_traps(),
+      lib_mgr.num_lazy_stubs, lib_mgr.num_shared_calls)
+    tr_pool = self.ctx.tr_pool
+    log_main.info("trampolines: %d created, %d templates (%d hits), %d blocks allocated, %d reused", \
+      tr_pool.num_trampolines, len(tr_pool.templates), tr_pool.num_template_hits,
+      tr_pool.num_allocs, tr_pool.num_reuses)
+    seg_loader = self.ctx.seg_loader
+    if seg_loader.resident:
+      log_main.info("resident seg lists: %d hits, %d misses, %d resident", \
+        seg_loader.num_resident_hits, seg_loader.num_resident_misses,
+        len(seg_loader.resident_seg_lists))
+    if self.num_slices > 0:
+      log_main.info("time slices: %d, avg %d cycles, max %d cycles, %d ended early, %d with traps", \
+        self.num_slices, total_cycles / self.num_slices, self.max_slice,
+        self.num_early_slices, self.num_trap_slices)
+
+  def run(self, cycles_per_run=1000, max_cycles=0, max_cycles_per_run=1000000):
+    """main run loop of vamos.
+
+       the time slice starts with cycles_per_run cycles. it grows up to
+       max_cycles_per_run while no traps are called and shrinks again if
+       traps are called. errors and stop requests end a slice early.
+    """
     log_main.info("start cpu: %06x", self.ctx.process.prog_start)
 
     total_cycles = 0
-    start_time = time.clock()
+    slice_cycles = cycles_per_run
+    if max_cycles_per_run < cycles_per_run:
+      max_cycles_per_run = cycles_per_run
+    traps = self.ctx.traps
+    start_time = get_time()
+    if self.begin_time is not None:
+      self.startup_time = start_time - self.begin_time
 
     # main loop
     try:
       while self.stay:
-        total_cycles += self.cpu.execute(cycles_per_run)
+        # do not run beyond the cycle limit
+        run_cycles = slice_cycles
+        if max_cycles > 0 and max_cycles - total_cycles < run_cycles:
+          run_cycles = max_cycles - total_cycles
+        num_calls = traps.get_num_calls()
+        cycles = self.cpu.execute(run_cycles)
+        total_cycles += cycles
+        # slice stats
+        self.num_slices += 1
+        if cycles > self.max_slice:
+          self.max_slice = cycles
+        if cycles < run_cycles:
+          self.num_early_slices += 1
+        # adapt slice size
+        if traps.get_num_calls() == num_calls:
+          slice_cycles = min(slice_cycles * 2, max_cycles_per_run)
+        else:
+          self.num_trap_slices += 1
+          slice_cycles = max(slice_cycles / 2, cycles_per_run)
         # end after enough cycles
         if max_cycles > 0 and total_cycles >= max_cycles:
           break
@@ -135,7 +193,15 @@ class VamosRun:
     except Exception as e:
       self.et.report_error(e)
 
-    end_time = time.clock()
+    end_time = get_time()
+
+    if self.instr_trace is not None:
+      self.instr_trace.stop()
+
+    # report m68k profile while all segments are still loaded
+    if self.m68k_prof is not None:
+      self.m68k_prof.stop()
+      self.m68k_prof.report()
 
     # calc benchmark values
     if self.benchmark:
@@ -147,6 +213,9 @@ class VamosRun:
       self.et.dump()
       exit_code = 1
     else:
+      # dump instruction trace (on errors the error tracker does it)
+      if self.instr_trace is not None:
+        self.instr_trace.dump()
       # get exit code from CPU
       exit_code = int(self.cpu.r_reg(REG_D0))
       log_main.info("exit code=%d", exit_code)
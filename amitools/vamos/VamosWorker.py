@@ -0,0 +1,152 @@
+import os
+import sys
+import tempfile
+import traceback
+import multiprocessing
+
+from musashi import emu
+
+from Clock import get_time
+from Log import log_shutdown
+
+
+class VamosWorker:
+  """run vamos multiple times in this process.
+
+     the cpu, memory and traps are created once and are only reset
+     between the runs. the python modules, e.g. the libraries, stay
+     loaded, too. stdin, stdout and stderr of a run are redirected to
+     temp files.
+  """
+
+  def __init__(self):
+    self.cpu = None
+    self.cpu_type = None
+    self.mem = None
+    self.ram_size = None
+    self.traps = None
+    self.num_runs = 0
+
+  def get_emu(self, cpu_type, ram_size):
+    """return a reset (cpu, mem, traps) tuple. called by vamos main()"""
+    # the order matters: a cpu reset removes the trap handler of the traps
+    if self.cpu is None or self.cpu_type != cpu_type:
+      self.cpu = emu.CPU(cpu_type)
+      self.cpu_type = cpu_type
+    self.cpu.reset()
+    # only one memory may exist at a time
+    if self.mem is not None and self.ram_size != ram_size:
+      self.mem = None
+    if self.mem is None:
+      self.mem = emu.Memory(ram_size)
+      self.ram_size = ram_size
+    else:
+      self.mem.reset()
+    if self.traps is None:
+      self.traps = emu.Traps()
+    else:
+      self.traps.reset()
+    return self.cpu, self.mem, self.traps
+
+  def run(self, argv, stdin=None):
+    """run vamos with the given args and stdin string.
+       returns (returncode, stdout, stderr, time)"""
+    from amitools.tools.vamos import main
+    in_fh = tempfile.TemporaryFile()
+    if stdin is not None:
+      in_fh.write(stdin)
+      in_fh.seek(0)
+    out_fh = tempfile.TemporaryFile()
+    err_fh = tempfile.TemporaryFile()
+    # redirect the host fds, too, so output of the C code is caught
+    sys.stdout.flush()
+    sys.stderr.flush()
+    old_fds = (os.dup(1), os.dup(2))
+    old_files = (sys.stdin, sys.stdout, sys.stderr)
+    os.dup2(out_fh.fileno(), 1)
+    os.dup2(err_fh.fileno(), 2)
+    sys.stdin, sys.stdout, sys.stderr = in_fh, out_fh, err_fh
+    start = get_time()
+    try:
+      try:
+        returncode = main(argv, self)
+      except SystemExit as e:
+        returncode = e.code
+      except Exception:
+        traceback.print_exc()
+        returncode = 1
+    finally:
+      elapsed = get_time() - start
+      log_shutdown()
+      sys.stdout.flush()
+      sys.stderr.flush()
+      sys.stdin, sys.stdout, sys.stderr = old_files
+      os.dup2(old_fds[0], 1)
+      os.dup2(old_fds[1], 2)
+      os.close(old_fds[0])
+      os.close(old_fds[1])
+    self.num_runs += 1
+    # like the exit status of a vamos process
+    if returncode is None:
+      returncode = 0
+    elif type(returncode) not in (int, long):
+      err_fh.write("%s\n" % returncode)
+      returncode = 1
+    returncode &= 0xff
+    out_fh.seek(0)
+    err_fh.seek(0)
+    return returncode, out_fh.read(), err_fh.read(), elapsed
+
+
+# the worker of a pool process
+_worker = None
+
+def _init_worker():
+  global _worker
+  _worker = VamosWorker()
+
+def _run_worker(argv, stdin):
+  return _worker.run(argv, stdin)
+
+
+class VamosWorkerPool:
+  """distribute vamos runs to a pool of long-lived VamosWorker processes"""
+
+  def __init__(self, num_workers=None):
+    if num_workers is None:
+      num_workers = multiprocessing.cpu_count()
+    self.num_workers = num_workers
+    self.pool = multiprocessing.Pool(num_workers, _init_worker)
+
+  def run_async(self, argv, stdin=None):
+    """start a run. the get() of the result returns the tuple of run()"""
+    return self.pool.apply_async(_run_worker, (argv, stdin))
+
+  def run(self, argv, stdin=None):
+    """run vamos in a worker and return (returncode, stdout, stderr, time)"""
+    return self.run_async(argv, stdin).get()
+
+  def run_many(self, jobs):
+    """run a list of (argv, stdin) jobs in parallel.
+       returns the list of results in job order"""
+    results = [self.run_async(argv, stdin) for argv, stdin in jobs]
+    return [r.get() for r in results]
+
+  def close(self):
+    self.pool.close()
+    self.pool.join()
+
+
+# mini benchmark: run a binary multiple times in the workers
+if __name__ == '__main__':
+  argv = sys.argv[1:]
+  if len(argv) == 0:
+    print "usage: VamosWorker.py [vamos options] <bin> [args ...]"
+    sys.exit(1)
+  num = 16
+  t = get_time()
+  pool = VamosWorkerPool()
+  for returncode, stdout, stderr, elapsed in pool.run_many([(argv, None)] * num):
+    print "returncode=%d, %d bytes output, %.3fs" % (returncode, len(stdout), elapsed)
+  pool.close()
+  print "%d runs with %d workers: %.3fs" % (num, pool.num_workers, get_time() - t)
@@ -1,5 +1,4 @@
 import time
-import ctypes
 import re
 import os
 
@@ -25,6 +24,7 @@ from amitools.vamos.Process import Process
 import dos.PathPart
 from dos.DosList import DosList
 from dos.LockManager import LockManager
+from dos.DirCache import DirCache
 from dos.FileManager import FileManager
 
 class DosLibrary(AmigaLibrary):
@@ -45,6 +45,7 @@ class DosLibrary(AmigaLibrary):
     self.mem      = mem
     self.alloc    = alloc
     self.path_mgr = path
+    self.printf_cache = dos.Printf.printf_cache()
 
   def setup_lib(self, ctx):
     AmigaLibrary.setup_lib(self, ctx)
@@ -71,12 +72,13 @@ class DosLibrary(AmigaLibrary):
     self.dos_list = DosList(self.path_mgr, self.path_mgr.assign_mgr, ctx.mem, ctx.alloc)
     baddr = self.dos_list.build_list(ctx.path_mgr)
     # create lock manager
-    self.lock_mgr = LockManager(ctx.path_mgr, self.dos_list, ctx.alloc, ctx.mem)
+    self.dir_cache = DirCache()
+    self.lock_mgr = LockManager(ctx.path_mgr, self.dos_list, ctx.alloc, ctx.mem, self.dir_cache)
     ctx.path_mgr.setup(self.lock_mgr)
     # equip the DosList with all the locks
     self.dos_list.add_locks(self.lock_mgr)
     # create file manager
-    self.file_mgr = FileManager(ctx.path_mgr, ctx.alloc, ctx.mem)
+    self.file_mgr = FileManager(ctx.path_mgr, ctx.alloc, ctx.mem, self.dir_cache)
     # currently we use a single fake port for all devices
     self.fs_handler_port = ctx.exec_lib.port_mgr.create_port("FakeFSPort",self.file_mgr)
     log_dos.info("dos fs handler port: %06x" % self.fs_handler_port)
@@ -93,6 +95,7 @@ class DosLibrary(AmigaLibrary):
     for path,lock in self.path:
       ctx.alloc.free_struct(path)
       self.lock_mgr.release_lock(lock)
+    self.dir_cache.dump_stats()
     # free resident nodes
     for res in self.resident:
       self._free_mem(res)
@@ -203,14 +206,15 @@ class DosLibrary(AmigaLibrary):
   def DateToStr(self, ctx):
     dt_ptr = ctx.cpu.r_reg(REG_D1)
     dt = AccessStruct(ctx.mem,DateTimeDef,struct_addr=dt_ptr)
-    ds_day = dt.r_s("dat_Stamp.ds_Days")
-    ds_min = dt.r_s("dat_Stamp.ds_Minute")
-    ds_tick = dt.r_s("dat_Stamp.ds_Tick")
-    format = dt.r_s("dat_Format")
-    flags = dt.r_s("dat_Flags")
-    str_day_ptr = dt.r_s("dat_StrDay")
-    str_date_ptr = dt.r_s("dat_StrDate")
-    str_time_ptr = dt.r_s("dat_StrTime")
+    v = dt.read_all()
+    ds_day = v["dat_Stamp.ds_Days"]
+    ds_min = v["dat_Stamp.ds_Minute"]
+    ds_tick = v["dat_Stamp.ds_Tick"]
+    format = v["dat_Format"]
+    flags = v["dat_Flags"]
+    str_day_ptr = v["dat_StrDay"]
+    str_date_ptr = v["dat_StrDate"]
+    str_time_ptr = v["dat_StrTime"]
     at = AmiTime(ds_day, ds_min, ds_tick)
     st = at.to_sys_time()
     log_dos.info("DateToStr: ptr=%06x format=%x flags=%x day_ptr=%06x date_ptr=%06x time_ptr=%06x %s => sys_time=%d", \
@@ -244,6 +248,7 @@ class DosLibrary(AmigaLibrary):
       self.setioerr(ctx,ERROR_OBJECT_NOT_FOUND)
       return self.DOSFALSE
     else:
+      self.dir_cache.invalidate(sys_path)
       os.utime(sys_path,(seconds,seconds))
       return self.DOSTRUE
 
@@ -521,28 +526,20 @@ class DosLibrary(AmigaLibrary):
       self.setioerr(ctx,0)
     return self.DOSTRUE
 
-  def Read(self, ctx):
-    fh_b_addr = ctx.cpu.r_reg(REG_D1)
-    buf_ptr = ctx.cpu.r_reg(REG_D2)
-    size = ctx.cpu.r_reg(REG_D3)
-
+  def Read(self, ctx, fh_b_addr, buf_ptr, size):
     fh = self.file_mgr.get_by_b_addr(fh_b_addr,False)
     data = fh.read(size)
     ctx.mem.access.w_data(buf_ptr, data)
     got = len(data)
-    log_dos.info("Read(%s, %06x, %d) -> %d" % (fh, buf_ptr, size, got))
+    log_dos.info("Read(%s, %06x, %d) -> %d", fh, buf_ptr, size, got)
     return got
 
-  def Write(self, ctx):
-    fh_b_addr = ctx.cpu.r_reg(REG_D1)
-    buf_ptr = ctx.cpu.r_reg(REG_D2)
-    size = ctx.cpu.r_reg(REG_D3)
-
+  def Write(self, ctx, fh_b_addr, buf_ptr, size):
     fh = self.file_mgr.get_by_b_addr(fh_b_addr,True)
     data = ctx.mem.access.r_data(buf_ptr,size)
     fh.write(data)
     got = len(data)
-    log_dos.info("Write(%s, %06x, %d) -> %d" % (fh, buf_ptr, size, got))
+    log_dos.info("Write(%s, %06x, %d) -> %d", fh, buf_ptr, size, got)
     return size
 
   def FWrite(self, ctx):
@@ -604,30 +601,25 @@ class DosLibrary(AmigaLibrary):
     log_dos.info("Seek(%s, %06x, %s) -> old_pos=%06x" % (fh, pos, mode_str, old_pos))
     return old_pos
 
-  def FGetC(self, ctx):
-    fh_b_addr = ctx.cpu.r_reg(REG_D1)
+  def FGetC(self, ctx, fh_b_addr):
     fh = self.file_mgr.get_by_b_addr(fh_b_addr,False)
     ch = fh.getc()
     if ch == -1:
-      log_dos.info("FGetC(%s) -> EOF (%d)" % (fh, ch))
+      log_dos.info("FGetC(%s) -> EOF (%d)", fh, ch)
     else:
-      log_dos.info("FGetC(%s) -> '%c' (%d)" % (fh, ch, ch))
+      log_dos.info("FGetC(%s) -> '%c' (%d)", fh, ch, ch)
     return ch
 
-  def FPutC(self, ctx):
-    fh_b_addr = ctx.cpu.r_reg(REG_D1)
-    val = ctx.cpu.r_reg(REG_D2)
+  def FPutC(self, ctx, fh_b_addr, val):
     fh = self.file_mgr.get_by_b_addr(fh_b_addr,True)
-    log_dos.info("FPutC(%s, '%c' (%d))" % (fh, val, val))
+    log_dos.info("FPutC(%s, '%c' (%d))", fh, val, val)
     fh.write(chr(val))
     return val
 
-  def UnGetC(self, ctx):
-    fh_b_addr = ctx.cpu.r_reg(REG_D1)
-    val = ctx.cpu.r_reg(REG_D2)
+  def UnGetC(self, ctx, fh_b_addr, val):
     fh = self.file_mgr.get_by_b_addr(fh_b_addr,False)
     ch = fh.ungetc(val)
-    log_dos.info("UnGetC(%s, %d) -> ch=%d (%d)" % (fh, val, ch, ch))
+    log_dos.info("UnGetC(%s, %d) -> ch=%d (%d)", fh, val, ch, ch)
     return ch
 
   # ----- StdOut -----
@@ -655,10 +647,7 @@ class DosLibrary(AmigaLibrary):
     fh = ctx.process.get_output()
     log_dos.info("VPrintf: format='%s' argv=%06x" % (fmt,argv_ptr))
     # now decode printf
-    ps = dos.Printf.printf_parse_string(fmt)
-    dos.Printf.printf_read_data(ps, ctx.mem.access, argv_ptr)
-    log_dos.debug("VPrintf: parsed format: %s",ps)
-    result = dos.Printf.printf_generate_output(ps)
+    result, _ = self.printf_cache.printf(format_ptr, fmt, ctx.mem.access, argv_ptr)
     # write result
     fh.write(result)
     return len(result)
@@ -672,10 +661,7 @@ class DosLibrary(AmigaLibrary):
     # write on output
     log_dos.info("VFPrintf: format='%s' argv=%06x" % (fmt,argv_ptr))
     # now decode printf
-    ps = dos.Printf.printf_parse_string(fmt)
-    dos.Printf.printf_read_data(ps, ctx.mem.access, argv_ptr)
-    log_dos.debug("VFPrintf: parsed format: %s",ps)
-    result = dos.Printf.printf_generate_output(ps)
+    result, _ = self.printf_cache.printf(format_ptr, fmt, ctx.mem.access, argv_ptr)
     # write result
     fh.write(result)
     return len(result)
@@ -695,6 +681,8 @@ class DosLibrary(AmigaLibrary):
     args_ptr = ctx.cpu.r_reg(REG_D3)
     fmt = ctx.mem.access.r_cstr(fmt_ptr)
     log_dos.info("VFWritef: fh=%s format='%s' args_ptr=%06x" % (fh, fmt, args_ptr))
+    # only import it here as it is slow to load
+    import ctypes
     out = ''
     pos = 0
     state = ''
@@ -897,15 +885,17 @@ class DosLibrary(AmigaLibrary):
     info = AccessStruct(ctx.mem,InfoDataDef,struct_addr=info_ptr)
     vol  = lock.find_volume_node(self.dos_list)
     if vol != None:
-      info.w_s('id_NumSoftErrors',0)
-      info.w_s('id_UnitNumber',0) #not that we really care...
-      info.w_s('id_DiskState',0)  #disk is not write protected
-      info.w_s('id_NumBlocks',0x7fffffff) #a really really big disk....
-      info.w_s('id_NumBlocksUsed',0x0fffffff) #some...
-      info.w_s('id_BytesPerBlock',512) #let's take regular FFS blocks
-      info.w_s('id_DiskType',0x444F5303) #international FFS
-      info.w_s('id_VolumeNode',vol)
-      info.w_s('id_InUse',0)
+      info.write_fields({
+        'id_NumSoftErrors' : 0,
+        'id_UnitNumber' : 0, #not that we really care...
+        'id_DiskState' : 0,  #disk is not write protected
+        'id_NumBlocks' : 0x7fffffff, #a really really big disk....
+        'id_NumBlocksUsed' : 0x0fffffff, #some...
+        'id_BytesPerBlock' : 512, #let's take regular FFS blocks
+        'id_DiskType' : 0x444F5303, #international FFS
+        'id_VolumeNode' : vol,
+        'id_InUse' : 0
+      })
       log_dos.info("Info: %s info=%06x -> true" % (lock, info_ptr))
       return self.DOSTRUE
     else:
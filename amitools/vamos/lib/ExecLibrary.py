@@ -22,6 +22,13 @@ class ExecLibrary(AmigaLibrary):
     self.alloc = alloc
     self._pools = {}
     self._poolid = 0x1000
+    # stats of the deleted pools
+    self._num_pools = 0
+    self._num_pool_allocs = 0
+    self._num_pool_large_allocs = 0
+    self._pool_peak_puddles = 0
+    self._pool_peak_used = 0
+    self.printf_cache = dos.Printf.printf_cache()
 
   def setup_lib(self, ctx):
     AmigaLibrary.setup_lib(self, ctx)
@@ -39,6 +46,12 @@ class ExecLibrary(AmigaLibrary):
   def finish_lib(self, ctx):
     pass
 
+  def _can_use_native(self):
+    # keep python versions if exec calls are logged
+    if log_exec.isEnabledFor(logging.INFO):
+      return False
+    return AmigaLibrary._can_use_native(self)
+
   def set_this_task(self, process):
     self.access.w_s("ThisTask",process.this_task.addr)
     self.stk_lower = process.stack_base
@@ -201,17 +214,42 @@ class ExecLibrary(AmigaLibrary):
     if poolid in self._pools:
       pool = self._pools[poolid]
       del self._pools[poolid]
+      self._add_pool_stats(pool)
       pool.__del__()
       log_exec.info("DeletePooled: pool 0x%x" % poolid)
     else:
       raise VamosInternalError("DeletePooled: invalid memory pool: ptr=%06x" % poolid)
 
 
+  def _add_pool_stats(self, pool):
+    self._num_pools += 1
+    self._num_pool_allocs += pool.num_allocs
+    self._num_pool_large_allocs += pool.num_large_allocs
+    self._pool_peak_puddles = max(self._pool_peak_puddles, pool.peak_puddles)
+    self._pool_peak_used = max(self._pool_peak_used, pool.peak_used)
+
+  def dump_pool_stats(self, log):
+    """report the memory pools: all pools and each pool still alive"""
+    num_pools = self._num_pools + len(self._pools)
+    if num_pools == 0:
+      return
+    allocs = self._num_pool_allocs
+    large = self._num_pool_large_allocs
+    peak_puddles = self._pool_peak_puddles
+    peak_used = self._pool_peak_used
+    for pool in self._pools.values():
+      allocs += pool.num_allocs
+      large += pool.num_large_allocs
+      peak_puddles = max(peak_puddles, pool.peak_puddles)
+      peak_used = max(peak_used, pool.peak_used)
+    log("memory pools: %d created, %d not deleted, %d allocs (%d large), max %d puddles and %d bytes used per pool",
+        num_pools, len(self._pools), allocs, large, peak_puddles, peak_used)
+    for poolid in sorted(self._pools):
+      self._pools[poolid].dump_stats(log)
+
   # ----- Memory Handling -----
 
-  def AllocMem(self, ctx):
-    size = ctx.cpu.r_reg(REG_D0)
-    flags = ctx.cpu.r_reg(REG_D1)
+  def AllocMem(self, ctx, size, flags):
     # label alloc
     pc = self.get_callee_pc(ctx)
     tag = ctx.label_mgr.get_mem_str(pc)
@@ -220,9 +258,7 @@ class ExecLibrary(AmigaLibrary):
     log_exec.info("AllocMem: %s -> 0x%06x %d bytes" % (mb,mb.addr,size))
     return mb.addr
 
-  def FreeMem(self, ctx):
-    size = ctx.cpu.r_reg(REG_D0)
-    addr = ctx.cpu.r_reg(REG_A1)
+  def FreeMem(self, ctx, addr, size):
     if addr == 0 or size == 0:
       log_exec.info("FreeMem: freeing NULL")
       return
@@ -233,15 +269,12 @@ class ExecLibrary(AmigaLibrary):
     else:
       raise VamosInternalError("FreeMem: Unknown memory to free: ptr=%06x size=%06x" % (addr, size))
 
-  def AllocVec(self, ctx):
-    size = ctx.cpu.r_reg(REG_D0)
-    flags = ctx.cpu.r_reg(REG_D1)
+  def AllocVec(self, ctx, size, flags):
     mb = self.alloc.alloc_memory("AllocVec(@%06x)" % self.get_callee_pc(ctx),size)
     log_exec.info("AllocVec: %s" % mb)
     return mb.addr
 
-  def FreeVec(self, ctx):
-    addr = ctx.cpu.r_reg(REG_A1)
+  def FreeVec(self, ctx, addr):
     if addr == 0:
       log_exec.info("FreeVec: freeing NULL")
       return
@@ -425,18 +458,12 @@ class ExecLibrary(AmigaLibrary):
     log_exec.info("RemTail(%06x): %06x" % (list_addr, node_addr))
     return node_addr
 
-  def CopyMem(self, ctx):
-    source = ctx.cpu.r_reg(REG_A0)
-    dest   = ctx.cpu.r_reg(REG_A1)
-    length = ctx.cpu.r_reg(REG_D0)
-    log_exec.info("CopyMem: source=%06x dest=%06x len=%06x" % (source,dest,length))
+  def CopyMem(self, ctx, source, dest, length):
+    log_exec.info("CopyMem: source=%06x dest=%06x len=%06x", source, dest, length)
     ctx.mem.raw_mem.copy_block(source, dest, length)
 
-  def CopyMemQuick(self, ctx):
-    source = ctx.cpu.r_reg(REG_A0)
-    dest   = ctx.cpu.r_reg(REG_A1)
-    length = ctx.cpu.r_reg(REG_D0)
-    log_exec.info("CopyMemQuick: source=%06x dest=%06x len=%06x" % (source,dest,length))
+  def CopyMemQuick(self, ctx, source, dest, length):
+    log_exec.info("CopyMemQuick: source=%06x dest=%06x len=%06x", source, dest, length)
     ctx.mem.raw_mem.copy_block(source, dest, length)
 
   def TypeOfMem(self, ctx):
@@ -455,9 +482,7 @@ class ExecLibrary(AmigaLibrary):
     putProc    = ctx.cpu.r_reg(REG_A2)
     putData    = ctx.cpu.r_reg(REG_A3)
     fmt        = ctx.mem.access.r_cstr(fmtString)
-    ps         = dos.Printf.printf_parse_string(fmt)
-    dataStream = dos.Printf.printf_read_data(ps, ctx.mem.access, dataStream)
-    resultstr  = dos.Printf.printf_generate_output(ps)
+    resultstr, dataStream = self.printf_cache.printf(fmtString, fmt, ctx.mem.access, dataStream)
     fmtstr     = resultstr+"\0"
     # Try to use a shortcut to avoid an unnecessary slow-down
     known      = False
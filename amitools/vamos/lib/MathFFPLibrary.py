@@ -1,6 +1,125 @@
 from amitools.vamos.AmigaLibrary import *
 from amitools.vamos.lib.lexec.ExecStruct import LibraryDef
 from amitools.vamos.Log import *
+import math
+
+# Motorola Fast Floating Point:
+# 24 bit mantissa (msb set) | sign bit | 7 bit exponent (excess 64)
+
+FFP_MAX = 0xffffff7f
+FFP_SIGN = 0x80
+
+def ffp_to_float(v):
+  m = v >> 8
+  if m == 0:
+    return 0.0
+  f = math.ldexp(m, (v & 0x7f) - 64 - 24)
+  if v & FFP_SIGN:
+    f = -f
+  return f
+
+def float_to_ffp(f):
+  """convert a python float to ffp. the mantissa is rounded to nearest,
+     overflows saturate and underflows return 0"""
+  if f == 0.0 or math.isnan(f):
+    return 0
+  sign = 0
+  if f < 0.0:
+    sign = FFP_SIGN
+    f = -f
+  if math.isinf(f):
+    return FFP_MAX | sign
+  m, e = math.frexp(f)
+  mant = int(math.floor(math.ldexp(m, 24) + 0.5))
+  if mant >= 0x1000000:
+    mant >>= 1
+    e += 1
+  e += 64
+  if e > 127:
+    return FFP_MAX | sign
+  if e < 0:
+    return 0
+  return (mant << 8) | sign | e
+
+def float_to_int32(f):
+  """truncate towards zero and saturate to a signed 32 bit value"""
+  if math.isnan(f):
+    return 0
+  if f >= 2147483647.0:
+    return 0x7fffffff
+  if f <= -2147483648.0:
+    return 0x80000000
+  return int(f) & 0xffffffff
+
+def int32_to_float(v):
+  if v & 0x80000000:
+    v -= 0x100000000
+  return float(v)
+
+def cmp_float(a, b):
+  if a > b:
+    return 1
+  elif a < b:
+    return -1
+  else:
+    return 0
+
+def set_cc(ctx, res):
+  """set N and Z flags of the CPU for a -1, 0, +1 result"""
+  sr = ctx.cpu.r_sr() & ~0x0f
+  if res < 0:
+    sr |= 0x08
+  elif res == 0:
+    sr |= 0x04
+  ctx.cpu.w_sr(sr)
+
+# ffp operations. binary ops take (d1, d0) like the library calls and
+# sub/div calculate d0 - d1 and d0 / d1 like the Motorola FFP routines.
+
+def ffp_fix(a):
+  return float_to_int32(ffp_to_float(a))
+
+def ffp_flt(a):
+  return float_to_ffp(int32_to_float(a))
+
+def ffp_cmp(a, b):
+  return cmp_float(ffp_to_float(a), ffp_to_float(b))
+
+def ffp_tst(a):
+  return cmp_float(ffp_to_float(a), 0.0)
+
+def ffp_abs(a):
+  return a & ~FFP_SIGN
+
+def ffp_neg(a):
+  if (a >> 8) == 0:
+    return 0
+  return a ^ FFP_SIGN
+
+def ffp_add(a, b):
+  return float_to_ffp(ffp_to_float(a) + ffp_to_float(b))
+
+def ffp_sub(a, b):
+  return float_to_ffp(ffp_to_float(b) - ffp_to_float(a))
+
+def ffp_mul(a, b):
+  return float_to_ffp(ffp_to_float(a) * ffp_to_float(b))
+
+def ffp_div(a, b):
+  fa = ffp_to_float(a)
+  fb = ffp_to_float(b)
+  if fa == 0.0:
+    if fb < 0.0:
+      return FFP_MAX | FFP_SIGN
+    return FFP_MAX
+  return float_to_ffp(fb / fa)
+
+def ffp_floor(a):
+  return float_to_ffp(math.floor(ffp_to_float(a)))
+
+def ffp_ceil(a):
+  return float_to_ffp(math.ceil(ffp_to_float(a)))
+
 
 class MathFFPLibrary(AmigaLibrary):
   name = "mathffp.library"
@@ -10,3 +129,45 @@ class MathFFPLibrary(AmigaLibrary):
 
   def setup_lib(self, ctx):
     AmigaLibrary.setup_lib(self, ctx)
+
+  # the python versions are used if no native version is active
+
+  def SPFix(self, ctx, parm):
+    return ffp_fix(parm)
+
+  def SPFlt(self, ctx, integer):
+    return ffp_flt(integer)
+
+  def SPCmp(self, ctx, left, right):
+    res = ffp_cmp(left, right)
+    set_cc(ctx, res)
+    return res
+
+  def SPTst(self, ctx, parm):
+    res = ffp_tst(parm)
+    set_cc(ctx, res)
+    return res
+
+  def SPAbs(self, ctx, parm):
+    return ffp_abs(parm)
+
+  def SPNeg(self, ctx, parm):
+    return ffp_neg(parm)
+
+  def SPAdd(self, ctx, left, right):
+    return ffp_add(left, right)
+
+  def SPSub(self, ctx, left, right):
+    return ffp_sub(left, right)
+
+  def SPMul(self, ctx, left, right):
+    return ffp_mul(left, right)
+
+  def SPDiv(self, ctx, left, right):
+    return ffp_div(left, right)
+
+  def SPFloor(self, ctx, parm):
+    return ffp_floor(parm)
+
+  def SPCeil(self, ctx, parm):
+    return ffp_ceil(parm)
@@ -1,6 +1,63 @@
 from amitools.vamos.AmigaLibrary import *
 from amitools.vamos.lib.lexec.ExecStruct import LibraryDef
 from amitools.vamos.Log import *
+from MathFFPLibrary import float_to_int32, int32_to_float, cmp_float, set_cc
+import math
+import struct
+
+# doubles are passed in register pairs: d0/d1 and d2/d3 (hi/lo)
+
+DP_SIGN = 0x80000000
+
+def regs_to_double(hi, lo):
+  return struct.unpack(">d", struct.pack(">II", hi, lo))[0]
+
+def double_to_regs(f):
+  return list(struct.unpack(">II", struct.pack(">d", f)))
+
+def dp_fix(hi, lo):
+  return float_to_int32(regs_to_double(hi, lo))
+
+def dp_flt(a):
+  return double_to_regs(int32_to_float(a))
+
+def dp_cmp(ah, al, bh, bl):
+  return cmp_float(regs_to_double(ah, al), regs_to_double(bh, bl))
+
+def dp_tst(hi, lo):
+  return cmp_float(regs_to_double(hi, lo), 0.0)
+
+def dp_abs(hi, lo):
+  return [hi & ~DP_SIGN, lo]
+
+def dp_neg(hi, lo):
+  return [hi ^ DP_SIGN, lo]
+
+def dp_add(ah, al, bh, bl):
+  return double_to_regs(regs_to_double(ah, al) + regs_to_double(bh, bl))
+
+def dp_sub(ah, al, bh, bl):
+  return double_to_regs(regs_to_double(ah, al) - regs_to_double(bh, bl))
+
+def dp_mul(ah, al, bh, bl):
+  return double_to_regs(regs_to_double(ah, al) * regs_to_double(bh, bl))
+
+def dp_div(ah, al, bh, bl):
+  a = regs_to_double(ah, al)
+  b = regs_to_double(bh, bl)
+  if b == 0.0:
+    # python raises here but IEEE defines the result
+    if a == 0.0 or math.isnan(a):
+      return double_to_regs(float('nan'))
+    return double_to_regs(math.copysign(float('inf'), a) * math.copysign(1.0, b))
+  return double_to_regs(a / b)
+
+def dp_floor(hi, lo):
+  return double_to_regs(math.floor(regs_to_double(hi, lo)))
+
+def dp_ceil(hi, lo):
+  return double_to_regs(math.ceil(regs_to_double(hi, lo)))
+
 
 class MathIEEEDoubBasLibrary(AmigaLibrary):
   name = "mathieeedoubbas.library"
@@ -10,3 +67,45 @@ class MathIEEEDoubBasLibrary(AmigaLibrary):
 
   def setup_lib(self, ctx):
     AmigaLibrary.setup_lib(self, ctx)
+
+  # the python versions are used if no native version is active
+
+  def IEEEDPFix(self, ctx, hi, lo):
+    return dp_fix(hi, lo)
+
+  def IEEEDPFlt(self, ctx, integer):
+    return dp_flt(integer)
+
+  def IEEEDPCmp(self, ctx, ah, al, bh, bl):
+    res = dp_cmp(ah, al, bh, bl)
+    set_cc(ctx, res)
+    return res
+
+  def IEEEDPTst(self, ctx, hi, lo):
+    res = dp_tst(hi, lo)
+    set_cc(ctx, res)
+    return res
+
+  def IEEEDPAbs(self, ctx, hi, lo):
+    return dp_abs(hi, lo)
+
+  def IEEEDPNeg(self, ctx, hi, lo):
+    return dp_neg(hi, lo)
+
+  def IEEEDPAdd(self, ctx, ah, al, bh, bl):
+    return dp_add(ah, al, bh, bl)
+
+  def IEEEDPSub(self, ctx, ah, al, bh, bl):
+    return dp_sub(ah, al, bh, bl)
+
+  def IEEEDPMul(self, ctx, ah, al, bh, bl):
+    return dp_mul(ah, al, bh, bl)
+
+  def IEEEDPDiv(self, ctx, ah, al, bh, bl):
+    return dp_div(ah, al, bh, bl)
+
+  def IEEEDPFloor(self, ctx, hi, lo):
+    return dp_floor(hi, lo)
+
+  def IEEEDPCeil(self, ctx, hi, lo):
+    return dp_ceil(hi, lo)
@@ -1,12 +1,19 @@
+import re
+import struct
 import types
 from Error import *
 
+# separators of unquoted args
+args_re_word = re.compile('[^ \t\n]+')
+
 #
 # THOR: FIXME: /F arguments eat *all* arguments, not just
 # the rest of the line. "set echo on" does not work due to
 # this problem.
 #
 class Args:
+  # parsed templates: template string -> list of targs
+  template_cache = {}
 
   def __init__(self):
     self.targs = None
@@ -14,8 +21,18 @@ class Args:
     self.result = None
 
   def parse_template(self, template):
-    """generate an internal representation of an AmigaDOS ReadArgs compatible arg parse template
+    """generate an internal representation of an AmigaDOS ReadArgs compatible arg parse template.
+       the template is only parsed once and then taken from the cache
     """
+    targs = self.template_cache.get(template)
+    if targs is None:
+      self._parse_template(template)
+      # store a copy as parse_string() modifies the targs
+      self.template_cache[template] = [dict(t) for t in self.targs]
+    else:
+      self.targs = [dict(t) for t in targs]
+
+  def _parse_template(self, template):
     self.targs = []
     ps = template.split(',')
     for p in ps:
@@ -50,6 +67,12 @@ class Args:
       ptr += 4
 
   def split(self,argstring):
+    # fast path: without quotes only the separators matter
+    if '"' not in argstring:
+      return args_re_word.findall(argstring)
+    return self._split_quoted(argstring)
+
+  def _split_quoted(self,argstring):
     args=[]
     # AmigaOs quoting rules are weird!
     # This is a simplified version of the shell
@@ -348,10 +371,14 @@ class Args:
     return size
 
   def generate_result(self,mem_access,addr,array_ptr):
+    """write the extra longs and strings to addr and the result array to
+       array_ptr. both blocks are written at once"""
     n = len(self.result)
     char_ptr = addr + self.num_longs * 4
     long_ptr = addr
-    base_ptr = array_ptr
+    base_vals = []
+    longs = []
+    chars = []
     for i in xrange(n):
       r = self.result[i]
       if r == None: # optional value not set ('k')
@@ -360,13 +387,12 @@ class Args:
         # pointer to string
         base_val = char_ptr
         # append string
-        mem_access.w_cstr(char_ptr, r)
+        chars.append(r + "\0")
         char_ptr += len(r) + 1
       elif type(r) is types.IntType:
         # pointer to long
         base_val = long_ptr
-        # write long
-        mem_access.w32(long_ptr,r)
+        longs.append(r & 0xffffffff)
         long_ptr += 4
       elif type(r) is types.ListType:
         # array with longs + strs
@@ -377,16 +403,22 @@ class Args:
           # pointer to array
           base_val = long_ptr
           for s in r:
-            mem_access.w32(long_ptr,char_ptr)
-            mem_access.w_cstr(char_ptr,s)
+            longs.append(char_ptr)
+            chars.append(s + "\0")
             long_ptr += 4
             char_ptr += len(s) + 1
-          mem_access.w32(long_ptr,0)
+          longs.append(0)
           long_ptr += 4
       else:
         # direct value
         base_val = r
+      base_vals.append(base_val & 0xffffffff)
 
-      mem_access.w32(base_ptr,base_val)
-      base_ptr += 4
+    # write extra longs and strings
+    if len(longs) > 0 or len(chars) > 0:
+      data = struct.pack(">%dI" % len(longs), *longs) + "".join(chars)
+      mem_access.w_data(addr, data)
+    # write result array
+    if n > 0:
+      mem_access.w_data(array_ptr, struct.pack(">%dI" % n, *base_vals))
     return self.result
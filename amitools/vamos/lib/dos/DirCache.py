@@ -0,0 +1,137 @@
+import os
+import stat
+
+from amitools.vamos.Log import log_lock
+
+# single pass directory listing with inode and type (if available).
+# the module is only imported on the first scan to keep startup fast
+scandir = False
+
+def _get_scandir():
+  global scandir
+  if scandir is False:
+    try:
+      from os import scandir
+    except ImportError:
+      try:
+        from scandir import scandir
+      except ImportError:
+        scandir = None
+  return scandir
+
+class FileInfo:
+  """the host file system info of a file or directory needed for a FIB"""
+  def __init__(self, key, is_dir, mode, size, mtime):
+    self.key = key
+    self.is_dir = is_dir
+    self.mode = mode
+    self.size = size
+    self.mtime = mtime
+
+def _info_from_stat(key, st):
+  is_dir = stat.S_ISDIR(st.st_mode)
+  return FileInfo(key, is_dir, st.st_mode, st.st_size, st.st_mtime)
+
+def _get_sig(lst):
+  """the lstat() values that change if a cached info gets stale"""
+  return (lst.st_ino, lst.st_mode, lst.st_size, lst.st_mtime)
+
+def _read_info(sys_path, lst):
+  """return (sig, FileInfo) for the lstat() result of a path. the key
+     is the inode of the path itself, the rest follows links. links have
+     no sig as their target may change"""
+  if stat.S_ISLNK(lst.st_mode):
+    try:
+      return None, _info_from_stat(lst.st_ino, os.stat(sys_path))
+    except OSError:
+      return None, None
+  return _get_sig(lst), _info_from_stat(lst.st_ino, lst)
+
+class DirCache:
+  """cache the listings of host directories together with the infos of
+     their entries. a listing is reused as long as the mtime of the
+     directory is unchanged and vamos did not modify the directory.
+     an info is reused as long as an lstat() of the path gives the same
+     inode, mode, size and mtime. so changes on the host are seen, too.
+  """
+
+  def __init__(self):
+    # sys dir path -> (dir mtime, names)
+    self.dirs = {}
+    # sys path -> (lstat sig, FileInfo)
+    self.infos = {}
+    # stats
+    self.num_dir_hits = 0
+    self.num_dir_misses = 0
+    self.num_info_hits = 0
+    self.num_info_misses = 0
+
+  def list_dir(self, sys_dir):
+    """return the entry names of a directory"""
+    sys_dir = os.path.normpath(sys_dir)
+    try:
+      mtime = os.stat(sys_dir).st_mtime
+    except OSError:
+      return []
+    entry = self.dirs.get(sys_dir)
+    if entry is not None and entry[0] == mtime:
+      self.num_dir_hits += 1
+      return entry[1]
+    self.num_dir_misses += 1
+    try:
+      names = self._scan_dir(sys_dir)
+    except OSError:
+      return []
+    self.dirs[sys_dir] = (mtime, names)
+    return names
+
+  def _scan_dir(self, sys_dir):
+    infos = self.infos
+    scandir = _get_scandir()
+    if scandir is not None:
+      names = []
+      for e in scandir(sys_dir):
+        names.append(e.name)
+        path = os.path.join(sys_dir, e.name)
+        try:
+          infos[path] = _read_info(path, e.stat(follow_symlinks=False))
+        except OSError:
+          infos.pop(path, None)
+    else:
+      names = os.listdir(sys_dir)
+      for name in names:
+        path = os.path.join(sys_dir, name)
+        try:
+          infos[path] = _read_info(path, os.lstat(path))
+        except OSError:
+          infos.pop(path, None)
+    return names
+
+  def get_info(self, sys_path):
+    """return the FileInfo of a path or None if it is not accessible"""
+    sys_path = os.path.normpath(sys_path)
+    try:
+      lst = os.lstat(sys_path)
+    except OSError:
+      self.infos.pop(sys_path, None)
+      return None
+    entry = self.infos.get(sys_path)
+    if entry is not None and entry[0] is not None and \
+       entry[0] == _get_sig(lst):
+      self.num_info_hits += 1
+      return entry[1]
+    self.num_info_misses += 1
+    entry = _read_info(sys_path, lst)
+    self.infos[sys_path] = entry
+    return entry[1]
+
+  def invalidate(self, sys_path):
+    """vamos modified the given path"""
+    sys_path = os.path.normpath(sys_path)
+    self.infos.pop(sys_path, None)
+    self.dirs.pop(sys_path, None)
+    self.dirs.pop(os.path.dirname(sys_path), None)
+
+  def dump_stats(self):
+    log_lock.info("dir cache: dirs %d hits, %d misses, infos %d hits, %d misses",
+      self.num_dir_hits, self.num_dir_misses, self.num_info_hits, self.num_info_misses)
@@ -16,6 +16,8 @@ class FileHandle:
     self.unch = ""
     self.ch = -1
     self.is_nil = is_nil
+    # set for files opened for writing
+    self.dir_cache = None
 
   def __str__(self):
     return "[FH:'%s'(ami='%s',sys='%s',nc=%s)@%06x=B@%06x]" % (self.name, self.ami_path, self.sys_path, self.need_close, self.mem.addr, self.b_addr)
@@ -41,6 +43,8 @@ class FileHandle:
   # --- file ops ---
 
   def write(self, data):
+    if self.dir_cache is not None:
+      self.dir_cache.invalidate(self.sys_path)
     try:
       self.obj.write(data)
       return len(data)
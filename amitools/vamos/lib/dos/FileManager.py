@@ -12,12 +12,16 @@ from amitools.vamos.lib.lexec.ExecStruct import MessageDef
 from Error import *
 from DosProtection import DosProtection
 from FileHandle import FileHandle
+from DirCache import DirCache
 
 class FileManager:
-  def __init__(self, path_mgr, alloc, mem):
+  def __init__(self, path_mgr, alloc, mem, dir_cache=None):
     self.path_mgr = path_mgr
     self.alloc = alloc
     self.mem = mem
+    if dir_cache is None:
+      dir_cache = DirCache()
+    self.dir_cache = dir_cache
 
     self.files_by_b_addr = {}
 
@@ -101,6 +105,10 @@ class FileManager:
         log_file.debug("opening file: '%s' -> '%s' f_mode=%s" % (ami_path, sys_path, f_mode))
         fobj = open(sys_path, f_mode)
         fh = FileHandle(fobj, ami_path, sys_path)
+        # keep cached dir infos in sync with writes
+        if f_mode[0] != 'r' or f_mode[-1] == '+':
+          self.dir_cache.invalidate(sys_path)
+          fh.dir_cache = self.dir_cache
 
       self._register_file(fh)
       return fh
@@ -133,6 +141,7 @@ class FileManager:
     if sys_path == None or not os.path.exists(sys_path):
       log_file.info("file to delete not found: '%s'" % (ami_path))
       return ERROR_OBJECT_NOT_FOUND
+    self.dir_cache.invalidate(sys_path)
     try:
       if os.path.isdir(sys_path):
         os.rmdir(sys_path)
@@ -156,6 +165,8 @@ class FileManager:
     if new_sys_path == None:
       log_file.info("new file to rename not found: '%s'" % new_ami_path)
       return ERROR_OBJECT_NOT_FOUND
+    self.dir_cache.invalidate(old_sys_path)
+    self.dir_cache.invalidate(new_sys_path)
     try:
       os.rename(old_sys_path, new_sys_path)
       return 0
@@ -188,6 +199,7 @@ class FileManager:
       posix_mask |= stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
     posix_mask &= ~self.umask
     log_file.info("set protection: '%s': %s -> '%s': posix_mask=%03o umask=%03o", ami_path, prot, sys_path, posix_mask, self.umask)
+    self.dir_cache.invalidate(sys_path)
     try:
       os.chmod(sys_path, posix_mask)
       return NO_ERROR
@@ -197,6 +209,7 @@ class FileManager:
   def create_dir(self, lock, ami_path):
     sys_path = self.path_mgr.ami_to_sys_path(lock, ami_path)
     try:
+      self.dir_cache.invalidate(sys_path)
       os.mkdir(sys_path)
       return NO_ERROR
     except OSError:
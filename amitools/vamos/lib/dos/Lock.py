@@ -1,6 +1,5 @@
 import os
 import stat
-import uuid
 
 from amitools.vamos.Log import log_lock
 from amitools.vamos.AccessStruct import AccessStruct
@@ -9,11 +8,12 @@ from DosStruct import FileLockDef, DateStampDef
 from DosProtection import DosProtection
 from AmiTime import *
 from Error import *
+from DirCache import DirCache
 
 class Lock:
   """represent an AmigaOS Lock in vamos"""
 
-  def __init__(self, name, ami_path, sys_path, exclusive=False):
+  def __init__(self, name, ami_path, sys_path, exclusive=False, dir_cache=None):
     self.ami_path = ami_path
     self.sys_path = sys_path
     self.name = name
@@ -23,6 +23,10 @@ class Lock:
     self.vol_addr = 0
     self.key      = 0
     self.dirent   = None
+    self.dirent_pos = 0
+    if dir_cache is None:
+      dir_cache = DirCache()
+    self.dir_cache = dir_cache
 
   def __str__(self):
     addr = 0
@@ -47,59 +51,49 @@ class Lock:
   # --- lock ops ---
 
   def examine_file(self, fib_mem, name, sys_path):
-    # name
-    name_addr = fib_mem.s_get_addr('fib_FileName')
-    # clear 32 name bytes
-    fib_mem.clear_data(name_addr, 32, 0)
-    fib_mem.w_cstr(name_addr, name)
-    # comment
-    comment_addr = fib_mem.s_get_addr('fib_Comment')
-    fib_mem.w_cstr(comment_addr, "")
-    # create the "inode" information
-    key = self.keygen(sys_path)
-    fib_mem.w_s('fib_DiskKey',key)
-    log_lock.debug("examine key: %08x", key)
+    """fill the FIB with the cached file info and write it at once"""
+    info = self.dir_cache.get_info(sys_path)
+    if info is None:
+      return ERROR_OBJECT_IN_USE
+    log_lock.debug("examine key: %08x", info.key)
     # type
-    if os.path.isdir(sys_path):
+    if info.is_dir:
       dirEntryType = 2
+      size = 0
+      blocks = 1
     else:
       dirEntryType = (-3) & 0xffffffff
-    fib_mem.w_s('fib_DirEntryType', dirEntryType )
-    fib_mem.w_s('fib_EntryType',    dirEntryType )
+      size = info.size & 0xffffffff
+      blocks = int((size + 511) / 512)
     # protection
     prot = DosProtection(0)
-    try:
-      os_stat = os.stat(sys_path)
-      mode = os_stat.st_mode
-      if mode & stat.S_IXUSR == 0:
-        prot.clr(DosProtection.FIBF_EXECUTE)
-      if mode & stat.S_IRUSR == 0:
-        prot.clr(DosProtection.FIBF_READ)
-      if mode & stat.S_IWUSR == 0:
-        prot.clr(DosProtection.FIBF_WRITE)
-      log_lock.debug("examine lock: '%s' mode=%03o: prot=%s", name, mode, prot)
-    except OSError:
-      return ERROR_OBJECT_IN_USE
-    fib_mem.w_s('fib_Protection', prot.mask)
-    # size
-    if os.path.isfile(sys_path):
-      size = os.path.getsize(sys_path)
-      fib_mem.w_s('fib_Size', size)
-      blocks = int((size + 511) / 512)
-      fib_mem.w_s('fib_NumBlocks', blocks)
-    else:
-      fib_mem.w_s('fib_NumBlocks', 1)
+    mode = info.mode
+    if mode & stat.S_IXUSR == 0:
+      prot.clr(DosProtection.FIBF_EXECUTE)
+    if mode & stat.S_IRUSR == 0:
+      prot.clr(DosProtection.FIBF_READ)
+    if mode & stat.S_IWUSR == 0:
+      prot.clr(DosProtection.FIBF_WRITE)
+    log_lock.debug("examine lock: '%s' mode=%03o: prot=%s", name, mode, prot)
     # date (use mtime here)
-    date_addr = fib_mem.s_get_addr('fib_Date')
-    date = AccessStruct(fib_mem.mem, DateStampDef, date_addr)
-    t = os.path.getmtime(sys_path)
-    at = sys_to_ami_time(t)
-    date.w_s('ds_Days', at.tday)
-    date.w_s('ds_Minute', at.tmin)
-    date.w_s('ds_Tick', at.tick)
-    # fill in UID/GID
-    fib_mem.w_s('fib_OwnerUID', 0)
-    fib_mem.w_s('fib_OwnerGID', 0)
+    at = sys_to_ami_time(info.mtime)
+    # write the whole FIB at once: name and comment are C strings
+    fib_mem.write_fields({
+      'fib_DiskKey' : info.key,
+      'fib_DirEntryType' : dirEntryType,
+      'fib_FileName' : name[:107],
+      'fib_Protection' : prot.mask,
+      'fib_EntryType' : dirEntryType,
+      'fib_Size' : size,
+      'fib_NumBlocks' : blocks,
+      'fib_Date.ds_Days' : at.tday,
+      'fib_Date.ds_Minute' : at.tmin,
+      'fib_Date.ds_Tick' : at.tick,
+      'fib_Comment' : "",
+      'fib_OwnerUID' : 0,
+      'fib_OwnerGID' : 0,
+      'fib_Reserved' : ""
+    })
     return NO_ERROR
 
   def examine_lock(self, fib_mem):
@@ -108,19 +102,17 @@ class Lock:
   def examine_next(self, fib_mem):
     # start scan
     if self.dirent is None:
-      dirEntryType = fib_mem.r_s('fib_DirEntryType')
-      if os.path.isdir(self.sys_path):
-        self.dirent = os.listdir(self.sys_path)
-      else:
-        self.dirent = []
+      self.dirent = self.dir_cache.list_dir(self.sys_path)
+      self.dirent_pos = 0
       # assume that key stored in given FIB is my own one
       # (otherwise no Examine() on my lock was done before..., aka broken code!)
       fib_key = fib_mem.r_s('fib_DiskKey')
       if fib_key != self.key:
-        self.dirent = self._handle_broken_scan(self.dirent, fib_key)
+        self.dirent_pos = self._handle_broken_scan(self.dirent, fib_key)
 
-    if len(self.dirent) > 0:
-      entry = self.dirent.pop(0)
+    if self.dirent_pos < len(self.dirent):
+      entry = self.dirent[self.dirent_pos]
+      self.dirent_pos += 1
       e_path = os.path.join(self.sys_path, entry)
       return self.examine_file(fib_mem, entry, e_path)
     else:
@@ -130,15 +122,16 @@ class Lock:
   def _handle_broken_scan(self, entries, fib_key):
     log_lock.warning("first ExNext() does not start at Examine()d lock! Broken Code!! lock_key=%08x fib_key=%08x (%s)",
       self.key, fib_key, self.name)
-    # we shrink the dir list to start after the given key
+    # we continue the scan after the entry with the given key
     # and simulate a continued scan as AmigaOS' FFS would do it
-    while len(entries) > 0:
-      entry = entries.pop(0)
+    pos = 0
+    for entry in entries:
+      pos += 1
       e_path = os.path.join(self.sys_path, entry)
-      e_key = self.keygen(e_path)
-      if e_key == fib_key:
+      info = self.dir_cache.get_info(e_path)
+      if info is not None and info.key & 0xffffffff == fib_key:
         break
-    return entries
+    return pos
 
   def find_volume_node(self,dos_list):
     return self.mem.access.r_s("fl_Volume")
@@ -8,14 +8,18 @@ from amitools.vamos.AccessStruct import AccessStruct
 from DosStruct import *
 from Error import *
 from Lock import Lock
+from DirCache import DirCache
 
 class LockManager:
-  def __init__(self, path_mgr, dos_list, alloc, mem):
+  def __init__(self, path_mgr, dos_list, alloc, mem, dir_cache=None):
     self.path_mgr = path_mgr
     self.dos_list = dos_list
     self.alloc    = alloc
     self.mem      = mem
     self.locks_by_baddr = {}
+    if dir_cache is None:
+      dir_cache = DirCache()
+    self.dir_cache = dir_cache
 
   def generate_key(self, system_path):
     return os.lstat(system_path).st_ino
@@ -58,7 +62,7 @@ class LockManager:
     if not exists:
       log_lock.info("lock '%s' invalid: sys path does not exist: '%s' -> '%s'", name, ami_path, sys_path)
       return None
-    lock = Lock(name, ami_path, sys_path, exclusive)
+    lock = Lock(name, ami_path, sys_path, exclusive, self.dir_cache)
     self._register_lock(lock)
     return lock
 
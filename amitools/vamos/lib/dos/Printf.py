@@ -1,6 +1,7 @@
 """Handle printf like Functions including VPrintf and RawDoFmt"""
 
 import re
+import struct
 
 class printf_element:
   def __init__(self, txt, begin, end, etype, flags=None, width_limit=None, length=None):
@@ -154,19 +155,154 @@ def printf(string, mem_access, data_ptr):
   printf_read_data(ps, mem_access, data_ptr)
   return printf_generate_output(ps)
 
-# test
+# ----- compiled formats -----
+
+# argument struct codes of the element types (short and long version)
+printf_arg_codes = {
+  'b' : ('I', 'I'),
+  's' : ('I', 'I'),
+  'd' : ('H', 'I'),
+  'u' : ('H', 'I'),
+  'x' : ('H', 'I'),
+  'c' : ('H', 'H'),
+  '%' : ('', '')
+}
+
+class printf_format:
+  """a parsed format string compiled to a single python format and the
+     struct layout of the argument array.
+
+     the output is created by one python format operation from all
+     arguments that are fetched with one block read.
+  """
+  def __init__(self, string):
+    self.string = string
+    ps = printf_parse_string(string)
+    fmt = []
+    codes = []
+    types = []
+    pos = 0
+    f = ps.fragments
+    fi = 0
+    for e in ps.elements:
+      if pos < e.begin:
+        fmt.append(f[fi].replace('%', '%%'))
+        fi += 1
+      fmt.append(e.gen_sys_printf_format())
+      is_long = e.length is not None and 'l' in e.length
+      code = printf_arg_codes[e.etype][is_long]
+      codes.append(code)
+      types.append((e.etype, is_long))
+      pos = e.end
+    if fi < len(f):
+      fmt.append(f[fi].replace('%', '%%'))
+    self.fmt = "".join(fmt)
+    self.types = types
+    self.arg_struct = struct.Struct(">" + "".join(codes))
+    self.arg_size = self.arg_struct.size
+
+  def format(self, mem_access, data_ptr):
+    """return the output string and the pointer behind the arguments"""
+    if self.arg_size > 0:
+      data = mem_access.r_data(data_ptr, self.arg_size)
+      raw = iter(self.arg_struct.unpack(str(data)))
+    values = []
+    for t, is_long in self.types:
+      if t == '%':
+        val = ord('%')
+      else:
+        val = raw.next()
+        if t == 'd':
+          # handle negative values like printf_element.gen_value()
+          if is_long:
+            if val >= 0x80000000:
+              val = 0xfffffffe - val
+          elif val >= 0x8000:
+            val = 0xfffe - val
+        elif t == 's':
+          if val > 0:
+            val = mem_access.r_cstr(val)
+          else:
+            val = '(null)'
+        elif t == 'b':
+          val = mem_access.r_bstr(val * 4)
+        elif t == 'c':
+          val = chr(val)
+      values.append(val)
+    return self.fmt % tuple(values), data_ptr + self.arg_size
+
+class printf_cache:
+  """cache the compiled formats by address of the format string.
+     the cached format is only used if the string is still the same.
+  """
+  def __init__(self, max_entries=256):
+    self.max_entries = max_entries
+    self.formats = {}
+    self.num_hits = 0
+    self.num_misses = 0
+
+  def get(self, addr, string):
+    pf = self.formats.get(addr)
+    if pf is not None and pf.string == string:
+      self.num_hits += 1
+      return pf
+    self.num_misses += 1
+    pf = printf_format(string)
+    if len(self.formats) >= self.max_entries:
+      self.formats.clear()
+    self.formats[addr] = pf
+    return pf
+
+  def printf(self, addr, string, mem_access, data_ptr):
+    return self.get(addr, string).format(mem_access, data_ptr)
+
+# mini test and benchmark
 if __name__ == '__main__':
-  txt = "hello %s... %d what a number %2ld.. now align %-4.2s!"
-  print txt
-  elements, fragments = printf_parse_string(txt)
-  for e in elements:
-    print e
-  print fragments
+  import time
+  from musashi import emu
+  from amitools.vamos.AccessMemory import AccessMemory
 
-  txt = "%s begin and last %d"
-  print txt
-  elements, fragments = printf_parse_string(txt)
-  for e in elements:
-    print e
-  print fragments
+  raw_mem = emu.Memory(64)
+  class mem_stub:
+    pass
+  mem = mem_stub()
+  mem.raw_mem = raw_mem
+  access = AccessMemory(mem)
+
+  txt = "hello %s... %d what a number %2ld.. now align %-4.2s! %c %lx %% %b"
+  fmt_addr = 0x100
+  str_addr = 0x200
+  bstr_addr = 0x300
+  data_addr = 0x400
+  raw_mem.w_cstr(fmt_addr, txt)
+  raw_mem.w_cstr(str_addr, "world")
+  raw_mem.w_bstr(bstr_addr, "bstr")
+  ptr = data_addr
+  for size, val in ((4, str_addr), (2, 0xfff0), (4, 42), (4, str_addr),
+                    (2, ord('A')), (4, 0xdeadbeef), (4, bstr_addr / 4)):
+    if size == 4:
+      raw_mem.w32(ptr, val)
+    else:
+      raw_mem.w16(ptr, val)
+    ptr += size
+
+  ps = printf_parse_string(txt)
+  end = printf_read_data(ps, access, data_addr)
+  ref = printf_generate_output(ps)
+  cache = printf_cache()
+  res, res_end = cache.printf(fmt_addr, txt, access, data_addr)
+  print ref
+  print res
+  print "same:", res == ref and res_end == end
 
+  num = 20000
+  t = time.time()
+  for i in xrange(num):
+    printf(access.r_cstr(fmt_addr), access, data_addr)
+  t_parse = time.time() - t
+  t = time.time()
+  for i in xrange(num):
+    cache.printf(fmt_addr, access.r_cstr(fmt_addr), access, data_addr)
+  t_cache = time.time() - t
+  print "%d calls: parse %.4fs, cached %.4fs -> %.1fx" % \
+    (num, t_parse, t_cache, t_parse / t_cache)
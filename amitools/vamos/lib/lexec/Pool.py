@@ -1,8 +1,17 @@
+import bisect
+
 from amitools.vamos.Log import log_exec
 from amitools.vamos.Exceptions import *
 from Puddle import Puddle
 
 class Pool:
+  """a memory pool of exec.
+
+     small allocations are taken from shared puddles of minsize bytes.
+     allocations of thresh bytes or more get a puddle of their own that
+     is released again in FreePooled. all puddles are indexed by their
+     address to quickly find the owner of a freed block.
+  """
 
   def __init__(self, mem, alloc, flags, size, thresh, poolid):
     self.alloc   = alloc
@@ -10,50 +19,157 @@ class Pool:
     self.minsize = size
     self.flags   = flags
     self.thresh  = thresh
+    self.poolid  = poolid
     self.name    = " in Pool %x" % poolid
+    # shared puddles for small allocations
     self.puddles = []
+    self.last_puddle = None
+    # address index of all puddles: sorted start addresses and puddles
+    self.starts  = []
+    self.index   = []
+    # stats
+    self.num_allocs = 0
+    self.num_large_allocs = 0
+    self.used = 0
+    self.peak_used = 0
+    self.peak_puddles = 0
 
   def __del__(self):
-    while len(self.puddles) > 0:
-      puddle = self.puddles.pop()
+    while len(self.index) > 0:
+      puddle = self.index.pop()
       puddle.__del__()
+    self.starts = []
+    self.puddles = []
+    self.last_puddle = None
 
   def __str__(self):
-    poolstr = ""
-    for puddle in self.puddles:
-      if poolstr == "":
-        poolstr = "{%s}" % puddle
-      else:
-        poolstr = "%s,{%s}" % (poolstr,puddle)
-    return poolstr
+    return ",".join(["{%s}" % puddle for puddle in self.index])
+
+  def _add_puddle(self, puddle):
+    pos = bisect.bisect_right(self.starts, puddle.addr)
+    self.starts.insert(pos, puddle.addr)
+    self.index.insert(pos, puddle)
+    if len(self.index) > self.peak_puddles:
+      self.peak_puddles = len(self.index)
+
+  def _remove_puddle(self, puddle):
+    pos = bisect.bisect_left(self.starts, puddle.addr)
+    del self.starts[pos]
+    del self.index[pos]
+
+  def find_puddle(self, addr):
+    """return the puddle containing the address or None"""
+    pos = bisect.bisect_right(self.starts, addr) - 1
+    if pos >= 0:
+      puddle = self.index[pos]
+      if addr < puddle.end:
+        return puddle
+    return None
 
   def AllocPooled(self, label_mgr, name, size):
     result = None
     if size >= self.thresh:
-      puddle = Puddle(self.mem, self.alloc, label_mgr, name, size)
+      puddle = Puddle(self.mem, self.alloc, label_mgr, name, size, own=True)
       if puddle != None:
-        self.puddles.append(puddle)
+        self._add_puddle(puddle)
         result = puddle.AllocPooled(name + self.name, size)
-    else: 
-      for puddle in self.puddles:
+        self.num_large_allocs += 1
+    else:
+      # try the puddle of the last small allocation first
+      puddle = self.last_puddle
+      if puddle != None and puddle.may_fit(size):
         result = puddle.AllocPooled(name + self.name, size)
-        if result != None:
-          break
-        # none of the puddles had enough memory
+      if result == None:
+        for puddle in self.puddles:
+          if puddle.may_fit(size):
+            result = puddle.AllocPooled(name + self.name, size)
+            if result != None:
+              self.last_puddle = puddle
+              break
+      # none of the puddles had enough memory
       if result == None:
         puddle = Puddle(self.mem, self.alloc, label_mgr, name, self.minsize)
         if puddle != None:
           self.puddles.append(puddle)
+          self._add_puddle(puddle)
+          self.last_puddle = puddle
           result = puddle.AllocPooled(name + self.name, size)
-    if result == None: 
+    if result == None:
       log_exec.info("AllocPooled: Unable to allocate memory (%x)", size)
+    else:
+      self.num_allocs += 1
+      self.used += size
+      if self.used > self.peak_used:
+        self.peak_used = self.used
     return result
 
   def FreePooled(self, mem, size):
     if mem != 0:
-      for puddle in self.puddles:
-        if puddle.contains(mem,size):
-          puddle.FreePooled(mem,size)
-          return
-      raise VamosInternalError("FreePooled: invalid memory, not in any puddle : ptr=%06x" % mem)
+      puddle = self.find_puddle(mem)
+      if puddle == None:
+        raise VamosInternalError("FreePooled: invalid memory, not in any puddle : ptr=%06x" % mem)
+      puddle.FreePooled(mem,size)
+      self.used -= size
+      # large allocations return their puddle right away
+      if puddle.own:
+        self._remove_puddle(puddle)
+        puddle.__del__()
+
+  # ----- stats -----
+
+  def get_num_puddles(self):
+    return len(self.index)
+
+  def get_size(self):
+    return sum([puddle.raw_size for puddle in self.index])
+
+  def get_fragmentation(self):
+    """percentage of free space in the shared puddles that is not part
+       of the largest free chunk of its puddle"""
+    free = 0
+    largest = 0
+    for puddle in self.puddles:
+      free += puddle.get_free_bytes()
+      largest += puddle.get_largest_free()
+    if free == 0:
+      return 0.0
+    return (free - largest) * 100.0 / free
+
+  def dump_stats(self, log):
+    log("pool %x: %d puddles (peak %d), %d of %d bytes used (peak %d), %d allocs (%d large), fragmentation %.1f%%",
+        self.poolid, self.get_num_puddles(), self.peak_puddles, self.used,
+        self.get_size(), self.peak_used, self.num_allocs,
+        self.num_large_allocs, self.get_fragmentation())
+
+
+# mini benchmark: many small nodes with random frees
+if __name__ == '__main__':
+  import sys
+  import time
+  import random
+  from musashi import emu
+  from amitools.vamos.MainMemory import MainMemory
+  from amitools.vamos.MemoryAlloc import MemoryAlloc
+  from amitools.vamos.label.LabelManager import LabelManager
 
+  raw_mem = emu.Memory(8 * 1024)
+  label_mgr = LabelManager()
+  mem = MainMemory(raw_mem, None)
+  alloc = MemoryAlloc(mem, 0, 8 * 1024 * 1024, 0x1000, label_mgr)
+  rnd = random.Random(42)
+  num = 20000
+  t = time.time()
+  pool = Pool(mem, alloc, 0, 4096, 2048, 0x1000)
+  nodes = []
+  for i in xrange(num):
+    size = rnd.choice((16, 24, 32, 64, 128, 4000) if i % 100 == 0 else (16, 24, 32, 64))
+    nodes.append((pool.AllocPooled(label_mgr, "node", size).addr, size))
+    # free some
+    if rnd.random() < 0.3:
+      addr, size = nodes.pop(rnd.randrange(len(nodes)))
+      pool.FreePooled(addr, size)
+  pool.dump_stats(lambda fmt, *args: sys.stdout.write(fmt % args + "\n"))
+  for addr, size in nodes:
+    pool.FreePooled(addr, size)
+  pool.__del__()
+  print "%d allocs: %.3fs" % (num, time.time() - t)
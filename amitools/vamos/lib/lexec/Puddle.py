@@ -3,7 +3,7 @@ from amitools.vamos.Exceptions import *
 from amitools.vamos.MemoryAlloc import *
 
 class Puddle:
-  def __init__(self, mem, alloc, label_mgr, name, size):
+  def __init__(self, mem, alloc, label_mgr, name, size, own=False):
     self.alloc     = alloc;
     self.chunks    = None
     self.label_mgr = label_mgr
@@ -11,28 +11,65 @@ class Puddle:
     self.raw_size  = size
     self.raw_mem   = self.alloc.alloc_memory(name, size)
     self.chunks    = MemoryAlloc(self.mem, self.raw_mem.addr, size, self.raw_mem.addr, label_mgr)
+    self.addr      = self.raw_mem.addr
+    self.end       = self.addr + size
+    # a puddle of its own for a large allocation
+    self.own       = own
+    self.num_allocs = 0
+    # free space hint: smallest size that did not fit since the last free
+    self.fail_size = None
 
   def __del__(self):
     if self.raw_mem != None:
-      self.label_mgr.delete_labels_within(self.raw_mem.addr,self.raw_size)
+      # only live allocations have labels
+      if self.num_allocs > 0:
+        self.label_mgr.delete_labels_within(self.raw_mem.addr,self.raw_size)
       self.chunks = None
       self.alloc.free_memory(self.raw_mem)
       self.raw_mem = None
 
+  def __str__(self):
+    return "@%06x +%06x allocs=%d free=%06x%s" % \
+      (self.addr, self.raw_size, self.num_allocs, self.chunks.free_bytes,
+       " own" if self.own else "")
+
+  def may_fit(self, size):
+    """quick check if an alloc could succeed without walking the free list"""
+    if size > self.chunks.free_bytes:
+      return False
+    return self.fail_size == None or size < self.fail_size
+
   def AllocPooled(self, name, size):
-    return self.chunks.alloc_memory(name,size,True,False)
+    mem = self.chunks.alloc_memory(name,size,True,False)
+    if mem != None:
+      self.num_allocs += 1
+    elif self.fail_size == None or size < self.fail_size:
+      self.fail_size = size
+    return mem
 
   def FreePooled(self, addr, size):
     mem = self.chunks.get_memory(addr)
     if mem != None:
       if mem.size == size:
         self.chunks.free_memory(mem)
+        self.num_allocs -= 1
+        self.fail_size = None
       else:
         raise VamosInternalError("release size %d for memory chunk %s != reserved size %s" % (size,mem,mem.size))
     else:
       raise VamosInternalError("memory at 0x%0x not recorded in puddle" % addr)
 
   def contains(self, addr, size):
-    if self.chunks.is_valid_address(addr):
-      return True
-    return False
+    return addr >= self.addr and addr < self.end
+
+  def get_free_bytes(self):
+    return self.chunks.free_bytes
+
+  def get_largest_free(self):
+    largest = 0
+    chunk = self.chunks.free_first
+    while chunk != None:
+      if chunk.size > largest:
+        largest = chunk.size
+      chunk = chunk.next
+    return largest
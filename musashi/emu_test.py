@@ -97,6 +97,43 @@ def run():
   # free trap
   traps.free(tid)
 
+  # register call stub: args from a0/d0, result in d0/d1
+  print "--- reg stub ---"
+  def my_func(ctx, a, b):
+    print "MY FUNC: ctx=%s a=%08x b=%08x" % (ctx, a, b)
+    return [a + b, -1]
+  stub = traps.create_reg_stub(my_func, "ctx", (m68k.M68K_REG_A0, m68k.M68K_REG_D0))
+  tid = traps.setup(stub, auto_rts=True)
+  cpu.w_reg(m68k.M68K_REG_A0, 0x1000)
+  cpu.w_reg(m68k.M68K_REG_D0, 0x234)
+  memory.w16(0x2000, 0xa000 + tid)
+  cpu.w_reg(m68k.M68K_REG_PC,0x2000)
+  print cpu.execute(4)
+  print "d0=%08x d1=%08x" % cpu.r_regs((m68k.M68K_REG_D0, m68k.M68K_REG_D1))
+  traps.free(tid)
+
+  # sampling profiler: sample the NOP loop every 16 cycles
+  print "--- profiler ---"
+  memory.w16(0x2000, 0x4e71) # NOP
+  memory.w16(0x2002, 0x60fc) # BRA.S 0x2000
+  cpu.w_reg(m68k.M68K_REG_PC,0x2000)
+  cpu.prof_start(16)
+  cpu.execute(1000)
+  cpu.prof_stop()
+  print "samples=%d" % cpu.prof_get_num_samples()
+  for pc, sp_ret, a5_ret, a6_ret, count in sorted(cpu.prof_get_samples()):
+    print "pc=%06x count=%d" % (pc, count)
+
+  # instruction trace: keep the last 4 instructions
+  print "--- instr trace ---"
+  cpu.w_reg(m68k.M68K_REG_PC,0x2000)
+  cpu.itrace_start(4)
+  cpu.execute(100)
+  cpu.itrace_stop()
+  print "total=%d" % cpu.itrace_get_total()
+  for pc, words, regs in cpu.itrace_get_entries():
+    print "%06x: %s" % (pc, cpu.disassemble_words(pc, words)[1])
+
   # special read
   print "special read..."
   def my_r16(addr):
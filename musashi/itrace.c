@@ -0,0 +1,182 @@
+/* a ring buffer for instruction traces of the m68k emu core
+ *
+ * the trace is installed as the instruction hook of the CPU and stores the
+ * PC and the opcode words (and optionally the registers) of every executed
+ * instruction. only the last 'depth' instructions are kept. decoding is
+ * done later on demand.
+ *
+ * recording can be started and stopped when a given PC is reached.
+ *
+ * under the GNU Public License V2
+ */
+
+#include "itrace.h"
+#include "mem.h"
+#include "m68k.h"
+#include <stdlib.h>
+
+static itrace_entry_t *entries;
+static uint *regs;
+static uint depth;
+static uint pos;
+static uint num;
+static uint total;
+
+static int recording;
+static int has_start_pc;
+static int has_stop_pc;
+static uint start_pc;
+static uint stop_pc;
+static itrace_chain_func_t chain_func;
+
+static void record(uint pc)
+{
+  itrace_entry_t *e = &entries[pos];
+  const uint8_t *ram = mem_raw_ptr();
+  int i;
+
+  e->pc = pc;
+  /* only read RAM directly: other memory might call back into python */
+  for(i=0;i<ITRACE_NUM_WORDS;i++) {
+    uint addr = pc + i * 2;
+    if((addr < pc) || !mem_is_ram_range(addr, 2)) {
+      break;
+    }
+    e->words[i] = (ram[addr] << 8) | ram[addr + 1];
+  }
+  e->num_words = i;
+  for(;i<ITRACE_NUM_WORDS;i++) {
+    e->words[i] = 0;
+  }
+  if(regs != NULL) {
+    uint *r = &regs[pos * ITRACE_NUM_REGS];
+    for(i=0;i<16;i++) {
+      r[i] = m68k_get_reg(NULL, (m68k_register_t)(M68K_REG_D0 + i));
+    }
+    r[16] = m68k_get_reg(NULL, M68K_REG_SR);
+  }
+
+  pos++;
+  if(pos == depth) {
+    pos = 0;
+  }
+  if(num < depth) {
+    num++;
+  }
+  total++;
+}
+
+void itrace_instr_hook(void)
+{
+  uint pc = m68k_get_reg(NULL, M68K_REG_PC);
+
+  if(!recording) {
+    if(has_start_pc && (pc == start_pc)) {
+      recording = 1;
+    }
+  }
+  if(recording) {
+    record(pc);
+    if(has_stop_pc && (pc == stop_pc)) {
+      recording = 0;
+    }
+  }
+
+  if(chain_func != NULL) {
+    chain_func();
+  }
+}
+
+/* ----- API ----- */
+
+int itrace_init(uint d, int with_regs)
+{
+  itrace_free();
+  if(d == 0) {
+    return 0;
+  }
+  entries = (itrace_entry_t *)malloc(d * sizeof(itrace_entry_t));
+  if(entries == NULL) {
+    return 0;
+  }
+  if(with_regs) {
+    regs = (uint *)malloc(d * ITRACE_NUM_REGS * sizeof(uint));
+    if(regs == NULL) {
+      itrace_free();
+      return 0;
+    }
+  }
+  depth = d;
+  recording = 1;
+  return 1;
+}
+
+void itrace_free(void)
+{
+  free(entries);
+  free(regs);
+  entries = NULL;
+  regs = NULL;
+  depth = 0;
+  pos = 0;
+  num = 0;
+  total = 0;
+  has_start_pc = 0;
+  has_stop_pc = 0;
+}
+
+void itrace_set_triggers(int has_start, uint start, int has_stop, uint stop)
+{
+  has_start_pc = has_start;
+  start_pc = start;
+  has_stop_pc = has_stop;
+  stop_pc = stop;
+  /* wait for start trigger */
+  recording = !has_start;
+}
+
+void itrace_set_chain_func(itrace_chain_func_t func)
+{
+  chain_func = func;
+}
+
+int itrace_is_recording(void)
+{
+  return recording;
+}
+
+uint itrace_get_num_entries(void)
+{
+  return num;
+}
+
+uint itrace_get_total(void)
+{
+  return total;
+}
+
+/* idx 0 is the oldest entry in the buffer */
+static uint slot(uint idx)
+{
+  uint s = pos + depth - num + idx;
+  if(s >= depth) {
+    s -= depth;
+  }
+  return s;
+}
+
+const itrace_entry_t *itrace_get_entry(uint idx)
+{
+  if(idx >= num) {
+    return NULL;
+  }
+  return &entries[slot(idx)];
+}
+
+const uint *itrace_get_regs(uint idx)
+{
+  if((idx >= num) || (regs == NULL)) {
+    return NULL;
+  }
+  return &regs[slot(idx) * ITRACE_NUM_REGS];
+}
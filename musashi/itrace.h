@@ -0,0 +1,44 @@
+/* a ring buffer for instruction traces of the m68k emu core
+ *
+ * under the GNU Public License V2
+ */
+
+#ifndef _ITRACE_H
+#define _ITRACE_H
+
+#include <stdint.h>
+
+/* ------ Types ----- */
+#ifndef UINT_TYPE
+#define UINT_TYPE
+typedef unsigned int uint;
+#endif
+
+typedef void (*itrace_chain_func_t)(void);
+
+/* longest 68020 instruction has 11 words but most fit into 5 */
+#define ITRACE_NUM_WORDS    5
+/* d0-d7, a0-a7, sr */
+#define ITRACE_NUM_REGS     17
+
+struct itrace_entry {
+  uint     pc;
+  uint16_t words[ITRACE_NUM_WORDS];
+  uint16_t num_words; /* words readable from RAM, 0 = unreadable pc */
+};
+typedef struct itrace_entry itrace_entry_t;
+
+/* ----- API ----- */
+extern int  itrace_init(uint depth, int with_regs);
+extern void itrace_free(void);
+extern void itrace_set_triggers(int has_start, uint start_pc, int has_stop, uint stop_pc);
+extern void itrace_set_chain_func(itrace_chain_func_t func);
+extern void itrace_instr_hook(void);
+
+extern int  itrace_is_recording(void);
+extern uint itrace_get_num_entries(void);
+extern uint itrace_get_total(void);
+extern const itrace_entry_t *itrace_get_entry(uint idx);
+extern const uint *itrace_get_regs(uint idx);
+
+#endif
@@ -59,3 +59,11 @@ M68K_ALINE_RTS    = 2
 TRAP_DEFAULT  = 0
 TRAP_ONE_SHOT = 1
 TRAP_AUTO_RTS = 2
+
+# memory watch range flags
+MEM_WATCH_READ = 0x01
+MEM_WATCH_WRITE = 0x02
+MEM_WATCH_BYTE = 0x04
+MEM_WATCH_WORD = 0x08
+MEM_WATCH_LONG = 0x10
+MEM_WATCH_COUNT_ONLY = 0x20
@@ -737,7 +737,8 @@ void m68k_modify_timeslice(int cycles)
 
 void m68k_end_timeslice(void)
 {
-	m68ki_initial_cycles = GET_CYCLES();
+	/* CV: keep the cycles used so far for the return value of m68k_execute */
+	m68ki_initial_cycles -= GET_CYCLES();
 	SET_CYCLES(0);
 }
 
@@ -8,17 +8,29 @@
 #include <stdio.h>
 #include <string.h>
 
+#ifndef _WIN32
+#include <sys/mman.h>
+#endif
+
 #include "mem.h"
 
 /* THOR: I need a *little* more memory than 16MB.
-** This gives 256MB max.
+** This gives 1GB max. The RAM is only committed by the host when touched.
 */
-#define NUM_PAGES   4096
+#define NUM_PAGES   MEM_NUM_PAGES
 
 /* ----- Data ----- */
 static uint8_t *ram_data;
 static uint     ram_size;
 static uint     ram_pages;
+static int      ram_mapped;
+
+/* per page state, e.g. MEM_PAGE_TOUCHED */
+static uint8_t  page_flags[NUM_PAGES];
+
+/* checkpoint: original contents of pages written since the checkpoint */
+static int      ckpt_active;
+static uint8_t *ckpt_pages[NUM_PAGES];
 
 static read_func_t    r_func[NUM_PAGES][3];
 static write_func_t   w_func[NUM_PAGES][3];
@@ -33,6 +45,11 @@ static void *trace_ctx;
 static int is_end = 0;
 static uint special_page = NUM_PAGES;
 
+/* watch ranges gate the trace func */
+static mem_watch_t watches[MEM_MAX_WATCHES];
+static int num_watches = 0;
+static uint8_t watch_pages[NUM_PAGES];
+
 /* ----- RAW Access ----- */
 extern uint8_t *mem_raw_ptr(void)
 {
@@ -44,6 +61,63 @@ extern uint mem_raw_size(void)
   return ram_size;
 }
 
+uint mem_get_num_pages(void)
+{
+  return ram_pages;
+}
+
+uint mem_get_num_touched_pages(void)
+{
+  uint i;
+  uint num = 0;
+  for(i=0;i<ram_pages;i++) {
+    if(page_flags[i] & MEM_PAGE_TOUCHED) {
+      num++;
+    }
+  }
+  return num;
+}
+
+const uint8_t *mem_get_page_flags(void)
+{
+  return page_flags;
+}
+
+/* ----- RAM allocation ----- */
+static uint8_t *alloc_ram(uint size)
+{
+#ifndef _WIN32
+  /* anonymous pages are zero and only committed on first touch */
+  int flags = MAP_PRIVATE | MAP_ANON;
+#ifdef MAP_NORESERVE
+  flags |= MAP_NORESERVE;
+#endif
+  void *ptr = mmap(NULL, size, PROT_READ | PROT_WRITE, flags, -1, 0);
+  if(ptr != MAP_FAILED) {
+    ram_mapped = 1;
+    return (uint8_t *)ptr;
+  }
+#endif
+  ram_mapped = 0;
+  return (uint8_t *)calloc(size, 1);
+}
+
+static void free_ram(void)
+{
+  if(ram_data == NULL) {
+    return;
+  }
+#ifndef _WIN32
+  if(ram_mapped) {
+    munmap(ram_data, ram_size);
+    ram_data = NULL;
+    return;
+  }
+#endif
+  free(ram_data);
+  ram_data = NULL;
+}
+
 /* ----- Default Funcs ----- */
 static void default_invalid(int mode, int width, uint addr, void *ctx)
 {
@@ -85,6 +159,16 @@ void mem_set_all_to_end(void)
     w_func[i][2] = wx_end;
   }
   is_end = 1;
+  /* leave the run loop as soon as possible */
+  m68k_end_timeslice();
+}
+
+/* report an invalid access of native code that does not use the
+   memory interface */
+void mem_report_invalid(int mode, int width, uint addr)
+{
+  invalid_func(mode, width, addr, invalid_ctx);
+  mem_set_all_to_end();
 }
 
 static uint r8_fail(uint addr, void *ctx)
@@ -144,23 +228,222 @@ static uint mem_r32_ram(uint addr, void *ctx)
 
 static void mem_w8_ram(uint addr, uint val, void *ctx)
 {
+  page_flags[addr >> 16] |= MEM_PAGE_TOUCHED;
   ram_data[addr] = val;
 }
 
 static void mem_w16_ram(uint addr, uint val, void *ctx)
 {
+  /* odd accesses of a 68020 may cross a page */
+  if((addr & 0xffff) == 0xffff) {
+    mem_touch(addr, 2);
+  } else {
+    page_flags[addr >> 16] |= MEM_PAGE_TOUCHED;
+  }
   ram_data[addr] = val >> 8;
   ram_data[addr+1] = val & 0xff;
 }
 
 static void mem_w32_ram(uint addr, uint val, void *ctx)
 {
+  if((addr & 0xffff) > 0xfffc) {
+    mem_touch(addr, 4);
+  } else {
+    page_flags[addr >> 16] |= MEM_PAGE_TOUCHED;
+  }
   ram_data[addr]   = val >> 24;
   ram_data[addr+1] = (val >> 16) & 0xff;
   ram_data[addr+2] = (val >> 8) & 0xff;
   ram_data[addr+3] = val & 0xff;
 }
 
+/* ----- Checkpoint ----- */
+
+/* the first write to a page after a checkpoint saves the page and marks it
+   dirty. then the page gets the regular RAM write functions again. */
+static void mem_w8_ram_ckpt(uint addr, uint val, void *ctx);
+static void mem_w16_ram_ckpt(uint addr, uint val, void *ctx);
+static void mem_w32_ram_ckpt(uint addr, uint val, void *ctx);
+
+static void set_ram_write_funcs(uint page, int ckpt)
+{
+  if(ckpt) {
+    w_func[page][0] = mem_w8_ram_ckpt;
+    w_func[page][1] = mem_w16_ram_ckpt;
+    w_func[page][2] = mem_w32_ram_ckpt;
+  } else {
+    w_func[page][0] = mem_w8_ram;
+    w_func[page][1] = mem_w16_ram;
+    w_func[page][2] = mem_w32_ram;
+  }
+}
+
+static void save_page(uint page)
+{
+  uint8_t *buf = ckpt_pages[page];
+  if(!(page_flags[page] & MEM_PAGE_SAVED)) {
+    if(buf == NULL) {
+      buf = (uint8_t *)malloc(MEM_PAGE_SIZE);
+      if(buf == NULL) {
+        /* can't restore this page later */
+        fprintf(stderr, "mem: no memory to save page %04x for checkpoint!\n", page);
+        return;
+      }
+      ckpt_pages[page] = buf;
+    }
+    memcpy(buf, ram_data + (page << 16), MEM_PAGE_SIZE);
+    page_flags[page] |= MEM_PAGE_SAVED;
+  }
+  page_flags[page] |= MEM_PAGE_DIRTY;
+  set_ram_write_funcs(page, 0);
+}
+
+void mem_touch(uint addr, uint size)
+{
+  uint page;
+  if(size == 0) {
+    return;
+  }
+  for(page = addr >> 16; page <= ((addr + size - 1) >> 16); page++) {
+    page_flags[page] |= MEM_PAGE_TOUCHED;
+    if(ckpt_active && !(page_flags[page] & MEM_PAGE_DIRTY) && (page < ram_pages)) {
+      save_page(page);
+    }
+  }
+}
+
+static void mem_w8_ram_ckpt(uint addr, uint val, void *ctx)
+{
+  save_page(addr >> 16);
+  mem_w8_ram(addr, val, ctx);
+}
+
+static void mem_w16_ram_ckpt(uint addr, uint val, void *ctx)
+{
+  save_page(addr >> 16);
+  mem_w16_ram(addr, val, ctx);
+}
+
+static void mem_w32_ram_ckpt(uint addr, uint val, void *ctx)
+{
+  save_page(addr >> 16);
+  mem_w32_ram(addr, val, ctx);
+}
+
+void mem_checkpoint(void)
+{
+  uint i;
+  mem_end_checkpoint();
+  for(i=0;i<ram_pages;i++) {
+    set_ram_write_funcs(i, 1);
+  }
+  ckpt_active = 1;
+}
+
+uint mem_restore_checkpoint(void)
+{
+  uint i;
+  uint num = 0;
+  if(!ckpt_active) {
+    return 0;
+  }
+  for(i=0;i<ram_pages;i++) {
+    if(page_flags[i] & MEM_PAGE_DIRTY) {
+      if(page_flags[i] & MEM_PAGE_SAVED) {
+        memcpy(ram_data + (i << 16), ckpt_pages[i], MEM_PAGE_SIZE);
+      }
+      /* the saved page stays valid for the next write */
+      page_flags[i] &= ~MEM_PAGE_DIRTY;
+      set_ram_write_funcs(i, 1);
+      num++;
+    }
+  }
+  return num;
+}
+
+void mem_end_checkpoint(void)
+{
+  uint i;
+  for(i=0;i<NUM_PAGES;i++) {
+    if(ckpt_pages[i] != NULL) {
+      free(ckpt_pages[i]);
+      ckpt_pages[i] = NULL;
+    }
+    page_flags[i] &= ~(MEM_PAGE_DIRTY | MEM_PAGE_SAVED);
+  }
+  if(ckpt_active) {
+    for(i=0;i<ram_pages;i++) {
+      set_ram_write_funcs(i, 0);
+    }
+  }
+  ckpt_active = 0;
+}
+
+uint mem_get_num_dirty_pages(void)
+{
+  uint i;
+  uint num = 0;
+  for(i=0;i<ram_pages;i++) {
+    if(page_flags[i] & MEM_PAGE_DIRTY) {
+      num++;
+    }
+  }
+  return num;
+}
+
+/* ----- Watch Ranges ----- */
+static void update_watch_pages(void)
+{
+  int i;
+  uint page;
+  memset(watch_pages, 0, sizeof(watch_pages));
+  num_watches = 0;
+  for(i=0;i<MEM_MAX_WATCHES;i++) {
+    mem_watch_t *w = &watches[i];
+    if(w->flags != 0) {
+      /* an access may start up to 3 bytes before the range */
+      uint begin = (w->begin > 3) ? w->begin - 3 : 0;
+      for(page = begin >> 16; (page <= ((w->end - 1) >> 16)) && (page < NUM_PAGES); page++) {
+        watch_pages[page] = 1;
+      }
+      num_watches = i + 1;
+    }
+  }
+}
+
+static int trace_access(int mode, int width, uint addr, uint val)
+{
+  int i;
+  int do_trace;
+  int mask;
+  uint end;
+
+  /* no watch ranges: trace everything */
+  if(num_watches == 0) {
+    return trace_func(mode, width, addr, val, trace_ctx);
+  }
+  if(!watch_pages[addr >> 16]) {
+    return 0;
+  }
+
+  mask = ((mode == 'R') ? MEM_WATCH_READ : MEM_WATCH_WRITE) | (MEM_WATCH_BYTE << width);
+  end = addr + (1 << width);
+  do_trace = 0;
+  for(i=0;i<num_watches;i++) {
+    mem_watch_t *w = &watches[i];
+    if(((w->flags & mask) == mask) && (addr < w->end) && (end > w->begin)) {
+      w->hits++;
+      if(!(w->flags & MEM_WATCH_COUNT_ONLY)) {
+        do_trace = 1;
+      }
+    }
+  }
+  if(do_trace) {
+    return trace_func(mode, width, addr, val, trace_ctx);
+  }
+  return 0;
+}
+
 /* ----- Musashi Interface ----- */
 
 #include "m68kcpu.h"
@@ -211,8 +494,8 @@ unsigned int  m68k_read_memory_8(unsigned int address)
   if (page < NUM_PAGES) {
     uint val = r_func[page][0](address, r_ctx[page][0]);
     if(mem_trace) {
-      if(trace_func('R',0,address,val,trace_ctx)) {
-	mem_set_all_to_end();
+      if(trace_access('R',0,address,val)) {
+        mem_set_all_to_end();
       }
     }
     return val;
@@ -232,8 +515,8 @@ unsigned int  m68k_read_memory_16(unsigned int address)
   if (page < NUM_PAGES) {
     uint val = r_func[page][1](address, r_ctx[page][1]);
     if(mem_trace) {
-      if(trace_func('R',1,address,val,trace_ctx)) {
-      mem_set_all_to_end();
+      if(trace_access('R',1,address,val)) {
+        mem_set_all_to_end();
       }
     }
     return val;
@@ -253,8 +536,8 @@ unsigned int  m68k_read_memory_32(unsigned int address)
   if (page < NUM_PAGES) {
     uint val = r_func[page][2](address, r_ctx[page][2]);
     if(mem_trace) {
-      if(trace_func('R',2,address,val,trace_ctx)) {
-	mem_set_all_to_end();
+      if(trace_access('R',2,address,val)) {
+        mem_set_all_to_end();
       }
     }
     return val;
@@ -274,8 +557,8 @@ void m68k_write_memory_8(unsigned int address, unsigned int value)
   if (page < NUM_PAGES) {
     w_func[page][0](address, value, w_ctx[page][0]);
     if(mem_trace) {
-      if(trace_func('W',0,address,value,trace_ctx)) {
-	mem_set_all_to_end();
+      if(trace_access('W',0,address,value)) {
+        mem_set_all_to_end();
       }
     }
   } else {
@@ -292,8 +575,8 @@ void m68k_write_memory_16(unsigned int address, unsigned int value)
   if (page < NUM_PAGES) {
     w_func[page][1](address, value, w_ctx[page][1]);
     if(mem_trace) {
-      if(trace_func('W',1,address,value,trace_ctx)) {
-	mem_set_all_to_end();
+      if(trace_access('W',1,address,value)) {
+        mem_set_all_to_end();
       }
     }
   } else {
@@ -310,8 +593,8 @@ void m68k_write_memory_32(unsigned int address, unsigned int value)
   if (page < NUM_PAGES) {
     w_func[page][2](address, value, w_ctx[page][2]);
     if(mem_trace) {
-      if(trace_func('W',2,address,value,trace_ctx)) {
-	mem_set_all_to_end();
+      if(trace_access('W',2,address,value)) {
+        mem_set_all_to_end();
       }
     }
   } else {
@@ -324,10 +607,31 @@ void m68k_write_memory_32(unsigned int address, unsigned int value)
 
 /* Disassemble support */
 
+/* optional buffer with the opcode words to disassemble (e.g. from a trace) */
+static uint dasm_pc;
+static const uint16_t *dasm_words;
+static uint dasm_num_words;
+
+void mem_set_disasm_words(uint pc, const uint16_t *words, uint num_words)
+{
+  dasm_pc = pc;
+  dasm_words = words;
+  dasm_num_words = num_words;
+}
+
+static int dasm_in_words(uint address, uint size)
+{
+  return (dasm_words != NULL) && (address >= dasm_pc) &&
+         ((address + size - dasm_pc) <= (dasm_num_words * 2));
+}
+
 unsigned int m68k_read_disassembler_16 (unsigned int address)
 {
   uint page = address >> 16;
-  
+
+  if (dasm_in_words(address, 2)) {
+    return dasm_words[(address - dasm_pc) >> 1];
+  }
   if (page < NUM_PAGES) {
     uint val = r_func[page][1](address, r_ctx[page][1]);
     return val;
@@ -339,6 +643,10 @@ unsigned int m68k_read_disassembler_16 (unsigned int address)
 unsigned int m68k_read_disassembler_32 (unsigned int address)
 {
   uint page = address >> 16;
+  if (dasm_in_words(address, 4)) {
+    uint off = (address - dasm_pc) >> 1;
+    return (dasm_words[off] << 16) | dasm_words[off + 1];
+  }
   if (page < NUM_PAGES) {
     uint val = r_func[page][2](address, r_ctx[page][1]);
     return val;
@@ -349,13 +657,9 @@ unsigned int m68k_read_disassembler_32 (unsigned int address)
 
 /* ----- API ----- */
 
-int mem_init(uint ram_size_kib)
+static void init_page_funcs(void)
 {
   int i;
-  ram_size = ram_size_kib * 1024;
-  ram_pages = ram_size_kib / 64;
-  ram_data = (uint8_t *)malloc(ram_size);
-
   for(i=0;i<NUM_PAGES;i++) {
     if(i < ram_pages) {
       r_func[i][0] = mem_r8_ram;
@@ -372,18 +676,72 @@ int mem_init(uint ram_size_kib)
       w_func[i][1] = w16_fail;
       w_func[i][2] = w32_fail;
     }
+    r_ctx[i][0] = r_ctx[i][1] = r_ctx[i][2] = NULL;
+    w_ctx[i][0] = w_ctx[i][1] = w_ctx[i][2] = NULL;
   }
 
   trace_func = default_trace;
+  trace_ctx = NULL;
   invalid_func = default_invalid;
+  invalid_ctx = NULL;
+}
+
+int mem_init(uint ram_size_kib)
+{
+  /* keep at least one page for special ranges */
+  if(ram_size_kib >= ((NUM_PAGES - 1) * 64)) {
+    return 0;
+  }
+  ram_size = ram_size_kib * 1024;
+  ram_pages = ram_size_kib / 64;
+  ram_data = alloc_ram(ram_size);
+  memset(page_flags, 0, sizeof(page_flags));
+  init_page_funcs();
+
+  /* a previous memory may have left special ranges and watches */
+  special_page = NUM_PAGES;
+  memset(watches, 0, sizeof(watches));
+  update_watch_pages();
+  mem_trace = 0;
+  is_end = 0;
 
   return (ram_data != NULL);
 }
 
+/* bring the memory back to the state after mem_init() without
+   allocating the RAM again: zero RAM, drop special ranges and watches */
+void mem_reset(void)
+{
+  uint i;
+  mem_end_checkpoint();
+  if(ram_data != NULL) {
+#if !defined(_WIN32) && defined(MADV_DONTNEED)
+    /* private anonymous pages read as zero again after being dropped */
+    if(!ram_mapped || (madvise(ram_data, ram_size, MADV_DONTNEED) != 0))
+#endif
+    {
+      for(i=0;i<ram_pages;i++) {
+        if(page_flags[i] & MEM_PAGE_TOUCHED) {
+          memset(ram_data + (i << 16), 0, MEM_PAGE_SIZE);
+        }
+      }
+    }
+  }
+  memset(page_flags, 0, sizeof(page_flags));
+  init_page_funcs();
+
+  special_page = NUM_PAGES;
+  memset(watches, 0, sizeof(watches));
+  update_watch_pages();
+  mem_trace = 0;
+  is_end = 0;
+  mem_set_disasm_words(0, NULL, 0);
+}
+
 void mem_free(void)
 {
-  free(ram_data);
-  ram_data = NULL;
+  mem_end_checkpoint();
+  free_ram();
 }
 
 void mem_set_invalid_func(invalid_func_t func, void *ctx)
@@ -403,6 +761,49 @@ void mem_set_trace_func(trace_func_t func, void *ctx)
   trace_ctx = ctx;
 }
 
+int mem_add_watch(uint begin, uint end, int flags)
+{
+  int i;
+  if(end <= begin) {
+    return -1;
+  }
+  /* no mode or width given means all */
+  if((flags & (MEM_WATCH_READ | MEM_WATCH_WRITE)) == 0) {
+    flags |= MEM_WATCH_READ | MEM_WATCH_WRITE;
+  }
+  if((flags & (MEM_WATCH_BYTE | MEM_WATCH_WORD | MEM_WATCH_LONG)) == 0) {
+    flags |= MEM_WATCH_BYTE | MEM_WATCH_WORD | MEM_WATCH_LONG;
+  }
+  for(i=0;i<MEM_MAX_WATCHES;i++) {
+    mem_watch_t *w = &watches[i];
+    if(w->flags == 0) {
+      w->begin = begin;
+      w->end = end;
+      w->flags = flags;
+      w->hits = 0;
+      update_watch_pages();
+      return i;
+    }
+  }
+  return -1;
+}
+
+void mem_remove_watch(int idx)
+{
+  if((idx >= 0) && (idx < MEM_MAX_WATCHES)) {
+    watches[idx].flags = 0;
+    update_watch_pages();
+  }
+}
+
+const mem_watch_t *mem_get_watch(int idx)
+{
+  if((idx < 0) || (idx >= MEM_MAX_WATCHES) || (watches[idx].flags == 0)) {
+    return NULL;
+  }
+  return &watches[idx];
+}
+
 int mem_is_end(void)
 {
   return is_end;
@@ -22,9 +22,39 @@ typedef void (*write_func_t)(uint addr, uint value, void *ctx);
 typedef void (*invalid_func_t)(int mode, int width, uint addr, void *ctx);
 typedef int (*trace_func_t)(int mode, int width, uint addr, uint val, void *ctx);
 
+/* number of 64 KiB pages in address space */
+#define MEM_NUM_PAGES         16384
+
+#define MEM_PAGE_SIZE         0x10000
+
+/* page flags */
+#define MEM_PAGE_TOUCHED      0x01  /* written since init */
+#define MEM_PAGE_DIRTY        0x02  /* written since checkpoint */
+#define MEM_PAGE_SAVED        0x04  /* contents at checkpoint are saved */
+
+/* watch ranges for tracing */
+#define MEM_MAX_WATCHES       16
+
+#define MEM_WATCH_READ        0x01
+#define MEM_WATCH_WRITE       0x02
+#define MEM_WATCH_BYTE        0x04
+#define MEM_WATCH_WORD        0x08
+#define MEM_WATCH_LONG        0x10
+#define MEM_WATCH_ALL         0x1f
+#define MEM_WATCH_COUNT_ONLY  0x20
+
+struct mem_watch {
+  uint begin;
+  uint end;
+  int  flags;
+  uint hits;
+};
+typedef struct mem_watch mem_watch_t;
+
 /* ----- API ----- */
 extern int  mem_init(uint ram_size_kib);
 extern void mem_free(void);
+extern void mem_reset(void);
 
 extern void mem_set_invalid_func(invalid_func_t func, void *ctx);
 extern void mem_set_all_to_end(void);
@@ -33,12 +63,36 @@ extern int  mem_is_end(void);
 extern void mem_set_trace_mode(int on);
 extern void mem_set_trace_func(trace_func_t func, void *ctx);
 
+extern int  mem_add_watch(uint begin, uint end, int flags);
+extern void mem_remove_watch(int idx);
+extern const mem_watch_t *mem_get_watch(int idx);
+
 extern uint mem_reserve_special_range(uint num_pages);
 extern void mem_set_special_range_read_func(uint page_addr, uint width, read_func_t func, void *ctx);
 extern void mem_set_special_range_write_func(uint page_addr, uint width, write_func_t func, void *ctx);
 
 extern uint8_t *mem_raw_ptr(void);
 extern uint mem_raw_size(void);
+extern void mem_report_invalid(int mode, int width, uint addr);
+
+/* is [addr, addr+size) completely in RAM? safe for addresses near 4 GiB */
+static inline int mem_is_ram_range(uint addr, uint size)
+{
+  uint ram_size = mem_raw_size();
+  return (size <= ram_size) && (addr <= (ram_size - size));
+}
+
+extern void mem_touch(uint addr, uint size);
+extern uint mem_get_num_pages(void);
+extern uint mem_get_num_touched_pages(void);
+extern const uint8_t *mem_get_page_flags(void);
+
+extern void mem_checkpoint(void);
+extern uint mem_restore_checkpoint(void);
+extern void mem_end_checkpoint(void);
+extern uint mem_get_num_dirty_pages(void);
+
+extern void mem_set_disasm_words(uint pc, const uint16_t *words, uint num_words);
 
 extern unsigned int m68k_read_memory_8(unsigned int address);
 extern unsigned int m68k_read_memory_16(unsigned int address);
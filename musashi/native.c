@@ -0,0 +1,460 @@
+/* native C implementations of library functions used as traps in vamos
+ *
+ * the functions work directly on RAM if possible and fall back to the
+ * regular memory interface for all other addresses.
+ *
+ * under the GNU Public License V2
+ */
+
+#include "native.h"
+#include "mem.h"
+#include "m68k.h"
+#include <string.h>
+#include <math.h>
+
+struct native_entry {
+  const char *lib_name;
+  const char *func_name;
+  trap_func_t func;
+};
+typedef struct native_entry native_entry_t;
+
+/* ----- big endian helpers ----- */
+
+static uint r32(uint addr)
+{
+  uint8_t *ram = mem_raw_ptr();
+  if(mem_is_ram_range(addr, 4)) {
+    ram += addr;
+    return (ram[0] << 24) | (ram[1] << 16) | (ram[2] << 8) | ram[3];
+  } else if((addr >> 16) >= MEM_NUM_PAGES) {
+    /* a wild pointer beyond the address space */
+    mem_report_invalid('R', 2, addr);
+    return 0;
+  } else {
+    return m68k_read_memory_32(addr);
+  }
+}
+
+static void w32(uint addr, uint val)
+{
+  uint8_t *ram = mem_raw_ptr();
+  if(mem_is_ram_range(addr, 4)) {
+    mem_touch(addr, 4);
+    ram += addr;
+    ram[0] = val >> 24;
+    ram[1] = (val >> 16) & 0xff;
+    ram[2] = (val >> 8) & 0xff;
+    ram[3] = val & 0xff;
+  } else if((addr >> 16) >= MEM_NUM_PAGES) {
+    mem_report_invalid('W', 2, addr);
+  } else {
+    m68k_write_memory_32(addr, val);
+  }
+}
+
+#define REG(x) m68k_get_reg(NULL, x)
+
+/* ----- exec.library ----- */
+
+/* offsets in Node and List */
+#define LN_SUCC       0
+#define LN_PRED       4
+#define LH_HEAD       0
+#define LH_TAIL       4
+#define LH_TAILPRED   8
+
+static void exec_AddHead(uint opcode, uint pc, void *data)
+{
+  uint list = REG(M68K_REG_A0);
+  uint node = REG(M68K_REG_A1);
+  uint head = r32(list + LH_HEAD);
+  w32(node + LN_SUCC, head);
+  w32(node + LN_PRED, list + LH_HEAD);
+  w32(head + LN_PRED, node);
+  w32(list + LH_HEAD, node);
+}
+
+static void exec_AddTail(uint opcode, uint pc, void *data)
+{
+  uint list = REG(M68K_REG_A0);
+  uint node = REG(M68K_REG_A1);
+  uint tail_pred = r32(list + LH_TAILPRED);
+  w32(node + LN_SUCC, list + LH_TAIL);
+  w32(node + LN_PRED, tail_pred);
+  w32(tail_pred + LN_SUCC, node);
+  w32(list + LH_TAILPRED, node);
+}
+
+static void unlink_node(uint node)
+{
+  uint succ = r32(node + LN_SUCC);
+  uint pred = r32(node + LN_PRED);
+  w32(pred + LN_SUCC, succ);
+  w32(succ + LN_PRED, pred);
+}
+
+static void exec_Remove(uint opcode, uint pc, void *data)
+{
+  uint node = REG(M68K_REG_A1);
+  unlink_node(node);
+  m68k_set_reg(M68K_REG_D0, node);
+}
+
+static void exec_RemHead(uint opcode, uint pc, void *data)
+{
+  uint list = REG(M68K_REG_A0);
+  uint node = r32(list + LH_HEAD);
+  if(r32(node + LN_SUCC) == 0) {
+    node = 0;
+  } else {
+    unlink_node(node);
+  }
+  m68k_set_reg(M68K_REG_D0, node);
+}
+
+static void exec_RemTail(uint opcode, uint pc, void *data)
+{
+  uint list = REG(M68K_REG_A0);
+  uint node = r32(list + LH_TAILPRED);
+  if(r32(node + LN_PRED) == 0) {
+    node = 0;
+  } else {
+    unlink_node(node);
+  }
+  m68k_set_reg(M68K_REG_D0, node);
+}
+
+static void exec_CopyMem(uint opcode, uint pc, void *data)
+{
+  uint src = REG(M68K_REG_A0);
+  uint dst = REG(M68K_REG_A1);
+  uint len = REG(M68K_REG_D0);
+  uint size = mem_raw_size();
+  if(!mem_is_ram_range(src, len)) {
+    /* report the first source byte outside of RAM */
+    mem_report_invalid('R', 0, (src < size) ? size : src);
+  } else if(!mem_is_ram_range(dst, len)) {
+    mem_report_invalid('W', 0, (dst < size) ? size : dst);
+  } else {
+    uint8_t *ram = mem_raw_ptr();
+    mem_touch(dst, len);
+    memmove(ram + dst, ram + src, len);
+  }
+}
+
+/* ----- math helpers ----- */
+
+#define SR_CC_MASK    0x0f
+#define SR_N          0x08
+#define SR_Z          0x04
+
+static int cmp_double(double a, double b)
+{
+  if(a > b) {
+    return 1;
+  } else if(a < b) {
+    return -1;
+  } else {
+    return 0;
+  }
+}
+
+/* set N and Z flags for a -1, 0, +1 result */
+static void set_cc(int res)
+{
+  uint sr = REG(M68K_REG_SR) & ~SR_CC_MASK;
+  if(res < 0) {
+    sr |= SR_N;
+  } else if(res == 0) {
+    sr |= SR_Z;
+  }
+  m68k_set_reg(M68K_REG_SR, sr);
+}
+
+/* truncate towards zero and saturate to a signed 32 bit value */
+static uint double_to_int32(double d)
+{
+  if(isnan(d)) {
+    return 0;
+  }
+  if(d >= 2147483647.0) {
+    return 0x7fffffff;
+  }
+  if(d <= -2147483648.0) {
+    return 0x80000000;
+  }
+  return (uint)(int)d;
+}
+
+static double int32_to_double(uint v)
+{
+  return (double)(int)v;
+}
+
+/* ----- mathffp.library ----- */
+
+#define FFP_MAX   0xffffff7f
+#define FFP_SIGN  0x80
+
+static double ffp_to_double(uint v)
+{
+  uint m = v >> 8;
+  double d;
+  if(m == 0) {
+    return 0.0;
+  }
+  d = ldexp((double)m, (int)(v & 0x7f) - 64 - 24);
+  return (v & FFP_SIGN) ? -d : d;
+}
+
+/* round mantissa to nearest, saturate overflows and flush underflows */
+static uint double_to_ffp(double d)
+{
+  uint sign = 0;
+  uint mant;
+  int e;
+  double m;
+  if((d == 0.0) || isnan(d)) {
+    return 0;
+  }
+  if(d < 0.0) {
+    sign = FFP_SIGN;
+    d = -d;
+  }
+  if(isinf(d)) {
+    return FFP_MAX | sign;
+  }
+  m = frexp(d, &e);
+  mant = (uint)floor(ldexp(m, 24) + 0.5);
+  if(mant >= 0x1000000) {
+    mant >>= 1;
+    e++;
+  }
+  e += 64;
+  if(e > 127) {
+    return FFP_MAX | sign;
+  }
+  if(e < 0) {
+    return 0;
+  }
+  return (mant << 8) | sign | (uint)e;
+}
+
+/* binary ops get d1, d0 and sub/div calculate d0 - d1 and d0 / d1 */
+#define FFP_ARG   ffp_to_double(REG(M68K_REG_D0))
+#define FFP_LEFT  ffp_to_double(REG(M68K_REG_D1))
+#define FFP_RIGHT ffp_to_double(REG(M68K_REG_D0))
+#define SET_D0(v) m68k_set_reg(M68K_REG_D0, v)
+
+static void ffp_SPFix(uint opcode, uint pc, void *data)
+{
+  SET_D0(double_to_int32(FFP_ARG));
+}
+
+static void ffp_SPFlt(uint opcode, uint pc, void *data)
+{
+  SET_D0(double_to_ffp(int32_to_double(REG(M68K_REG_D0))));
+}
+
+static void ffp_SPCmp(uint opcode, uint pc, void *data)
+{
+  int res = cmp_double(FFP_LEFT, FFP_RIGHT);
+  set_cc(res);
+  SET_D0((uint)res);
+}
+
+static void ffp_SPTst(uint opcode, uint pc, void *data)
+{
+  int res = cmp_double(ffp_to_double(REG(M68K_REG_D1)), 0.0);
+  set_cc(res);
+  SET_D0((uint)res);
+}
+
+static void ffp_SPAbs(uint opcode, uint pc, void *data)
+{
+  SET_D0(REG(M68K_REG_D0) & ~FFP_SIGN);
+}
+
+static void ffp_SPNeg(uint opcode, uint pc, void *data)
+{
+  uint v = REG(M68K_REG_D0);
+  if((v >> 8) == 0) {
+    SET_D0(0);
+  } else {
+    SET_D0(v ^ FFP_SIGN);
+  }
+}
+
+static void ffp_SPAdd(uint opcode, uint pc, void *data)
+{
+  SET_D0(double_to_ffp(FFP_LEFT + FFP_RIGHT));
+}
+
+static void ffp_SPSub(uint opcode, uint pc, void *data)
+{
+  SET_D0(double_to_ffp(FFP_RIGHT - FFP_LEFT));
+}
+
+static void ffp_SPMul(uint opcode, uint pc, void *data)
+{
+  SET_D0(double_to_ffp(FFP_LEFT * FFP_RIGHT));
+}
+
+static void ffp_SPDiv(uint opcode, uint pc, void *data)
+{
+  double l = FFP_LEFT;
+  double r = FFP_RIGHT;
+  if(l == 0.0) {
+    SET_D0((r < 0.0) ? (FFP_MAX | FFP_SIGN) : FFP_MAX);
+  } else {
+    SET_D0(double_to_ffp(r / l));
+  }
+}
+
+static void ffp_SPFloor(uint opcode, uint pc, void *data)
+{
+  SET_D0(double_to_ffp(floor(FFP_ARG)));
+}
+
+static void ffp_SPCeil(uint opcode, uint pc, void *data)
+{
+  SET_D0(double_to_ffp(ceil(FFP_ARG)));
+}
+
+/* ----- mathieeedoubbas.library ----- */
+
+#define DP_SIGN   0x80000000
+
+/* doubles are passed in register pairs: d0/d1 and d2/d3 (hi/lo) */
+static double regs_to_double(m68k_register_t hi, m68k_register_t lo)
+{
+  union { double d; uint64_t u; } v;
+  v.u = ((uint64_t)REG(hi) << 32) | (uint64_t)REG(lo);
+  return v.d;
+}
+
+static void double_to_regs(double d)
+{
+  union { double d; uint64_t u; } v;
+  v.d = d;
+  m68k_set_reg(M68K_REG_D0, (uint)(v.u >> 32));
+  m68k_set_reg(M68K_REG_D1, (uint)(v.u & 0xffffffff));
+}
+
+#define DP_ARG    regs_to_double(M68K_REG_D0, M68K_REG_D1)
+#define DP_LEFT   regs_to_double(M68K_REG_D0, M68K_REG_D1)
+#define DP_RIGHT  regs_to_double(M68K_REG_D2, M68K_REG_D3)
+
+static void dp_IEEEDPFix(uint opcode, uint pc, void *data)
+{
+  SET_D0(double_to_int32(DP_ARG));
+}
+
+static void dp_IEEEDPFlt(uint opcode, uint pc, void *data)
+{
+  double_to_regs(int32_to_double(REG(M68K_REG_D0)));
+}
+
+static void dp_IEEEDPCmp(uint opcode, uint pc, void *data)
+{
+  int res = cmp_double(DP_LEFT, DP_RIGHT);
+  set_cc(res);
+  SET_D0((uint)res);
+}
+
+static void dp_IEEEDPTst(uint opcode, uint pc, void *data)
+{
+  int res = cmp_double(DP_ARG, 0.0);
+  set_cc(res);
+  SET_D0((uint)res);
+}
+
+static void dp_IEEEDPAbs(uint opcode, uint pc, void *data)
+{
+  SET_D0(REG(M68K_REG_D0) & ~DP_SIGN);
+}
+
+static void dp_IEEEDPNeg(uint opcode, uint pc, void *data)
+{
+  SET_D0(REG(M68K_REG_D0) ^ DP_SIGN);
+}
+
+static void dp_IEEEDPAdd(uint opcode, uint pc, void *data)
+{
+  double_to_regs(DP_LEFT + DP_RIGHT);
+}
+
+static void dp_IEEEDPSub(uint opcode, uint pc, void *data)
+{
+  double_to_regs(DP_LEFT - DP_RIGHT);
+}
+
+static void dp_IEEEDPMul(uint opcode, uint pc, void *data)
+{
+  double_to_regs(DP_LEFT * DP_RIGHT);
+}
+
+static void dp_IEEEDPDiv(uint opcode, uint pc, void *data)
+{
+  double_to_regs(DP_LEFT / DP_RIGHT);
+}
+
+static void dp_IEEEDPFloor(uint opcode, uint pc, void *data)
+{
+  double_to_regs(floor(DP_ARG));
+}
+
+static void dp_IEEEDPCeil(uint opcode, uint pc, void *data)
+{
+  double_to_regs(ceil(DP_ARG));
+}
+
+/* ----- function table ----- */
+
+static native_entry_t native_funcs[] = {
+  { "exec.library", "AddHead", exec_AddHead },
+  { "exec.library", "AddTail", exec_AddTail },
+  { "exec.library", "Remove", exec_Remove },
+  { "exec.library", "RemHead", exec_RemHead },
+  { "exec.library", "RemTail", exec_RemTail },
+  { "exec.library", "CopyMem", exec_CopyMem },
+  { "exec.library", "CopyMemQuick", exec_CopyMem },
+  { "mathffp.library", "SPFix", ffp_SPFix },
+  { "mathffp.library", "SPFlt", ffp_SPFlt },
+  { "mathffp.library", "SPCmp", ffp_SPCmp },
+  { "mathffp.library", "SPTst", ffp_SPTst },
+  { "mathffp.library", "SPAbs", ffp_SPAbs },
+  { "mathffp.library", "SPNeg", ffp_SPNeg },
+  { "mathffp.library", "SPAdd", ffp_SPAdd },
+  { "mathffp.library", "SPSub", ffp_SPSub },
+  { "mathffp.library", "SPMul", ffp_SPMul },
+  { "mathffp.library", "SPDiv", ffp_SPDiv },
+  { "mathffp.library", "SPFloor", ffp_SPFloor },
+  { "mathffp.library", "SPCeil", ffp_SPCeil },
+  { "mathieeedoubbas.library", "IEEEDPFix", dp_IEEEDPFix },
+  { "mathieeedoubbas.library", "IEEEDPFlt", dp_IEEEDPFlt },
+  { "mathieeedoubbas.library", "IEEEDPCmp", dp_IEEEDPCmp },
+  { "mathieeedoubbas.library", "IEEEDPTst", dp_IEEEDPTst },
+  { "mathieeedoubbas.library", "IEEEDPAbs", dp_IEEEDPAbs },
+  { "mathieeedoubbas.library", "IEEEDPNeg", dp_IEEEDPNeg },
+  { "mathieeedoubbas.library", "IEEEDPAdd", dp_IEEEDPAdd },
+  { "mathieeedoubbas.library", "IEEEDPSub", dp_IEEEDPSub },
+  { "mathieeedoubbas.library", "IEEEDPMul", dp_IEEEDPMul },
+  { "mathieeedoubbas.library", "IEEEDPDiv", dp_IEEEDPDiv },
+  { "mathieeedoubbas.library", "IEEEDPFloor", dp_IEEEDPFloor },
+  { "mathieeedoubbas.library", "IEEEDPCeil", dp_IEEEDPCeil },
+  { NULL, NULL, NULL }
+};
+
+trap_func_t native_find_func(const char *lib_name, const char *func_name)
+{
+  native_entry_t *e = native_funcs;
+  while(e->lib_name != NULL) {
+    if((strcmp(e->lib_name, lib_name) == 0) && (strcmp(e->func_name, func_name) == 0)) {
+      return e->func;
+    }
+    e++;
+  }
+  return NULL;
+}
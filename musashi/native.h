@@ -0,0 +1,14 @@
+/* native C implementations of library functions used as traps in vamos
+ *
+ * under the GNU Public License V2
+ */
+
+#ifndef _NATIVE_H
+#define _NATIVE_H
+
+#include "traps.h"
+
+/* ----- API ----- */
+extern trap_func_t native_find_func(const char *lib_name, const char *func_name);
+
+#endif
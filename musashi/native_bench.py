@@ -0,0 +1,167 @@
+# native_bench.py
+# compare calls per second of native C traps and python traps
+#
+# the math benchmarks use the python versions found in amitools:
+# run with PYTHONPATH pointing to the amitools checkout
+
+import sys
+import time
+import emu
+import m68k
+
+list_addr = 0x2000
+node_addr = 0x2100
+code_addr = 0x1000
+jump_addr = 0x3000
+stack_addr = 0x8000
+
+done = [False]
+emu_cpu = None
+
+# ----- python versions -----
+
+def py_add_tail(mem):
+  cpu = emu_cpu
+  def add_tail(op, pc):
+    l = cpu.r_reg(m68k.M68K_REG_A0)
+    n = cpu.r_reg(m68k.M68K_REG_A1)
+    tp = mem.r32(l + 8)
+    mem.w32(n, l + 4)
+    mem.w32(n + 4, tp)
+    mem.w32(tp, n)
+    mem.w32(l + 8, n)
+  return add_tail
+
+def py_rem_head(mem):
+  cpu = emu_cpu
+  def rem_head(op, pc):
+    l = cpu.r_reg(m68k.M68K_REG_A0)
+    n = mem.r32(l)
+    succ = mem.r32(n)
+    if succ == 0:
+      cpu.w_reg(m68k.M68K_REG_D0, 0)
+      return
+    pred = mem.r32(n + 4)
+    mem.w32(pred, succ)
+    mem.w32(succ + 4, pred)
+    cpu.w_reg(m68k.M68K_REG_D0, n)
+  return rem_head
+
+def py_binary_op(func):
+  cpu = emu_cpu
+  def binary_op(op, pc):
+    d0 = func(cpu.r_reg(m68k.M68K_REG_D1), cpu.r_reg(m68k.M68K_REG_D0))
+    cpu.w_reg(m68k.M68K_REG_D0, d0)
+  return binary_op
+
+# ----- test code -----
+
+def list_code(mem, num):
+  # empty list
+  mem.w32(list_addr, list_addr + 4)
+  mem.w32(list_addr + 4, 0)
+  mem.w32(list_addr + 8, list_addr)
+  return [
+    0x2e3c, num >> 16, num & 0xffff,  # move.l #num,d7
+    0x41f8, list_addr,                # lea list.w,a0
+    0x43f8, node_addr,                # lea node.w,a1
+    0x4eb8, jump_addr,                # jsr AddTail
+    0x41f8, list_addr,                # lea list.w,a0
+    0x4eb8, jump_addr + 2,            # jsr RemHead
+    0x5387,                           # subq.l #1,d7
+    0x66e8,                           # bne.s loop
+    0x4e70                            # reset
+  ]
+
+def list_check(mem):
+  # list must be empty again and d0 the removed node
+  return mem.r32(list_addr + 8) == list_addr and \
+         emu_cpu.r_reg(m68k.M68K_REG_D0) == node_addr
+
+def math_code(a, b):
+  def gen(mem, num):
+    return [
+      0x2e3c, num >> 16, num & 0xffff,  # move.l #num,d7
+      0x203c, a >> 16, a & 0xffff,      # move.l #a,d0
+      0x223c, b >> 16, b & 0xffff,      # move.l #b,d1
+      0x4eb8, jump_addr,                # jsr func
+      0x5387,                           # subq.l #1,d7
+      0x66ec,                           # bne.s loop
+      0x4e70                            # reset
+    ]
+  return gen
+
+def math_check(res):
+  def check(mem):
+    return emu_cpu.r_reg(m68k.M68K_REG_D0) == res
+  return check
+
+# ----- bench -----
+
+def run_loop(mem, code):
+  addr = code_addr
+  for w in code:
+    mem.w16(addr, w)
+    addr += 2
+  emu_cpu.w_reg(m68k.M68K_REG_A7, stack_addr)
+  emu_cpu.w_reg(m68k.M68K_REG_PC, code_addr)
+  start = time.time()
+  while not done[0]:
+    emu_cpu.execute(100000)
+  done[0] = False
+  return time.time() - start
+
+def bench(traps, mem, title, funcs, code_func, check, num):
+  """funcs is a list of (lib_name, func_name, py_func) tuples"""
+  for mode in ('python', 'native'):
+    tids = []
+    addr = jump_addr
+    for lib_name, func_name, py_func in funcs:
+      if mode == 'native':
+        tid = traps.setup_native(lib_name, func_name, auto_rts=True)
+      else:
+        tid = traps.setup(py_func, auto_rts=True)
+      mem.w16(addr, 0xa000 | tid)
+      tids.append(tid)
+      addr += 2
+    delta = run_loop(mem, code_func(mem, num))
+    ok = check(mem)
+    for tid in tids:
+      traps.free(tid)
+    calls = num * len(funcs)
+    print "%-10s %-8s %8d calls  %8.4fs  %12.0f calls/s  ok=%s" % \
+      (title, mode, calls, delta, calls / delta, ok)
+
+def run(num=100000):
+  global emu_cpu
+  emu_cpu = emu.CPU(m68k.M68K_CPU_TYPE_68000)
+  mem = emu.Memory(64)
+  traps = emu.Traps()
+  def reset_handler():
+    done[0] = True
+    emu_cpu.end()
+  emu_cpu.set_reset_instr_callback(reset_handler)
+  emu_cpu.pulse_reset()
+
+  bench(traps, mem, 'list', [
+    ("exec.library", "AddTail", py_add_tail(mem)),
+    ("exec.library", "RemHead", py_rem_head(mem))
+  ], list_code, list_check, num)
+
+  try:
+    from amitools.vamos.lib import MathFFPLibrary as ffp
+  except ImportError:
+    print "amitools not found: skipping math benchmarks"
+    return
+  a = ffp.float_to_ffp(3.25)
+  b = ffp.float_to_ffp(-1.5)
+  for func_name, func in (("SPAdd", ffp.ffp_add), ("SPMul", ffp.ffp_mul), ("SPDiv", ffp.ffp_div)):
+    bench(traps, mem, func_name, [
+      ("mathffp.library", func_name, py_binary_op(func))
+    ], math_code(a, b), math_check(func(b, a)), num)
+
+if __name__ == '__main__':
+  if len(sys.argv) > 1:
+    run(int(sys.argv[1]))
+  else:
+    run()
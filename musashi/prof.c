@@ -0,0 +1,181 @@
+/* a sampling profiler for the m68k emu core
+ *
+ * the profiler is installed as the instruction hook of the CPU. it sums up
+ * the cycles used and every 'period' cycles it takes a sample of the PC
+ * and the possible return addresses of the current function. the samples
+ * are counted in a hash table that is read out after the run.
+ *
+ * under the GNU Public License V2
+ */
+
+#include "prof.h"
+#include "mem.h"
+#include "m68k.h"
+#include <stdlib.h>
+#include <string.h>
+
+#define MIN_SLOTS   1024
+
+static prof_entry_t *slots;
+static uint num_slots;
+static uint num_used;
+static uint num_samples;
+
+static uint period;
+static uint cycles;
+static int  last_run;
+static prof_chain_func_t chain_func;
+
+/* ----- hash table ----- */
+
+static uint hash_key(const uint *key)
+{
+  uint h = key[0] * 0x9e3779b1;
+  h ^= key[1] * 0x85ebca77;
+  h ^= key[2] * 0xc2b2ae3d;
+  h ^= key[3] * 0x27d4eb2f;
+  return h ^ (h >> 15);
+}
+
+static prof_entry_t *find_slot(prof_entry_t *tab, uint size, const uint *key)
+{
+  uint mask = size - 1;
+  uint i = hash_key(key) & mask;
+  while(1) {
+    prof_entry_t *e = &tab[i];
+    if(e->count == 0) {
+      return e;
+    }
+    if(memcmp(e->key, key, sizeof(e->key)) == 0) {
+      return e;
+    }
+    i = (i + 1) & mask;
+  }
+}
+
+static int grow(void)
+{
+  uint new_size = num_slots * 2;
+  prof_entry_t *new_slots = (prof_entry_t *)calloc(new_size, sizeof(prof_entry_t));
+  uint i;
+  if(new_slots == NULL) {
+    return 0;
+  }
+  for(i=0;i<num_slots;i++) {
+    prof_entry_t *e = &slots[i];
+    if(e->count != 0) {
+      *find_slot(new_slots, new_size, e->key) = *e;
+    }
+  }
+  free(slots);
+  slots = new_slots;
+  num_slots = new_size;
+  return 1;
+}
+
+/* ----- sampling ----- */
+
+static uint r32_ram(uint addr)
+{
+  uint8_t *ram = mem_raw_ptr();
+  if(mem_is_ram_range(addr, 4)) {
+    ram += addr;
+    return (ram[0] << 24) | (ram[1] << 16) | (ram[2] << 8) | ram[3];
+  } else {
+    return 0;
+  }
+}
+
+static void take_sample(void)
+{
+  uint key[PROF_NUM_KEYS];
+  prof_entry_t *e;
+
+  key[0] = m68k_get_reg(NULL, M68K_REG_PC);
+  key[1] = r32_ram(m68k_get_reg(NULL, M68K_REG_A7));
+  key[2] = r32_ram(m68k_get_reg(NULL, M68K_REG_A5) + 4);
+  key[3] = r32_ram(m68k_get_reg(NULL, M68K_REG_A6) + 4);
+
+  num_samples++;
+  e = find_slot(slots, num_slots, key);
+  if(e->count == 0) {
+    /* keep load below 1/2. if growing fails we stop adding new keys */
+    if(((num_used + 1) * 2) > num_slots) {
+      if(!grow()) {
+        return;
+      }
+      e = find_slot(slots, num_slots, key);
+    }
+    memcpy(e->key, key, sizeof(key));
+    num_used++;
+  }
+  e->count++;
+}
+
+void prof_instr_hook(void)
+{
+  int run = m68k_cycles_run();
+  /* a new time slice started */
+  if(run < last_run) {
+    last_run = 0;
+  }
+  cycles += run - last_run;
+  last_run = run;
+
+  if(cycles >= period) {
+    cycles %= period;
+    take_sample();
+  }
+
+  if(chain_func != NULL) {
+    chain_func();
+  }
+}
+
+/* ----- API ----- */
+
+int prof_init(uint p)
+{
+  prof_free();
+  slots = (prof_entry_t *)calloc(MIN_SLOTS, sizeof(prof_entry_t));
+  if(slots == NULL) {
+    return 0;
+  }
+  num_slots = MIN_SLOTS;
+  period = (p > 0) ? p : 1;
+  cycles = 0;
+  last_run = 0;
+  return 1;
+}
+
+void prof_free(void)
+{
+  free(slots);
+  slots = NULL;
+  num_slots = 0;
+  num_used = 0;
+  num_samples = 0;
+}
+
+void prof_set_chain_func(prof_chain_func_t func)
+{
+  chain_func = func;
+}
+
+uint prof_get_num_samples(void)
+{
+  return num_samples;
+}
+
+uint prof_get_num_slots(void)
+{
+  return num_slots;
+}
+
+const prof_entry_t *prof_get_slot(uint idx)
+{
+  if((idx >= num_slots) || (slots[idx].count == 0)) {
+    return NULL;
+  }
+  return &slots[idx];
+}
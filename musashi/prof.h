@@ -0,0 +1,39 @@
+/* a sampling profiler for the m68k emu core
+ *
+ * under the GNU Public License V2
+ */
+
+#ifndef _PROF_H
+#define _PROF_H
+
+#include <stdint.h>
+
+/* ------ Types ----- */
+#ifndef UINT_TYPE
+#define UINT_TYPE
+typedef unsigned int uint;
+#endif
+
+typedef void (*prof_chain_func_t)(void);
+
+/* a sample entry: pc and the longwords found at the return address
+   candidates (a7), 4(a5) and 4(a6) when the sample was taken */
+#define PROF_NUM_KEYS   4
+
+struct prof_entry {
+  uint key[PROF_NUM_KEYS];
+  uint count;
+};
+typedef struct prof_entry prof_entry_t;
+
+/* ----- API ----- */
+extern int  prof_init(uint period);
+extern void prof_free(void);
+extern void prof_set_chain_func(prof_chain_func_t func);
+extern void prof_instr_hook(void);
+
+extern uint prof_get_num_samples(void);
+extern uint prof_get_num_slots(void);
+extern const prof_entry_t *prof_get_slot(uint idx);
+
+#endif
@@ -31,6 +31,53 @@ cdef extern from "m68k.h":
 
   unsigned int m68k_disassemble(char* str_buff, unsigned int pc, unsigned int cpu_type)
 
+# prof.h
+cdef extern from "prof.h":
+  ctypedef struct prof_entry_t:
+    unsigned int key[4]
+    unsigned int count
+
+  int prof_init(unsigned int period)
+  void prof_free()
+  void prof_set_chain_func(void (*func)() except *)
+  void prof_instr_hook() except *
+  unsigned int prof_get_num_samples()
+  unsigned int prof_get_num_slots()
+  const prof_entry_t *prof_get_slot(unsigned int idx)
+
+# itrace.h
+cdef extern from "itrace.h":
+  ctypedef struct itrace_entry_t:
+    unsigned int pc
+    unsigned short words[5]
+    unsigned short num_words
+
+  int ITRACE_NUM_WORDS
+  int ITRACE_NUM_REGS
+
+  int itrace_init(unsigned int depth, int with_regs)
+  void itrace_free()
+  void itrace_set_triggers(int has_start, unsigned int start_pc, int has_stop, unsigned int stop_pc)
+  void itrace_set_chain_func(void (*func)() except *)
+  void itrace_instr_hook() except *
+  int itrace_is_recording()
+  unsigned int itrace_get_num_entries()
+  unsigned int itrace_get_total()
+  const itrace_entry_t *itrace_get_entry(unsigned int idx)
+  const unsigned int *itrace_get_regs(unsigned int idx)
+
+# mem.h
+cdef extern from "mem.h":
+  void mem_set_disasm_words(unsigned int pc, const unsigned short *words, unsigned int num_words)
+
+from posix.time cimport clock_gettime, timespec, CLOCK_MONOTONIC
+
+def get_monotonic_time():
+  """return a monotonic high resolution time in seconds"""
+  cdef timespec ts
+  clock_gettime(CLOCK_MONOTONIC, &ts)
+  return ts.tv_sec + ts.tv_nsec * 1e-9
+
 # wrapper
 cdef object pc_changed_func
 cdef void pc_changed_func_wrapper(unsigned int new_pc) except *:
@@ -40,10 +87,27 @@ cdef object reset_instr_func
 cdef void reset_instr_func_wrapper() except *:
   reset_instr_func()
 
-cdef object instr_hook_func
+cdef object instr_hook_func = None
 cdef void instr_hook_func_wrapper() except *:
   instr_hook_func()
 
+cdef bint prof_active = False
+cdef bint itrace_active = False
+
+cdef void setup_instr_hook():
+  # chain the active hooks: profiler -> instruction trace -> python
+  cdef void (*hook)() except *
+  hook = NULL
+  if instr_hook_func is not None:
+    hook = instr_hook_func_wrapper
+  if itrace_active:
+    itrace_set_chain_func(hook)
+    hook = itrace_instr_hook
+  if prof_active:
+    prof_set_chain_func(hook)
+    hook = prof_instr_hook
+  m68k_set_instr_hook_callback(hook)
+
 # public CPU class
 cdef class CPU:
   cdef unsigned int cpu_type
@@ -65,6 +129,15 @@ cdef class CPU:
   def r_reg(self,reg):
     return self.r_reg_internal(reg)
 
+  def r_regs(self, regs):
+    """read a sequence of registers and return their values as a tuple"""
+    cdef int reg
+    return tuple([self.r_reg_internal(reg) for reg in regs])
+
+  def w_d0_d1(self, d0, d1):
+    self.w_reg_internal(M68K_REG_D0,d0)
+    self.w_reg_internal(M68K_REG_D1,d1)
+
   def w_pc(self, val):
     self.w_reg_internal(M68K_REG_PC,val)
 
@@ -80,6 +153,27 @@ cdef class CPU:
   def pulse_reset(self):
     m68k_pulse_reset()
 
+  def reset(self):
+    """reset the cpu to its state after creation: stop the profiler and
+       the instruction trace and free their buffers and clear all
+       callbacks. the traps of the Traps instance need a reset afterwards."""
+    global pc_changed_func, reset_instr_func, instr_hook_func
+    global prof_active, itrace_active
+    prof_active = False
+    itrace_active = False
+    prof_free()
+    itrace_free()
+    pc_changed_func = None
+    reset_instr_func = None
+    instr_hook_func = None
+    m68k_set_cpu_type(self.cpu_type)
+    m68k_init()
+    # registers are zero in a new cpu
+    for reg in range(M68K_REG_D0, M68K_REG_A7 + 1):
+      m68k_set_reg(<m68k_register_t>reg, 0)
+    for reg in (M68K_REG_USP, M68K_REG_ISP, M68K_REG_MSP, M68K_REG_PC):
+      m68k_set_reg(<m68k_register_t>reg, 0)
+
   def execute(self, num_cycles):
     return m68k_execute(num_cycles)
 
@@ -99,7 +193,96 @@ cdef class CPU:
   def set_instr_hook_callback(self, py_func):
     global instr_hook_func
     instr_hook_func = py_func
-    m68k_set_instr_hook_callback(instr_hook_func_wrapper)
+    setup_instr_hook()
+
+  def prof_start(self, unsigned int period):
+    """start the sampling profiler: take a sample every period cycles"""
+    global prof_active
+    if not prof_init(period):
+      raise MemoryError("profiler init failed")
+    prof_active = True
+    setup_instr_hook()
+
+  def prof_stop(self):
+    """stop the profiler. the samples stay available until the next start"""
+    global prof_active
+    prof_active = False
+    setup_instr_hook()
+
+  def prof_get_num_samples(self):
+    return prof_get_num_samples()
+
+  def prof_get_samples(self):
+    """return a list of (pc, (a7), 4(a5), 4(a6), count) tuples"""
+    cdef unsigned int i
+    cdef const prof_entry_t *e
+    res = []
+    for i in range(prof_get_num_slots()):
+      e = prof_get_slot(i)
+      if e != NULL:
+        res.append((e.key[0], e.key[1], e.key[2], e.key[3], e.count))
+    return res
+
+  def itrace_start(self, unsigned int depth, with_regs=False, start_pc=None, stop_pc=None):
+    """record the last depth instructions in a ring buffer.
+       optionally start and stop recording if the given pc is reached"""
+    global itrace_active
+    if not itrace_init(depth, with_regs):
+      raise MemoryError("instruction trace init failed")
+    itrace_set_triggers(start_pc is not None, start_pc or 0,
+                        stop_pc is not None, stop_pc or 0)
+    itrace_active = True
+    setup_instr_hook()
+
+  def itrace_stop(self):
+    """stop the instruction trace. the entries stay available"""
+    global itrace_active
+    itrace_active = False
+    setup_instr_hook()
+
+  def itrace_is_recording(self):
+    return itrace_active and itrace_is_recording()
+
+  def itrace_get_total(self):
+    """total number of recorded instructions"""
+    return itrace_get_total()
+
+  def itrace_get_entries(self, num=None):
+    """return the last num (or all) entries, oldest first.
+       each entry is a (pc, words, regs) tuple and regs is None or
+       (d0..d7, a0..a7, sr). words only has the opcode words that were
+       readable from RAM and is empty for an unreadable pc"""
+    cdef unsigned int i, n, first
+    cdef const itrace_entry_t *e
+    cdef const unsigned int *r
+    n = itrace_get_num_entries()
+    first = 0
+    if num is not None and num < n:
+      first = n - num
+    res = []
+    for i in range(first, n):
+      e = itrace_get_entry(i)
+      words = tuple([e.words[j] for j in range(e.num_words)])
+      r = itrace_get_regs(i)
+      if r != NULL:
+        regs = tuple([r[j] for j in range(ITRACE_NUM_REGS)])
+      else:
+        regs = None
+      res.append((e.pc, words, regs))
+    return res
+
+  def disassemble_words(self, unsigned int pc, words):
+    """disassemble an instruction given by its opcode words instead of memory"""
+    cdef char line[80]
+    cdef unsigned int size
+    cdef unsigned short buf[16]
+    cdef unsigned int n = min(len(words), 16)
+    for i in range(n):
+      buf[i] = words[i]
+    mem_set_disasm_words(pc, buf, n)
+    size = m68k_disassemble(line, pc, self.cpu_type)
+    mem_set_disasm_words(0, NULL, 0)
+    return (size, line)
 
   def disassemble(self, unsigned int pc):
     cdef char line[80]
@@ -8,6 +8,7 @@ cdef extern from "mem.h":
 
   int mem_init(uint ram_size_kib)
   void mem_free()
+  void mem_reset()
 
   void mem_set_invalid_func(invalid_func_t func, void *ctx)
   void mem_set_all_to_end()
@@ -16,6 +17,17 @@ cdef extern from "mem.h":
   void mem_set_trace_mode(int on)
   void mem_set_trace_func(trace_func_t func, void *ctx)
 
+  ctypedef struct mem_watch_t:
+    uint begin
+    uint end
+    int flags
+    uint hits
+
+  int MEM_MAX_WATCHES
+  int mem_add_watch(uint begin, uint end, int flags)
+  void mem_remove_watch(int idx)
+  const mem_watch_t *mem_get_watch(int idx)
+
   uint mem_reserve_special_range(uint num_pages)
   void mem_set_special_range_read_func(uint page_addr, uint width, read_func_t func, void *ctx)
   void mem_set_special_range_write_func(uint page_addr, uint width, write_func_t func, void *ctx)
@@ -31,9 +43,22 @@ cdef extern from "mem.h":
   unsigned char *mem_raw_ptr()
   uint mem_raw_size()
 
+  int MEM_PAGE_TOUCHED
+  int MEM_PAGE_DIRTY
+  void mem_touch(uint addr, uint size)
+  uint mem_get_num_pages()
+  uint mem_get_num_touched_pages()
+  const unsigned char *mem_get_page_flags()
+
+  void mem_checkpoint()
+  uint mem_restore_checkpoint()
+  void mem_end_checkpoint()
+  uint mem_get_num_dirty_pages()
+
 # string.h
 from libc.string cimport memcpy, memset, strlen, strcpy
 from libc.stdlib cimport malloc, free
+import struct
 
 # wrapper functions
 cdef int trace_func_wrapper(int mode, int width, uint addr, uint val, void *ctx) except *:
@@ -63,18 +88,86 @@ cdef class Memory:
   cdef object invalid_func
 
   def __cinit__(self, ram_size_kib):
-    mem_init(ram_size_kib)
+    if not mem_init(ram_size_kib):
+      raise MemoryError("can't setup %d KiB RAM" % ram_size_kib)
     self.ram_size = ram_size_kib
     self.ram_bytes = ram_size_kib * 1024
     self.ram_ptr = mem_raw_ptr()
     self.special_funcs = set()
 
   def __dealloc__(self):
-    mem_free()
+    # a newer Memory may have replaced the RAM of this one
+    if mem_raw_ptr() == self.ram_ptr:
+      mem_free()
+
+  def reset(self):
+    """reset the memory to its state after creation: zero RAM and drop
+       all special ranges, watches and callbacks. the RAM is kept."""
+    mem_reset()
+    self.special_funcs = set()
+    self.trace_func = None
+    self.invalid_func = None
 
   def get_ram_size(self):
     return self.ram_size
 
+  # RAM usage: RAM is only committed by the host when touched
+  def get_num_pages(self):
+    """number of 64 KiB RAM pages"""
+    return mem_get_num_pages()
+  def get_num_touched_pages(self):
+    return mem_get_num_touched_pages()
+  def get_touched_pages(self):
+    """return a list of the page numbers already written to"""
+    cdef const unsigned char *flags = mem_get_page_flags()
+    cdef uint i
+    return [i for i in range(mem_get_num_pages()) if flags[i] & MEM_PAGE_TOUCHED]
+
+  # checkpoints: track the pages written since then and save their contents
+  def checkpoint(self):
+    """set a new checkpoint of the current RAM contents"""
+    mem_checkpoint()
+  def restore_checkpoint(self):
+    """restore the RAM contents of the checkpoint. returns number of pages"""
+    return mem_restore_checkpoint()
+  def end_checkpoint(self):
+    """stop tracking dirty pages and release the saved pages"""
+    mem_end_checkpoint()
+  def get_num_dirty_pages(self):
+    return mem_get_num_dirty_pages()
+  def get_dirty_pages(self):
+    """return a list of the page numbers written since the checkpoint"""
+    cdef const unsigned char *flags = mem_get_page_flags()
+    cdef uint i
+    return [i for i in range(mem_get_num_pages()) if flags[i] & MEM_PAGE_DIRTY]
+
+  # delta files: the dirty pages on disk
+  def save_dirty_pages(self, path):
+    """write the pages written since the checkpoint to a file.
+       returns the number of pages"""
+    pages = self.get_dirty_pages()
+    with open(path, "wb") as fh:
+      fh.write(struct.pack(">4sII", "VMPG", 1, len(pages)))
+      for page in pages:
+        fh.write(struct.pack(">I", page))
+        fh.write(self.r_block(page << 16, 0x10000))
+    return len(pages)
+
+  def load_pages(self, path):
+    """write the pages of a file created by save_dirty_pages() to RAM.
+       returns the number of pages"""
+    with open(path, "rb") as fh:
+      magic, version, num_pages = struct.unpack(">4sII", fh.read(12))
+      if magic != "VMPG" or version != 1:
+        raise ValueError("no page file: %s" % path)
+      for i in range(num_pages):
+        page = struct.unpack(">I", fh.read(4))[0]
+        data = fh.read(0x10000)
+        if len(data) != 0x10000 or page >= mem_get_num_pages():
+          raise ValueError("invalid page file: %s" % path)
+        self.w_block(page << 16, data)
+    return num_pages
+
   def set_all_to_end(self):
     mem_set_all_to_end()
 
@@ -121,6 +214,29 @@ cdef class Memory:
     # keep func ref
     self.trace_func = func
 
+  # watch ranges: if set only matching accesses are traced
+  def add_watch_range(self, uint begin, uint end, int flags=0):
+    """watch [begin, end) for the accesses given by flags (MEM_WATCH_*).
+       returns the range index"""
+    idx = mem_add_watch(begin, end, flags)
+    if idx < 0:
+      raise ValueError("can't add watch range")
+    return idx
+  def remove_watch_range(self, int idx):
+    mem_remove_watch(idx)
+  def clear_watch_ranges(self):
+    for idx in range(MEM_MAX_WATCHES):
+      mem_remove_watch(idx)
+  def get_watch_ranges(self):
+    """return a list of (idx, begin, end, flags, hits) tuples"""
+    cdef const mem_watch_t *w
+    res = []
+    for idx in range(MEM_MAX_WATCHES):
+      w = mem_get_watch(idx)
+      if w != NULL:
+        res.append((idx, w.begin, w.end, w.flags, w.hits))
+    return res
+
   def set_invalid_func(self,func):
     mem_set_invalid_func(invalid_func_wrapper, <void *>func)
     # keep func ref
@@ -171,12 +287,14 @@ cdef class Memory:
       raise ValueError("no RAM")
     cdef const unsigned char *ptr = data
     cdef unsigned char *ram = self.ram_ptr + addr
+    mem_touch(addr, size)
     memcpy(ram, ptr, size)
 
   def clear_block(self,uint addr,uint size,unsigned char value):
     if (addr+size) > self.ram_bytes:
       raise ValueError("no RAM")
     cdef unsigned char *ram = self.ram_ptr + addr
+    mem_touch(addr, size)
     memset(ram,value,size)
 
   def copy_block(self,uint from_addr, uint to_addr, uint size):
@@ -184,6 +302,7 @@ cdef class Memory:
       raise ValueError("no RAM")
     cdef unsigned char *from_ptr = self.ram_ptr + from_addr
     cdef unsigned char *to_ptr = self.ram_ptr + to_addr
+    mem_touch(to_addr, size)
     memcpy(to_ptr, from_ptr, size)
 
   # helpers for c-strings (only RAM)
@@ -199,6 +318,7 @@ cdef class Memory:
       raise ValueError("no RAM")
     cdef const char *ptr = string
     cdef char *ram = <char *>self.ram_ptr + addr
+    mem_touch(addr, len(string) + 1)
     strcpy(ram, ptr)
 
   # helpers for bcpl-strings (only RAM)
@@ -222,6 +342,7 @@ cdef class Memory:
     cdef uint size = len(string)
     cdef unsigned char *ptr = string
     cdef unsigned char *ram = self.ram_ptr + addr
+    mem_touch(addr, size + 1)
     ram[0] = <unsigned char>size
     ram += 1
     memcpy(ram, ptr, size)
@@ -8,11 +8,72 @@ cdef extern from "traps.h":
   void trap_init()
   int  trap_setup(trap_func_t func, int flags, void *data)
   void trap_free(int id)
+  int  trap_get_num_used()
+  int  trap_get_max_used()
+  int  trap_get_num_traps()
+  unsigned int trap_get_num_calls()
+
+# native.h
+cdef extern from "native.h":
+  trap_func_t native_find_func(const char *lib_name, const char *func_name)
 
 cdef void trap_wrapper(uint opcode, uint pc, void *data) except *:
   cdef object py_func = <object>data;
   py_func(opcode, pc)
 
+cdef void reg_stub_wrapper(uint opcode, uint pc, void *data) except *:
+  cdef RegCallStub stub = <RegCallStub>data
+  stub.call()
+
+DEF MAX_STUB_REGS = 16
+
+cdef class RegCallStub:
+  """a call stub for a library method.
+
+     all argument registers are fetched in one go and are passed as
+     positional args after ctx. The result is written to D0 or D0/D1
+     if a list or tuple is returned.
+  """
+  cdef object method
+  cdef object ctx
+  cdef object exc_handler
+  cdef int num_regs
+  cdef int regs[MAX_STUB_REGS]
+
+  def __cinit__(self, method, ctx, regs=(), exc_handler=None):
+    cdef int i
+    if len(regs) > MAX_STUB_REGS:
+      raise ValueError("too many registers: %d" % len(regs))
+    self.method = method
+    self.ctx = ctx
+    self.exc_handler = exc_handler
+    self.num_regs = len(regs)
+    for i in range(self.num_regs):
+      self.regs[i] = regs[i]
+
+  cdef call(self):
+    cdef int i
+    args = [self.ctx]
+    for i in range(self.num_regs):
+      args.append(m68k_get_reg(NULL, <m68k_register_t>self.regs[i]))
+    if self.exc_handler is None:
+      res = self.method(*args)
+    else:
+      try:
+        res = self.method(*args)
+      except:
+        self.exc_handler()
+        raise
+    if res is not None:
+      if type(res) is list or type(res) is tuple:
+        m68k_set_reg(M68K_REG_D0, <unsigned int>(res[0] & 0xffffffff))
+        m68k_set_reg(M68K_REG_D1, <unsigned int>(res[1] & 0xffffffff))
+      else:
+        m68k_set_reg(M68K_REG_D0, <unsigned int>(res & 0xffffffff))
+
+  def __call__(self, opcode, pc):
+    self.call()
+
 cdef class Traps:
   cdef dict func_map
 
@@ -27,12 +88,65 @@ cdef class Traps:
       flags |= TRAP_AUTO_RTS
     if one_shot:
       flags |= TRAP_ONE_SHOT
-    tid = trap_setup(trap_wrapper, flags, <void *>py_func)
+    if isinstance(py_func, RegCallStub):
+      # directly dispatch to the stub without a python call
+      tid = trap_setup(reg_stub_wrapper, flags, <void *>py_func)
+    else:
+      tid = trap_setup(trap_wrapper, flags, <void *>py_func)
     if tid != -1:
       # keep function reference around
       self.func_map[tid] = py_func
     return tid
 
+  def has_native(self, lib_name, func_name):
+    """is there a C implementation of the given library function?"""
+    return native_find_func(lib_name, func_name) != NULL
+
+  def setup_native(self, lib_name, func_name, auto_rts=False, one_shot=False):
+    """setup a trap that directly calls the C implementation of a function"""
+    cdef int flags
+    cdef trap_func_t func = native_find_func(lib_name, func_name)
+    if func == NULL:
+      raise KeyError("no native function: %s/%s" % (lib_name, func_name))
+    flags = TRAP_DEFAULT
+    if auto_rts:
+      flags |= TRAP_AUTO_RTS
+    if one_shot:
+      flags |= TRAP_ONE_SHOT
+    tid = trap_setup(func, flags, NULL)
+    if tid != -1:
+      self.func_map[tid] = None
+    return tid
+
+  def call_native(self, lib_name, func_name):
+    """directly call a native function with the current cpu registers"""
+    cdef trap_func_t func = native_find_func(lib_name, func_name)
+    if func == NULL:
+      raise KeyError("no native function: %s/%s" % (lib_name, func_name))
+    func(0, 0, NULL)
+
+  def create_reg_stub(self, method, ctx, regs=(), exc_handler=None):
+    """create a register marshalling call stub that can be passed to setup()"""
+    return RegCallStub(method, ctx, regs, exc_handler)
+
+  def reset(self):
+    """free all traps"""
+    trap_init()
+    self.func_map = {}
+
   def free(self, tid):
     trap_free(tid)
     del self.func_map[tid]
+
+  def get_num_used(self):
+    return trap_get_num_used()
+
+  def get_max_used(self):
+    return trap_get_max_used()
+
+  def get_num_calls(self):
+    """number of trap calls so far (wraps at 32 bit)"""
+    return trap_get_num_calls()
+
+  def get_num_traps(self):
+    return trap_get_num_traps()
@@ -25,6 +25,9 @@ typedef struct entry entry_t;
 
 static entry_t traps[NUM_TRAPS];
 static entry_t *first_free;
+static int num_used;
+static int max_used;
+static uint num_calls;
 
 static int trap_aline(uint opcode, uint pc)
 {
@@ -32,7 +35,9 @@ static int trap_aline(uint opcode, uint pc)
   trap_func_t func = traps[off].trap;
   void *data = traps[off].data;
   int flags = traps[off].flags;
-  
+
+  num_calls++;
+
   /* a one shot trap is removed before it is triggered
   ** otherwise, trap-functions used to capture "end-of-call"s
   ** of shell processes would never be released.
@@ -60,6 +65,8 @@ void trap_init(void)
     traps[i].next = &traps[i+1];
   }
   traps[NUM_TRAPS-1].next = NULL;
+  num_used = 0;
+  max_used = 0;
 
   /* setup my trap handler */
   m68k_set_aline_hook_callback(trap_aline);
@@ -84,6 +91,11 @@ int trap_setup(trap_func_t func, int flags, void *data)
   traps[off].data = data;
   traps[off].flags = flags;
 
+  num_used++;
+  if(num_used > max_used) {
+    max_used = num_used;
+  }
+
   return off;
 }
 
@@ -92,4 +104,25 @@ void trap_free(int id)
   /* insert trap into free list */
   traps[id].next = first_free;
   first_free = &traps[id];
+  num_used--;
+}
+
+int trap_get_num_used(void)
+{
+  return num_used;
+}
+
+int trap_get_max_used(void)
+{
+  return max_used;
+}
+
+uint trap_get_num_calls(void)
+{
+  return num_calls;
+}
+
+int trap_get_num_traps(void)
+{
+  return NUM_TRAPS;
 }
@@ -28,4 +28,9 @@ extern void trap_init(void);
 extern int  trap_setup(trap_func_t func, int flags, void *data);
 extern void trap_free(int id);
 
+extern int  trap_get_num_used(void);
+extern int  trap_get_max_used(void);
+extern uint trap_get_num_calls(void);
+extern int  trap_get_num_traps(void);
+
 #endif
@@ -15,6 +15,9 @@ class BuildPyCommand(setuptools.command.build_ext.build_ext):
 sourcefiles = [
   'musashi/emu.pyx',
   'musashi/traps.c',
+  'musashi/native.c',
+  'musashi/prof.c',
+  'musashi/itrace.c',
   'musashi/mem.c',
   'musashi/m68kcpu.c',
   'musashi/m68kdasm.c',
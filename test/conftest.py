@@ -3,22 +3,30 @@
 import pytest
 import subprocess
 import os
+import time
+import struct
 
 VAMOS_BIN="../vamos"
 VAMOS_ARGS=['-c', 'test.vamosrc']
 PROG_BIN_DIR="bin"
 
+# (name, time) of all vamos runs for the timing summary
+run_times = []
+
 class VamosTestRunner:
   def __init__(self, flavor,
                vopts=None,
                use_debug_bins=False,
                dump_output=False,
-               generate_data=False):
+               generate_data=False,
+               pool=None):
     self.flavor = flavor
     self.vopts = vopts
     self.use_debug_bins = use_debug_bins
     self.dump_output = dump_output
     self.generate_data = generate_data
+    # a VamosWorkerPool runs vamos in-process in long-lived workers
+    self.pool = pool
 
   def make_prog(self, prog_name):
     self.make_progs([prog_name])
@@ -41,6 +49,18 @@ class VamosTestRunner:
     dat_path.append(".txt")
     return "".join(dat_path)
 
+  def _get_args(self, prog_args):
+    args = [VAMOS_BIN] + VAMOS_ARGS
+    if self.vopts is not None:
+      args = args + self.vopts
+    prog_name = "curdir:bin/" + prog_args[0] + '_' + self.flavor
+    if self.use_debug_bins:
+      prog_name = prog_name + "_dbg"
+    args.append(prog_name)
+    if len(prog_args) > 1:
+      args = args + list(prog_args[1:])
+    return args
+
   def run_prog(self, *prog_args, **kw_args):
     """run an AmigaOS binary with vamos
 
@@ -52,27 +72,37 @@ class VamosTestRunner:
        - returncode of process
        - stdout as line array
     """
-    # run vamos with prog
-    args = [VAMOS_BIN] + VAMOS_ARGS
-    if self.vopts is not None:
-      args = args + self.vopts
-    prog_name = "curdir:bin/" + prog_args[0] + '_' + self.flavor
-    if self.use_debug_bins:
-      prog_name = prog_name + "_dbg"
-    args.append(prog_name)
-    if len(prog_args) > 1:
-      args = args + prog_args[1:]
+    return self.run_progs([(prog_args, kw_args)])[0]
+
+  def run_progs(self, runs):
+    """run multiple AmigaOS binaries given as (prog_args, kw_args) pairs.
+       with a worker pool the runs are done in parallel.
 
-    # stdin given?
-    if 'stdin' in kw_args:
-      stdin = kw_args['stdin']
+       returns a list of (returncode, stdout) like run_prog()
+    """
+    jobs = []
+    for prog_args, kw_args in runs:
+      jobs.append((self._get_args(prog_args), kw_args.get('stdin')))
+    if self.pool is not None:
+      # the workers get the args without the vamos binary
+      results = self.pool.run_many([(args[1:], stdin) for args, stdin in jobs])
     else:
-      stdin = None
+      results = []
+      for args, stdin in jobs:
+        start = time.time()
+        p = subprocess.Popen(args, stdin=subprocess.PIPE,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        (stdout, stderr) = p.communicate(stdin)
+        results.append((p.returncode, stdout, stderr, time.time() - start))
+    res = []
+    for (prog_args, kw_args), (args, stdin), result in zip(runs, jobs, results):
+      res.append(self._finish_run(prog_args, kw_args, args, *result))
+    return res
 
-    # run and get stdout/stderr
-    print("running:"," ".join(args))
-    p = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (stdout, stderr) = p.communicate(stdin)
+  def _finish_run(self, prog_args, kw_args, args, returncode, stdout, stderr, run_time):
+    name = " ".join(args)
+    print("running: %s (%.3fs)" % (name, run_time))
+    run_times.append((name, run_time))
 
     # process stdout
     stdout = stdout.splitlines()
@@ -99,7 +129,7 @@ class VamosTestRunner:
     if len(stderr) > 0:
       print(stderr)
 
-    return (p.returncode, stdout)
+    return (returncode, stdout)
 
   def run_prog_checked(self, *prog_args, **kw_args):
     """like run_prog() but check return value and assume its 0"""
@@ -139,6 +169,34 @@ def pytest_addoption(parser):
         help="generate data files by using the output of the test program")
     parser.addoption("--vamos-options", "-V", action="store", default=None,
         help="add options to vamos run. separate options by plus: e.g. -V-t+-T")
+    parser.addoption("--workers", "-J", action="store", type=int, default=None,
+        help="run vamos in-process in a pool of N long-lived workers (0: one per core, 1 with pytest-xdist)")
+    parser.addoption("--num-slowest", action="store", type=int, default=10,
+        help="number of the slowest vamos runs shown in the summary")
+
+def pytest_terminal_summary(terminalreporter, config):
+  num = config.getoption("--num-slowest")
+  if num > 0 and len(run_times) > 0:
+    terminalreporter.write_sep("=", "slowest %d vamos runs" % num)
+    total = 0.0
+    for name, run_time in run_times:
+      total += run_time
+    for name, run_time in sorted(run_times, key=lambda x: -x[1])[:num]:
+      terminalreporter.write_line("%8.3fs %s" % (run_time, name))
+    terminalreporter.write_line("%8.3fs total of %d runs" % (total, len(run_times)))
+
+def pytest_sessionfinish(session):
+  # pytest-xdist: pass the run times of a test process to the master
+  workeroutput = getattr(session.config, "workeroutput", None)
+  if workeroutput is not None:
+    workeroutput["vamos_run_times"] = run_times
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+  # pytest-xdist: collect the run times of a test process in the master
+  workeroutput = getattr(node, "workeroutput", {})
+  for name, run_time in workeroutput.get("vamos_run_times", []):
+    run_times.append((name, run_time))
 
 def pytest_runtest_setup(item):
   flv = item.config.getoption("--flavor")
@@ -147,9 +205,66 @@ def pytest_runtest_setup(item):
     if flv not in kw:
       pytest.skip("disabled flavor")
 
+def write_hunk_bin(path, code):
+  """a hunk binary with a single code hunk of the given code string"""
+  while len(code) % 4 != 0:
+    code += "\0\0"
+  num_longs = len(code) // 4
+  data = struct.pack(">IIIII", 0x3f3, 0, 1, 0, 0) + struct.pack(">I", num_longs)
+  data += struct.pack(">II", 0x3e9, num_longs) + code
+  data += struct.pack(">I", 0x3f2)
+  with open(path, "wb") as fh:
+    fh.write(data)
+
+def write_exit_bin(path, code=0):
+  """a hunk binary with a single code hunk: moveq #code,d0; rts"""
+  write_hunk_bin(path, struct.pack(">BB", 0x70, code) + "\x4e\x75")
+
+@pytest.fixture
+def exit_bin(tmpdir):
+  """return a function that creates a binary exiting with the given code
+     in the tmpdir and returns its path"""
+  def make(code=0, name="exit"):
+    path = str(tmpdir.join(name))
+    write_exit_bin(path, code)
+    return path
+  return make
+
+@pytest.fixture
+def hunk_bin(tmpdir):
+  """return a function that creates a binary with the given code
+     in the tmpdir and returns its path"""
+  def make(name, code):
+    path = str(tmpdir.join(name))
+    write_hunk_bin(path, code)
+    return path
+  return make
+
+def _is_xdist_worker(config):
+  return hasattr(config, "workerinput") or hasattr(config, "slaveinput")
+
+@pytest.fixture(scope="session")
+def vamos_pool(request):
+  """the worker pool of the in-process vamos runs or None.
+
+     a test runs its programs one after the other unless it passes them
+     together to run_progs(). with pytest-xdist (-n N) the tests run in
+     N processes. each of them then uses a pool with a single worker.
+  """
+  workers = request.config.getoption("--workers")
+  if workers is None:
+    yield None
+  else:
+    from amitools.vamos.VamosWorker import VamosWorkerPool
+    if _is_xdist_worker(request.config):
+      workers = 1
+    pool = VamosWorkerPool(workers or None)
+    yield pool
+    pool.close()
+
 @pytest.fixture(scope="module",
                 params=['vc', 'gcc', 'agcc', 'sc'])
-def vamos(request):
+def vamos(request, vamos_pool):
   """Run vamos with test programs"""
   dbg = request.config.getoption("--use-debug-bins")
   dump = request.config.getoption("--dump-output")
@@ -161,4 +276,5 @@ def vamos(request):
     use_debug_bins=dbg,
     dump_output=dump,
     generate_data=gen,
-    vopts=vopts)
+    vopts=vopts,
+    pool=vamos_pool)
@@ -0,0 +1,52 @@
+# the bulk struct access must match the field by field access
+
+from musashi import emu
+import amitools.vamos.lib.lexec.ExecStruct
+from amitools.vamos.lib.dos.DosStruct import FileInfoBlockDef, DateTimeDef, ProcessDef
+from amitools.vamos.AccessStruct import AccessStruct
+
+class _Mem:
+  def __init__(self, raw_mem):
+    self.raw_mem = raw_mem
+
+# the emu memory is global: share one instance
+raw_mem = emu.Memory(64)
+
+def _setup(struct_def):
+  addr = 0x1000
+  size = struct_def.get_size()
+  raw_mem.w_block(addr, "".join([chr((i * 7 + 3) & 0xff) for i in xrange(size)]))
+  return raw_mem, AccessStruct(_Mem(raw_mem), struct_def, addr)
+
+def access_struct_read_all_test():
+  for struct_def in (FileInfoBlockDef, DateTimeDef, ProcessDef):
+    raw_mem, a = _setup(struct_def)
+    vals = a.read_all()
+    assert sorted(vals.keys()) == sorted(struct_def.get_leaves().keys())
+    for name, val in vals.items():
+      off, width, count, conv, _ = struct_def.get_leaves()[name]
+      if count == 1:
+        assert val == a.r_s(name), name
+      elif width == 0:
+        assert val == raw_mem.r_block(a.struct_addr + off, count)
+      else:
+        assert val[0] == a.r_s(name)
+
+def access_struct_write_fields_test():
+  raw_mem, a = _setup(FileInfoBlockDef)
+  size = FileInfoBlockDef.get_size()
+  old = raw_mem.r_block(a.struct_addr, size)
+  # non contiguous fields: the gaps must be kept
+  a.write_fields({'fib_DiskKey' : 0x12345678, 'fib_Size' : 42,
+                  'fib_Date.ds_Tick' : -1, 'fib_FileName' : "hello"})
+  assert a.r_s('fib_DiskKey') == 0x12345678
+  assert a.r_s('fib_Size') == 42
+  assert a.r_s('fib_Date.ds_Tick') == 0xffffffff
+  assert a.r_cstr(a.s_get_addr('fib_FileName')) == "hello"
+  vals = a.read_all()
+  assert vals['fib_Protection'] == a.r_s('fib_Protection')
+  new = raw_mem.r_block(a.struct_addr, size)
+  off = FileInfoBlockDef.get_offset_for_name('fib_Protection')[0]
+  assert new[off:off+4] == old[off:off+4]
+  off = FileInfoBlockDef.get_offset_for_name('fib_Comment')[0]
+  assert new[off:] == old[off:]
@@ -0,0 +1,50 @@
+# the profiler and the instruction trace of the CPU with wild pointers
+
+from musashi import emu, m68k
+
+def _setup(pc):
+  """a cpu running an endless loop of nops at pc"""
+  cpu = emu.CPU(m68k.M68K_CPU_TYPE_68000)
+  mem = emu.Memory(128)
+  mem.w32(0, 0x800)
+  mem.w32(4, pc)
+  cpu.pulse_reset()
+  return cpu, mem
+
+def prof_wild_stack_test():
+  cpu, mem = _setup(0x1000)
+  for i in xrange(8):
+    mem.w16(0x1000 + i * 2, 0x4e71) # nop
+  mem.w16(0x1010, 0x60ee) # bra.s 0x1000
+  # the profiler reads (a7), 4(a5) and 4(a6)
+  cpu.w_reg(m68k.M68K_REG_A7, 0xfffffffe)
+  cpu.w_reg(m68k.M68K_REG_A5, 0xfffffffa)
+  cpu.w_reg(m68k.M68K_REG_A6, 0xfffffff9)
+  cpu.prof_start(4)
+  cpu.execute(1000)
+  cpu.prof_stop()
+  samples = cpu.prof_get_samples()
+  assert len(samples) > 0
+  for pc, a7, a5, a6, count in samples:
+    assert (a7, a5, a6) == (0, 0, 0)
+
+def itrace_wild_pc_test():
+  cpu, mem = _setup(0x1000)
+  invalid = []
+  mem.set_invalid_func(lambda mode, width, addr: invalid.append(addr))
+  # a pc in RAM has all words
+  mem.w16(0x1000, 0x4e71) # nop
+  cpu.itrace_start(16)
+  cpu.execute(4)
+  cpu.itrace_stop()
+  assert cpu.itrace_get_entries()[0][1] == (0x4e71, 0, 0, 0, 0)
+  # a wild pc
+  cpu.w_pc(0xfffffff8)
+  cpu.itrace_start(16)
+  cpu.execute(100)
+  cpu.itrace_stop()
+  entries = cpu.itrace_get_entries()
+  assert entries[0][0] == 0xfffffff8
+  # the opcode words were not readable
+  assert entries[0][1] == ()
+  assert len(invalid) > 0
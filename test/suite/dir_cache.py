@@ -0,0 +1,90 @@
+# the dir cache must see changes done by vamos and on the host
+
+import os
+import shutil
+import tempfile
+
+import amitools.vamos.lib.lexec.ExecStruct
+from amitools.vamos.lib.dos.DirCache import DirCache
+from amitools.vamos.lib.dos.FileHandle import FileHandle
+from amitools.vamos.lib.dos.FileManager import FileManager
+
+class _PathMgr:
+  """map the ami paths to names in a host dir"""
+  def __init__(self, base_dir):
+    self.base_dir = base_dir
+
+  def ami_to_sys_path(self, lock, ami_path):
+    return os.path.join(self.base_dir, ami_path)
+
+def _setup():
+  base_dir = tempfile.mkdtemp()
+  with open(os.path.join(base_dir, "a"), "wb") as fh:
+    fh.write("hello")
+  os.mkdir(os.path.join(base_dir, "sub"))
+  cache = DirCache()
+  assert sorted(cache.list_dir(base_dir)) == ["a", "sub"]
+  return base_dir, cache
+
+def dir_cache_vamos_test():
+  base_dir, cache = _setup()
+  try:
+    path = os.path.join(base_dir, "a")
+    file_mgr = FileManager(_PathMgr(base_dir), None, None, cache)
+    assert cache.get_info(path).size == 5
+    assert cache.get_info(path).size == 5
+    assert cache.num_info_hits > 0
+    # write
+    fh = FileHandle(open(path, "ab"), "a", path)
+    fh.dir_cache = cache
+    fh.write("world")
+    fh.close()
+    assert cache.get_info(path).size == 10
+    # rename
+    assert file_mgr.rename(None, "a", "b") == 0
+    assert cache.get_info(path) is None
+    assert cache.get_info(os.path.join(base_dir, "b")).size == 10
+    assert sorted(cache.list_dir(base_dir)) == ["b", "sub"]
+    # delete
+    assert file_mgr.delete(None, "b") == 0
+    assert cache.get_info(os.path.join(base_dir, "b")) is None
+    assert cache.list_dir(base_dir) == ["sub"]
+  finally:
+    shutil.rmtree(base_dir)
+
+def dir_cache_host_test():
+  base_dir, cache = _setup()
+  try:
+    path = os.path.join(base_dir, "a")
+    sub_path = os.path.join(base_dir, "sub")
+    info = cache.get_info(path)
+    assert (info.is_dir, info.size) == (False, 5)
+    assert cache.get_info(sub_path).is_dir
+    # modify file
+    with open(path, "ab") as fh:
+      fh.write("world")
+    assert cache.get_info(path).size == 10
+    # same size but new mtime
+    with open(path, "wb") as fh:
+      fh.write("0123456789")
+    os.utime(path, (1000, 1000))
+    assert cache.get_info(path).mtime == 1000
+    # replace file by a dir
+    os.remove(path)
+    assert cache.get_info(path) is None
+    os.mkdir(path)
+    assert cache.get_info(path).is_dir
+    # replace dir by a file
+    os.rmdir(sub_path)
+    with open(sub_path, "wb") as fh:
+      fh.write("sub")
+    info = cache.get_info(sub_path)
+    assert (info.is_dir, info.size) == (False, 3)
+    # new entry in listing
+    with open(os.path.join(base_dir, "c"), "wb") as fh:
+      fh.write("c")
+    os.utime(base_dir, (2000, 2000))
+    assert sorted(cache.list_dir(base_dir)) == ["a", "c", "sub"]
+    assert cache.get_info(os.path.join(base_dir, "c")).size == 1
+  finally:
+    shutil.rmtree(base_dir)
@@ -0,0 +1,145 @@
+# the cached ReadArgs templates and the fast path must match the full parser
+
+import types
+
+from musashi import emu
+from amitools.vamos.lib.dos.Args import Args
+
+# templates of the AmigaDOS commands
+templates = [
+  "FROM/M,TO/A,ALL/S,QUIET/S,BUF=BUFFER/K/N,CLONE/S,DATES/S,NOPRO/S,COM/S,NOREQ/S",
+  "FILE/M/A,ALL/S,QUIET/S,FORCE/S",
+  "DIR/M,P=PAT/K,KEYS/S,DATES/S,NODATES/S,TO/K,SUB/S,SINCE/K,UPTO/K,QUICK/S,BLOCK/S,NOHEAD/S,FILES/S,DIRS/S,LFORMAT/K,ALL/S",
+  "/M,NOLINE/S,FIRST/K/N,LEN/K/N,TO/K",
+  "DIR,OPT/K,ALL/S,DIRS/S,FILES/S,INTER/S",
+  "NAME,STRING/F",
+  "FROM/A,TO/A,QUIET/S",
+  "NAME/A,SIZE/N,ON/T",
+  "TO/A,FROM/M/A,VERBOSE/S",
+  "CMD/F",
+]
+
+# argument lines
+lines = [
+  "",
+  "a",
+  "a b c",
+  "  a\tb\nc  ",
+  "a TO b",
+  "to=b a",
+  "a b TO c ALL QUIET",
+  "BUF 20 a b",
+  "buf=7 x",
+  "FIRST 3 LEN 10 f1 f2",
+  "NAME hello world and more",
+  "on foo 12",
+  "foo 12 ON ON",
+  "FROM a b c TO d",
+  '"with space" b',
+  '"quoted*N" "" c',
+  'a "b c" TO "d"',
+  "-x --y 12 *n",
+]
+
+def _parse(args, line, split):
+  split_args = split(line)
+  try:
+    ok = args.parse_string(split_args)
+  except ValueError:
+    # non numeric value of a /N arg
+    return split_args, None
+  return split_args, ok, args.error, args.result
+
+def args_cache_test():
+  for tmpl in templates:
+    for line in lines:
+      # reference: parse template and split with the full parser
+      ref = Args()
+      ref._parse_template(tmpl)
+      ref_targs = [dict(t) for t in ref.targs]
+      ref_res = _parse(ref, line, ref._split_quoted)
+      # twice from the cache
+      for i in xrange(2):
+        args = Args()
+        args.parse_template(tmpl)
+        assert args.targs == ref_targs
+        res = _parse(args, line, args.split)
+        assert res == ref_res, "%s: '%s'" % (tmpl, line)
+
+def args_cache_copy_test():
+  # parse_string() disables auto fill in the targs: the cache must not change
+  tmpl = "NAME,SIZE/N"
+  a = Args()
+  a.parse_template(tmpl)
+  assert a.parse_string(["name", "foo", "12"])
+  b = Args()
+  b.parse_template(tmpl)
+  assert b.targs[0]['x']
+  assert b.parse_string(["foo", "12"])
+  assert b.result == ["foo", 12]
+
+def _ref_generate_result(args, mem, addr, array_ptr):
+  """the field by field writer of the result"""
+  char_ptr = addr + args.num_longs * 4
+  long_ptr = addr
+  base_ptr = array_ptr
+  for r in args.result:
+    if r == None:
+      base_val = 0
+    elif type(r) is types.StringType:
+      base_val = char_ptr
+      mem.w_cstr(char_ptr, r)
+      char_ptr += len(r) + 1
+    elif type(r) is types.IntType:
+      base_val = long_ptr
+      mem.w32(long_ptr, r)
+      long_ptr += 4
+    elif type(r) is types.ListType:
+      if len(r) == 0:
+        base_val = 0
+      else:
+        base_val = long_ptr
+        for s in r:
+          mem.w32(long_ptr, char_ptr)
+          mem.w_cstr(char_ptr, s)
+          long_ptr += 4
+          char_ptr += len(s) + 1
+        mem.w32(long_ptr, 0)
+        long_ptr += 4
+    else:
+      base_val = r
+    mem.w32(base_ptr, base_val)
+    base_ptr += 4
+
+class _MemAccess:
+  def __init__(self, mem):
+    self.mem = mem
+  def w_data(self, addr, data):
+    self.mem.w_block(addr, data)
+
+def args_generate_result_test():
+  mem = emu.Memory(128)
+  access = _MemAccess(mem)
+  array_ptr = 0x1000
+  addr = 0x2000
+  for tmpl in templates:
+    for line in lines:
+      args = Args()
+      args.parse_template(tmpl)
+      try:
+        if not args.parse_string(args.split(line)):
+          continue
+      except ValueError:
+        continue
+      size = args.calc_result_size()
+      array_size = len(args.result) * 4
+      mem.clear_block(array_ptr, array_size, 0)
+      mem.clear_block(addr, size, 0)
+      _ref_generate_result(args, mem, addr, array_ptr)
+      ref_array = mem.r_block(array_ptr, array_size)
+      ref_data = mem.r_block(addr, size)
+      mem.clear_block(array_ptr, array_size, 0)
+      mem.clear_block(addr, size, 0)
+      args.generate_result(access, addr, array_ptr)
+      assert mem.r_block(array_ptr, array_size) == ref_array
+      assert mem.r_block(addr, size) == ref_data
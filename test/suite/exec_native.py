@@ -0,0 +1,39 @@
+# the native exec functions must not access host memory outside of RAM
+
+from musashi import emu, m68k
+
+def _setup():
+  cpu = emu.CPU(m68k.M68K_CPU_TYPE_68000)
+  mem = emu.Memory(128)
+  traps = emu.Traps()
+  invalid = []
+  mem.set_invalid_func(lambda mode, width, addr: invalid.append((chr(mode), width, addr)))
+  return cpu, mem, traps, invalid
+
+def exec_native_remove_invalid_test():
+  cpu, mem, traps, invalid = _setup()
+  cpu.w_reg(m68k.M68K_REG_A1, 0xffffffff)
+  traps.call_native('exec.library', 'Remove')
+  assert invalid[0] == ('R', 2, 0xffffffff)
+
+def exec_native_copy_mem_test():
+  cpu, mem, traps, invalid = _setup()
+  mem.w_block(0x1000, "hello")
+  cpu.w_reg(m68k.M68K_REG_A0, 0x1000)
+  cpu.w_reg(m68k.M68K_REG_A1, 0x2000)
+  cpu.w_reg(m68k.M68K_REG_D0, 5)
+  traps.call_native('exec.library', 'CopyMem')
+  assert mem.r_block(0x2000, 5) == "hello"
+  assert invalid == []
+  # a garbage length is reported once and not copied byte by byte
+  cpu.w_reg(m68k.M68K_REG_D0, 0xfffffff0)
+  traps.call_native('exec.library', 'CopyMem')
+  assert invalid == [('R', 0, 128 * 1024)]
+
+def exec_native_copy_mem_wrap_test():
+  cpu, mem, traps, invalid = _setup()
+  cpu.w_reg(m68k.M68K_REG_A0, 0x1000)
+  cpu.w_reg(m68k.M68K_REG_A1, 0xfffffff0)
+  cpu.w_reg(m68k.M68K_REG_D0, 0x20)
+  traps.call_native('exec.library', 'CopyMem')
+  assert invalid == [('W', 0, 0xfffffff0)]
@@ -0,0 +1,48 @@
+# the address index of the memory pools
+
+import random
+
+from musashi import emu
+from amitools.vamos.MainMemory import MainMemory
+from amitools.vamos.MemoryAlloc import MemoryAlloc
+from amitools.vamos.label.LabelManager import LabelManager
+from amitools.vamos.lib.lexec.Pool import Pool
+
+def exec_pool_test():
+  raw_mem = emu.Memory(1024)
+  label_mgr = LabelManager()
+  mem = MainMemory(raw_mem, None)
+  alloc = MemoryAlloc(mem, 0, 1024 * 1024, 0x1000, label_mgr)
+  free_bytes = alloc.free_bytes
+  pool = Pool(mem, alloc, 0, 1024, 512, 0x1000)
+  rnd = random.Random(1)
+  nodes = {}
+  for i in xrange(2000):
+    if len(nodes) > 0 and rnd.random() < 0.4:
+      addr = rnd.choice(nodes.keys())
+      pool.FreePooled(addr, nodes.pop(addr))
+    else:
+      size = rnd.choice((8, 16, 24, 64, 600))
+      addr = pool.AllocPooled(label_mgr, "node", size).addr
+      assert addr not in nodes
+      nodes[addr] = size
+  # each block is in exactly one puddle and blocks do not overlap
+  last_end = 0
+  for addr in sorted(nodes):
+    size = nodes[addr]
+    assert addr >= last_end
+    last_end = addr + size
+    puddle = pool.find_puddle(addr)
+    assert puddle is not None
+    assert puddle.addr <= addr and addr + size <= puddle.end
+    assert [p for p in pool.index if p.contains(addr, size)] == [puddle]
+  # large blocks have their own puddle
+  num_large = len([a for a in nodes if nodes[a] >= 512])
+  assert len(pool.index) == len(pool.puddles) + num_large
+  assert pool.used == sum(nodes.values())
+  for addr, size in nodes.items():
+    pool.FreePooled(addr, size)
+  assert pool.used == 0
+  assert len(pool.index) == len(pool.puddles)
+  pool.__del__()
+  assert alloc.free_bytes == free_bytes
@@ -0,0 +1,35 @@
+# the fd cache must return the same function tables as the fd parser
+
+import os
+import shutil
+import tempfile
+
+import amitools.util.DataDir as DataDir
+import amitools.fd.FDFormat as FDFormat
+from amitools.fd.FDCache import FDCache
+
+def _funcs(fd):
+  return [(f.get_name(), f.get_bias(), f.is_private(), f.get_args())
+          for f in fd.get_funcs()]
+
+def fd_cache_test():
+  fd_dir = DataDir.ensure_data_sub_dir("fd")
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    cache_file = os.path.join(tmp_dir, "fd.cache")
+    fd_cache = FDCache(cache_file)
+    for f in sorted(os.listdir(fd_dir)):
+      fd_cache.read_fd(os.path.join(fd_dir, f))
+    assert fd_cache.num_misses > 0
+    fd_cache.save()
+    fd_cache = FDCache(cache_file)
+    for f in sorted(os.listdir(fd_dir)):
+      path = os.path.join(fd_dir, f)
+      ref = FDFormat.read_fd(path)
+      fd = fd_cache.read_fd(path)
+      assert fd.get_base_name() == ref.get_base_name()
+      assert fd.get_max_bias() == ref.get_max_bias()
+      assert _funcs(fd) == _funcs(ref)
+    assert fd_cache.num_misses == 0
+  finally:
+    shutil.rmtree(tmp_dir)
@@ -0,0 +1,55 @@
+# a parallel scan must report the same files and duplicates as a serial one
+
+import os
+import shutil
+import tempfile
+import zipfile
+
+from amitools.scan.FileScanner import FileScanner
+from amitools.scan.ArchiveScanner import ZipScanner
+from amitools.scan.ScanIndex import ScanIndex
+
+def _make_tree(base_dir):
+  datas = ["data %d" % (i % 5) for i in range(24)]
+  for i, data in enumerate(datas):
+    sub_dir = os.path.join(base_dir, "dir%d" % (i % 3))
+    if not os.path.isdir(sub_dir):
+      os.mkdir(sub_dir)
+    with open(os.path.join(sub_dir, "file%02d" % i), "wb") as fh:
+      fh.write(data)
+  # archives with duplicates inside and of each other
+  for i in range(6):
+    path = os.path.join(base_dir, "dir%d" % (i % 3), "arc%d.zip" % i)
+    zf = zipfile.ZipFile(path, "w")
+    zf.writestr("a", "data %d" % (i % 2))
+    zf.writestr("b", "arc data %d" % (i % 4))
+    zf.writestr("c", "data 4")
+    zf.close()
+
+def _scan(path, workers):
+  events = []
+  def handler(sf):
+    events.append(("file", sf.get_path()))
+    return True
+  def result_handler(sf, ok):
+    events.append(("file", sf.get_path()))
+    return ok
+  def dup_handler(sf, orig_path):
+    events.append(("dup", sf.get_path(), orig_path))
+    return True
+  fs = FileScanner(handler, scanners=[ZipScanner()], index=ScanIndex(),
+                   dup_handler=dup_handler, workers=workers,
+                   result_handler=result_handler)
+  assert fs.scan(path)
+  return events
+
+def file_scan_parallel_dedup_test():
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    _make_tree(tmp_dir)
+    serial = _scan(tmp_dir, 1)
+    assert len([e for e in serial if e[0] == "dup"]) > 0
+    for i in range(3):
+      assert _scan(tmp_dir, 4) == serial
+  finally:
+    shutil.rmtree(tmp_dir)
@@ -0,0 +1,123 @@
+# conformance of the native math library functions with the python versions
+
+import random
+import math
+import pytest
+
+from musashi import emu, m68k
+from amitools.vamos.lib import MathFFPLibrary as ffp
+from amitools.vamos.lib import MathIEEEDoubBasLibrary as dp
+
+NUM_VALUES = 200
+
+@pytest.fixture(scope="module")
+def native():
+  cpu = emu.CPU(m68k.M68K_CPU_TYPE_68000)
+  traps = emu.Traps()
+  def call(lib, func, *regs):
+    for i in xrange(len(regs)):
+      cpu.w_reg(m68k.M68K_REG_D0 + i, regs[i])
+    cpu.w_sr(0x2700)
+    traps.call_native(lib, func)
+    return cpu.r_reg(m68k.M68K_REG_D0), cpu.r_reg(m68k.M68K_REG_D1), cpu.r_sr() & 0x0f
+  return call
+
+def _cc(res):
+  if res == 0xffffffff:
+    return 0x08
+  elif res == 0:
+    return 0x04
+  return 0
+
+def _ffp_values():
+  rnd = random.Random(1234)
+  vals = [0, ffp.FFP_MAX, ffp.FFP_MAX | ffp.FFP_SIGN, 0x80000041, 0x800000c1,
+          0x80000000, 0x80000001, 0x0000007f]
+  for f in (0.5, 1.0, -1.0, 1.5, -2.5, 3.14159, 1e-10, -1e10, 1e18, 2.0**31):
+    vals.append(ffp.float_to_ffp(f))
+  while len(vals) < NUM_VALUES:
+    vals.append(rnd.getrandbits(32) | 0x80000000)
+  return vals
+
+def _dp_values():
+  rnd = random.Random(5678)
+  vals = [0.0, -0.0, 1.0, -1.0, 0.5, 2.5, -3.5, 1e300, -1e300, 5e-324,
+          2.0**31, -2.0**31, 2.0**31 - 0.5, float('inf'), float('-inf'), float('nan')]
+  while len(vals) < NUM_VALUES:
+    vals.append(rnd.uniform(-1e6, 1e6))
+    vals.append(math.ldexp(rnd.random(), rnd.randint(-1070, 1020)))
+  return [dp.double_to_regs(v) for v in vals]
+
+def _dp_equal(got, exp):
+  g = dp.regs_to_double(*got)
+  e = dp.regs_to_double(*exp)
+  if math.isnan(e):
+    return math.isnan(g)
+  return got == exp
+
+def ffp_unary_test(native):
+  ops = [('SPFix', ffp.ffp_fix, 0), ('SPAbs', ffp.ffp_abs, 0),
+         ('SPNeg', ffp.ffp_neg, 0), ('SPFloor', ffp.ffp_floor, 0),
+         ('SPCeil', ffp.ffp_ceil, 0), ('SPTst', ffp.ffp_tst, 1)]
+  for v in _ffp_values():
+    for name, func, reg in ops:
+      regs = [0, 0]
+      regs[reg] = v
+      d0, _, cc = native("mathffp.library", name, *regs)
+      exp = func(v) & 0xffffffff
+      assert d0 == exp, "%s(%08x)" % (name, v)
+      if name == 'SPTst':
+        assert cc == _cc(d0)
+
+def ffp_flt_test(native):
+  rnd = random.Random(42)
+  vals = [0, 1, 0xffffffff, 0x7fffffff, 0x80000000]
+  vals += [rnd.getrandbits(32) for i in xrange(NUM_VALUES)]
+  for v in vals:
+    d0, _, _ = native("mathffp.library", "SPFlt", v)
+    assert d0 == ffp.ffp_flt(v)
+
+def ffp_binary_test(native):
+  ops = [('SPAdd', ffp.ffp_add), ('SPSub', ffp.ffp_sub), ('SPMul', ffp.ffp_mul),
+         ('SPDiv', ffp.ffp_div), ('SPCmp', ffp.ffp_cmp)]
+  vals = _ffp_values()[:60]
+  for a in vals:
+    for b in vals:
+      for name, func in ops:
+        d0, _, cc = native("mathffp.library", name, b, a)
+        exp = func(a, b) & 0xffffffff
+        assert d0 == exp, "%s(%08x, %08x)" % (name, a, b)
+        if name == 'SPCmp':
+          assert cc == _cc(d0)
+
+def dp_unary_test(native):
+  ops = [('IEEEDPAbs', dp.dp_abs), ('IEEEDPNeg', dp.dp_neg),
+         ('IEEEDPFloor', dp.dp_floor), ('IEEEDPCeil', dp.dp_ceil)]
+  for v in _dp_values():
+    for name, func in ops:
+      d0, d1, _ = native("mathieeedoubbas.library", name, *v)
+      assert _dp_equal([d0, d1], func(*v)), "%s(%08x%08x)" % (name, v[0], v[1])
+    d0, _, _ = native("mathieeedoubbas.library", "IEEEDPFix", *v)
+    assert d0 == dp.dp_fix(*v)
+    d0, _, cc = native("mathieeedoubbas.library", "IEEEDPTst", *v)
+    assert d0 == dp.dp_tst(*v) & 0xffffffff
+    assert cc == _cc(d0)
+
+def dp_flt_test(native):
+  for v in (0, 1, 0xffffffff, 0x7fffffff, 0x80000000, 12345678):
+    d0, d1, _ = native("mathieeedoubbas.library", "IEEEDPFlt", v)
+    assert [d0, d1] == dp.dp_flt(v)
+
+def dp_binary_test(native):
+  ops = [('IEEEDPAdd', dp.dp_add), ('IEEEDPSub', dp.dp_sub),
+         ('IEEEDPMul', dp.dp_mul), ('IEEEDPDiv', dp.dp_div)]
+  vals = _dp_values()[:60]
+  for a in vals:
+    for b in vals:
+      args = a + b
+      for name, func in ops:
+        d0, d1, _ = native("mathieeedoubbas.library", name, *args)
+        assert _dp_equal([d0, d1], func(*args)), "%s(%s, %s)" % (name, a, b)
+      d0, _, cc = native("mathieeedoubbas.library", "IEEEDPCmp", *args)
+      assert d0 == dp.dp_cmp(*args) & 0xffffffff
+      assert cc == _cc(d0)
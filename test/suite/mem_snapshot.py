@@ -0,0 +1,63 @@
+# checkpoints of the emulated RAM
+
+import os
+import shutil
+import tempfile
+
+from musashi import emu
+
+def mem_checkpoint_restore_test():
+  mem = emu.Memory(1024)
+  mem.w32(0x10000, 0xdeadbeef)
+  mem.checkpoint()
+  assert mem.get_num_dirty_pages() == 0
+  mem.w32(0x10000, 0x12345678)
+  mem.w16(0x2fffe, 0x4711)
+  mem.w32(0x3fffe, 0xcafebabe)  # crosses into page 4
+  mem.w_block(0x50000, "hello")
+  assert mem.get_dirty_pages() == [1, 2, 3, 4, 5]
+  assert mem.restore_checkpoint() == 5
+  assert mem.get_num_dirty_pages() == 0
+  assert mem.r32(0x10000) == 0xdeadbeef
+  assert mem.r16(0x2fffe) == 0
+  assert mem.r32(0x3fffe) == 0
+  assert mem.r_block(0x50000, 5) == bytearray(5)
+  # pages are tracked again after restore
+  mem.w8(0x10001, 1)
+  assert mem.get_dirty_pages() == [1]
+  assert mem.restore_checkpoint() == 1
+  assert mem.r32(0x10000) == 0xdeadbeef
+  mem.end_checkpoint()
+  mem.w8(0x10001, 1)
+  assert mem.get_num_dirty_pages() == 0
+
+def mem_save_load_pages_test():
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    path = os.path.join(tmp_dir, "pages")
+    mem = emu.Memory(1024)
+    mem.w32(0x10000, 0xdeadbeef)
+    mem.checkpoint()
+    mem.w32(0x10000, 0x12345678)
+    mem.w32(0x3fffe, 0xcafebabe)  # crosses into page 4
+    mem.w_block(0x50000, "hello")
+    assert mem.save_dirty_pages(path) == 4
+    assert os.path.getsize(path) == 12 + 4 * (4 + 0x10000)
+    # back to the checkpoint and replay the delta
+    mem.restore_checkpoint()
+    assert mem.r32(0x10000) == 0xdeadbeef
+    assert mem.load_pages(path) == 4
+    assert mem.r32(0x10000) == 0x12345678
+    assert mem.r32(0x3fffe) == 0xcafebabe
+    assert mem.r_block(0x50000, 5) == bytearray("hello")
+    assert mem.get_dirty_pages() == [1, 3, 4, 5]
+    # a delta of a larger memory does not fit
+    mem.end_checkpoint()
+    mem = emu.Memory(64)
+    try:
+      mem.load_pages(path)
+      assert False
+    except ValueError:
+      pass
+  finally:
+    shutil.rmtree(tmp_dir)
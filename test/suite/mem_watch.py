@@ -0,0 +1,46 @@
+# memory watch ranges gate the trace function of the memory emu
+
+from musashi import emu, m68k
+from amitools.vamos.VamosConfig import parse_mem_ranges
+
+def _setup():
+  mem = emu.Memory(128)
+  traced = []
+  def trace(mode, width, addr, val):
+    traced.append((chr(mode), width, addr))
+    return 0
+  mem.set_trace_func(trace)
+  mem.set_trace_mode(1)
+  return mem, traced
+
+def mem_watch_filter_test():
+  mem, traced = _setup()
+  mem.add_watch_range(0x1000, 0x1010, m68k.MEM_WATCH_WRITE)
+  mem.w32(0x0ffe, 1)  # overlaps begin
+  mem.w8(0x1010, 2)   # behind range
+  mem.r16(0x1000)     # read not watched
+  mem.w16(0x2000, 3)  # other range
+  assert traced == [('W', 2, 0x0ffe)]
+  assert mem.get_watch_ranges() == [(0, 0x1000, 0x1010, 0x1e, 1)]
+  mem.clear_watch_ranges()
+
+def mem_watch_count_only_test():
+  mem, traced = _setup()
+  idx = mem.add_watch_range(0x1000, 0x1004, m68k.MEM_WATCH_LONG | m68k.MEM_WATCH_COUNT_ONLY)
+  for i in xrange(10):
+    mem.w32(0x1000, i)
+    mem.r32(0x1000)
+  mem.w16(0x1000, 0)
+  assert traced == []
+  assert mem.get_watch_ranges()[0][4] == 20
+  mem.remove_watch_range(idx)
+  assert mem.get_watch_ranges() == []
+  # without ranges everything is traced again
+  mem.w8(0x3000, 1)
+  assert traced == [('W', 0, 0x3000)]
+
+def mem_watch_parse_test():
+  assert parse_mem_ranges("1000+10:w4,2000-2100,30:rc") == \
+    [(0x1000, 0x1010, 0x12), (0x2000, 0x2100, 0), (0x30, 0x31, 0x21)]
+  assert parse_mem_ranges("2000-1000") is None
+  assert parse_mem_ranges("1000:x") is None
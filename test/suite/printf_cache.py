@@ -0,0 +1,98 @@
+# the compiled and cached printf formats must match the printf parser
+
+import random
+
+from musashi import emu
+from amitools.vamos.AccessMemory import AccessMemory
+from amitools.vamos.lib.dos.Printf import printf, printf_cache, printf_parse_string
+
+class _Mem:
+  def __init__(self, raw_mem):
+    self.raw_mem = raw_mem
+
+fmt_addr = 0x100
+str_addr = 0x1000
+bstr_addr = 0x1100
+data_addr = 0x2000
+
+nums16 = (0, 1, 42, 0x7fff, 0x8000, 0x8001, 0xfff0, 0xfffe, 0xffff)
+nums32 = (0, 1, 42, 0x7fffffff, 0x80000000, 0x80000001, 0xfffffff0,
+          0xfffffffe, 0xffffffff, 0xdeadbeef)
+
+def _setup():
+  raw_mem = emu.Memory(64)
+  raw_mem.w_cstr(str_addr, "world")
+  raw_mem.w_bstr(bstr_addr, "bstr")
+  return raw_mem, AccessMemory(_Mem(raw_mem))
+
+def _rand_format(rnd):
+  parts = []
+  for i in xrange(rnd.randint(0, 4)):
+    parts.append(rnd.choice(("", "text ", "50% off ", "a", " ")))
+    parts.append("%" + rnd.choice(("", "-")) +
+                 rnd.choice(("", "5", ".2", "5.2", "10.", "0")) +
+                 rnd.choice(("", "l")) + rnd.choice("bduxsc%"))
+  parts.append(rnd.choice(("", "\n", " end %")))
+  return "".join(parts)
+
+def _write_args(raw_mem, rnd, fmt):
+  ptr = data_addr
+  for e in printf_parse_string(fmt).elements:
+    is_long = e.length is not None and 'l' in e.length
+    t = e.etype
+    if t == 's':
+      raw_mem.w32(ptr, rnd.choice((str_addr, 0)))
+      ptr += 4
+    elif t == 'b':
+      raw_mem.w32(ptr, bstr_addr / 4)
+      ptr += 4
+    elif t == 'c':
+      raw_mem.w16(ptr, rnd.randint(32, 126))
+      ptr += 2
+    elif t in ('d', 'u', 'x'):
+      if is_long:
+        raw_mem.w32(ptr, rnd.choice(nums32))
+        ptr += 4
+      else:
+        raw_mem.w16(ptr, rnd.choice(nums16))
+        ptr += 2
+
+def printf_cache_same_output_test():
+  raw_mem, access = _setup()
+  rnd = random.Random(4711)
+  cache = printf_cache()
+  for i in xrange(2000):
+    fmt = _rand_format(rnd)
+    _write_args(raw_mem, rnd, fmt)
+    ref = printf(fmt, access, data_addr)
+    res, _ = cache.printf(fmt_addr + (i % 8) * 0x80, fmt, access, data_addr)
+    assert res == ref, fmt
+
+def printf_cache_negative_test():
+  raw_mem, access = _setup()
+  cache = printf_cache()
+  fmt = "%d %ld %5d %-6ld|"
+  raw_mem.w16(data_addr, 0xffff)
+  raw_mem.w32(data_addr + 2, 0xffffffff)
+  raw_mem.w16(data_addr + 6, 0x8000)
+  raw_mem.w32(data_addr + 8, 0x80000000)
+  ref = printf(fmt, access, data_addr)
+  assert ref.startswith("-1 -1 ")
+  res, end = cache.printf(fmt_addr, fmt, access, data_addr)
+  assert res == ref
+  assert end == data_addr + 12
+
+def printf_cache_changed_format_test():
+  raw_mem, access = _setup()
+  cache = printf_cache()
+  raw_mem.w32(data_addr, 0x12345678)
+  raw_mem.w_cstr(fmt_addr, "%lx")
+  res, end = cache.printf(fmt_addr, access.r_cstr(fmt_addr), access, data_addr)
+  assert (res, end) == ("12345678", data_addr + 4)
+  res, _ = cache.printf(fmt_addr, access.r_cstr(fmt_addr), access, data_addr)
+  assert cache.num_hits == 1
+  # a new format string at the same address
+  raw_mem.w_cstr(fmt_addr, "%d/%d")
+  res, end = cache.printf(fmt_addr, access.r_cstr(fmt_addr), access, data_addr)
+  assert (res, end) == ("4660/22136", data_addr + 4)
+  assert cache.num_misses == 2
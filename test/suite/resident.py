@@ -0,0 +1,35 @@
+# only pure binaries may stay resident between runs
+
+import os
+
+from amitools.vamos.VamosWorker import VamosWorker
+
+# counts its runs in its own code hunk and returns the count:
+#   lea cnt(pc),a0; addq.l #1,(a0); move.l (a0),d0; rts; cnt: dc.l 0
+impure_code = "41fa0008529020104e75".decode("hex") + "\0" * 6
+
+# runs 'impure' twice with SystemTagList() and returns the last result
+parent_code = ("2c78000443fa00267000" # move.l 4.w,a6; lea dos(pc),a1; moveq #0,d0
+               "4eaefdd82c407e01"     # jsr OpenLibrary(a6); move.l d0,a6; moveq #1,d7
+               "41fa00102208"         # loop: lea cmd(pc),a0; move.l a0,d1
+               "74004eaefda2"         # moveq #0,d2; jsr SystemTagList(a6)
+               "51cffff24e75").decode("hex") + \
+              "impure\0\0dos.library\0" # dbra d7,loop; rts
+
+def _run(hunk_bin, opts):
+  impure = hunk_bin("impure", impure_code)
+  parent = hunk_bin("parent", parent_code)
+  old_cwd = os.getcwd()
+  os.chdir(os.path.dirname(parent))
+  try:
+    returncode, _, _, _ = VamosWorker().run(["-S"] + opts + [parent])
+  finally:
+    os.chdir(old_cwd)
+  return returncode
+
+def resident_impure_test(hunk_bin):
+  # without --pure-bins the second run loads a fresh copy
+  assert _run(hunk_bin, []) == 1
+  assert _run(hunk_bin, ["--resident"]) == 1
+  # a binary listed as pure keeps its modified data
+  assert _run(hunk_bin, ["--resident", "--pure-bins", "impure"]) == 2
@@ -0,0 +1,35 @@
+# the cached split index must return the same data as the split files
+
+import os
+import shutil
+import tempfile
+
+import amitools.util.DataDir as DataDir
+from amitools.rom.RemusFile import RemusFileSet
+
+def _roms(rfs):
+  return [(r.name, r.chk_sum, r.size, len(r.entries)) for r in rfs.get_roms()]
+
+def _ids(rfs):
+  return [(e.chk_sum, e.name) for e in rfs.get_id_file().entries]
+
+def rom_split_cache_test():
+  data_dir = DataDir.ensure_data_sub_dir("splitdata")
+  tmp_dir = tempfile.mkdtemp()
+  try:
+    cache_file = os.path.join(tmp_dir, "splitdata.idx")
+    ref = RemusFileSet()
+    ref.load(data_dir)
+    rfs = RemusFileSet()
+    rfs.load(data_dir, cache_file)
+    assert len(rfs.split_files) > 0
+    assert os.path.exists(cache_file)
+    # second load takes the fast path of the cache
+    rfs = RemusFileSet()
+    rfs.load(data_dir, cache_file)
+    assert len(rfs.split_files) == 0
+    assert _roms(rfs) == _roms(ref)
+    assert len(_ids(ref)) > 0
+    assert _ids(rfs) == _ids(ref)
+  finally:
+    shutil.rmtree(tmp_dir)
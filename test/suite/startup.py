@@ -0,0 +1,34 @@
+# regression benchmark of the vamos startup time
+
+import os
+import re
+import sys
+import subprocess
+
+BASE_DIR = os.path.join(os.path.dirname(__file__), "..", "..")
+VAMOS = os.path.join(BASE_DIR, "bin", "vamos")
+# max startup time in seconds
+MAX_STARTUP = float(os.environ.get("VAMOS_MAX_STARTUP", "1.0"))
+
+def startup_time_test(exit_bin):
+  bin_path = exit_bin()
+  best = None
+  # the first run may compile the python modules
+  for i in xrange(3):
+    p = subprocess.Popen([sys.executable, VAMOS, "-S", "--startup-profile", bin_path],
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = p.communicate()
+    assert p.returncode == 0
+    m = re.search(r"^\s+total\s+([0-9.]+)s$", err, re.M)
+    assert m is not None, err
+    total = float(m.group(1))
+    if best is None or total < best:
+      best = total
+  assert best < MAX_STARTUP, "startup took %.3fs > %.3fs" % (best, MAX_STARTUP)
+
+def startup_lazy_libs_test():
+  # only exec and dos are needed to start up
+  code = "import sys; import amitools.vamos.Vamos; " \
+         "print [m for m in sys.modules if 'MathFFPLibrary' in m or 'UtilityLibrary' in m]"
+  out = subprocess.check_output([sys.executable, "-c", code], cwd=BASE_DIR)
+  assert out.strip() == "[]"
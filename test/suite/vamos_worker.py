@@ -0,0 +1,63 @@
+# run vamos multiple times in long-lived workers
+
+from musashi import emu, m68k
+from amitools.vamos.VamosWorker import VamosWorkerPool
+
+def mem_reset_test():
+  mem = emu.Memory(1024)
+  spec_addr = mem.reserve_special_range()
+  mem.w32(0x10000, 0xdeadbeef)
+  mem.w_block(0x50000, "hello")
+  mem.set_special_range_read_func(spec_addr, 2, lambda addr: 0x4711)
+  mem.reset()
+  assert mem.get_num_touched_pages() == 0
+  assert mem.r32(0x10000) == 0
+  assert mem.r_block(0x50000, 5) == bytearray(5)
+  # the special ranges are free again
+  assert mem.reserve_special_range() == spec_addr
+
+def mem_new_test():
+  # a new memory of another size starts without the old special ranges
+  mem = emu.Memory(1024)
+  spec_addr = mem.reserve_special_range()
+  mem.reserve_special_range()
+  mem = emu.Memory(2048)
+  assert mem.reserve_special_range() == spec_addr
+
+def cpu_reset_test():
+  cpu = emu.CPU(m68k.M68K_CPU_TYPE_68000)
+  mem = emu.Memory(128)
+  mem.w32(0, 0x800)
+  mem.w32(4, 0x1000)
+  mem.w16(0x1000, 0x4e71) # nop
+  mem.w16(0x1002, 0x60fc) # bra.s 0x1000
+  cpu.pulse_reset()
+  cpu.prof_start(4)
+  cpu.itrace_start(16)
+  cpu.execute(100)
+  assert cpu.prof_get_num_samples() > 0
+  assert cpu.itrace_get_total() > 0
+  cpu.w_reg(m68k.M68K_REG_D1, 42)
+  cpu.reset()
+  # the buffers of the profiler and the trace are released
+  assert cpu.prof_get_num_samples() == 0
+  assert cpu.prof_get_samples() == []
+  assert cpu.itrace_get_total() == 0
+  assert cpu.itrace_get_entries() == []
+  assert cpu.r_reg(m68k.M68K_REG_D1) == 0
+
+def vamos_worker_test(exit_bin):
+  bin_a = exit_bin(5, "exit_a")
+  bin_b = exit_bin(7, "exit_b")
+  pool = VamosWorkerPool(1)
+  try:
+    opts = ["-S"]
+    jobs = [(opts + [bin_a], None), (opts + [bin_b], None),
+            (opts + ["-m", "2048", bin_a], None), (opts + [bin_b], "in"),
+            (opts + ["--no-such-option", bin_a], None)]
+    res = pool.run_many(jobs * 3)
+    codes = [r[0] for r in res]
+    assert codes == [5, 7, 5, 7, 2] * 3
+    assert "unrecognized arguments" in res[-1][2]
+  finally:
+    pool.close()